@@ -8,6 +8,16 @@ logger = logging.getLogger(__name__)
 import flask
 import os
 import json
+from shim.cache import ResponseCache
+from shim.cachebackend import create_cache_backend
+from shim.cfapi import CFApiClient
+from shim.catalog import Catalog
+from shim.compression import AVAILABLE_ENCODINGS
+from shim.singleflight import SingleFlight
+from shim.metrics import Metrics
+from shim.jobpoller import JobPoller
+from shim.ratelimit import RateLimiter
+from shim.retry import RetryPolicy
 
 vcap_application = json.loads(os.getenv("VCAP_APPLICATION", "{}"))
 
@@ -28,18 +38,172 @@ logger.info(f"cfapi_url: {cfapi_url}")
 proxy_v3 = os.getenv("CFG_PROXY_V3", "false") == "true"
 logger.info(f"proxy_v3: {proxy_v3}")
 
+# max. number of v3 requests that run in parallel for one v2 request
+# (asyncio engine: can be much higher than for threads engine as parallel requests don't need a thread)
+cfapi_concurrency = int(os.getenv("CFG_CF_API_CONCURRENCY", "8"))
+logger.info(f"cfapi_concurrency: {cfapi_concurrency}")
+# max. time in seconds for fetching per-resource details (e.g. env vars of all apps) of one list page
+cfapi_batch_deadline = float(os.getenv("CFG_CF_API_BATCH_DEADLINE", "10"))
+logger.info(f"cfapi_batch_deadline: {cfapi_batch_deadline}")
+
+# pooled keep-alive connections to CF API, shared by all requests
+cfapi_pool_connections = int(os.getenv("CFG_CF_API_POOL_CONNECTIONS", "10"))
+cfapi_pool_maxsize = int(os.getenv("CFG_CF_API_POOL_MAXSIZE", "32"))
+cfapi_pool_block = os.getenv("CFG_CF_API_POOL_BLOCK", "false") == "true"
+logger.info(f"cfapi_pool: connections={cfapi_pool_connections}, maxsize={cfapi_pool_maxsize}, block={cfapi_pool_block}")
+
+# short-lived per-user cache for v3 resources (apps, processes, droplets, feature flags etc), 0 bytes disables the cache
+cache_ttl = float(os.getenv("CFG_CACHE_TTL", "10"))
+cache_max_bytes = int(os.getenv("CFG_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+# caches are kept in the process (max_bytes) or shared by all shim instances, e.g. redis://:<password>@<host>:6379/0
+cache_backend_url = os.getenv("CFG_CACHE_BACKEND_URL", "")
+cache_backend = create_cache_backend(cache_backend_url, cache_max_bytes) if cache_max_bytes > 0 else None
+logger.info(f"cache: ttl={cache_ttl}, max_bytes={cache_max_bytes}, backend={type(cache_backend).__name__ if cache_backend else None}")
+cache = ResponseCache(ttl=cache_ttl, max_bytes=cache_max_bytes, backend=cache_backend) if cache_backend else None
+
+# concurrent identical GETs (same url and user) share one CF API request, e.g. many cf CLI calls of a CI pipeline
+single_flight_enabled = os.getenv("CFG_CF_API_SINGLE_FLIGHT", "true") == "true"
+logger.info(f"single_flight: {single_flight_enabled}")
+single_flight = SingleFlight() if single_flight_enabled else None
+
+# request and CF API call durations for /metrics and the Server-Timing header
+metrics = Metrics()
+
+# per-user budget for CF API requests based on the X-RateLimit-* response headers of the CF API (shared by all requests
+# of a user in the process): requests wait for the reset instead of failing with 429, concurrency per user adapts (AIMD)
+rate_limit_max_concurrency = int(os.getenv("CFG_RATE_LIMIT_MAX_CONCURRENCY", "32"))
+rate_limit_reserve = int(os.getenv("CFG_RATE_LIMIT_RESERVE", "0"))
+rate_limit_max_wait = float(os.getenv("CFG_RATE_LIMIT_MAX_WAIT", "30"))
+logger.info(f"rate_limit: max_concurrency={rate_limit_max_concurrency}, reserve={rate_limit_reserve}, max_wait={rate_limit_max_wait}")
+rate_limiter = (
+    RateLimiter(max_concurrency=rate_limit_max_concurrency, reserve=rate_limit_reserve, max_wait=rate_limit_max_wait)
+    if rate_limit_max_concurrency > 0
+    else None
+)
+
+# GETs that fail with connection errors or 502/503 are retried after a jittered backoff, slow GETs can be hedged (duplicate
+# request after the given latency percentile of the path, first response wins), all within a retry budget per v2 request
+cfapi_retries = int(os.getenv("CFG_CF_API_RETRIES", "2"))
+cfapi_retry_backoff = float(os.getenv("CFG_CF_API_RETRY_BACKOFF", "0.1"))
+cfapi_retry_budget = float(os.getenv("CFG_CF_API_RETRY_BUDGET", "0.1"))
+cfapi_hedge_percentile = float(os.getenv("CFG_CF_API_HEDGE_PERCENTILE", "0"))
+cfapi_hedge_min_delay = float(os.getenv("CFG_CF_API_HEDGE_MIN_DELAY", "0.05"))
+logger.info(
+    f"retry_policy: retries={cfapi_retries}, backoff={cfapi_retry_backoff}, budget={cfapi_retry_budget}, "
+    f"hedge_percentile={cfapi_hedge_percentile}, hedge_min_delay={cfapi_hedge_min_delay}"
+)
+retry_policy = (
+    RetryPolicy(
+        max_retries=cfapi_retries,
+        backoff=cfapi_retry_backoff,
+        hedge_percentile=cfapi_hedge_percentile,
+        hedge_min_delay=cfapi_hedge_min_delay,
+        budget_ratio=cfapi_retry_budget,
+    )
+    if cfapi_retries > 0 or cfapi_hedge_percentile > 0
+    else None
+)
+
+# threads: parallel CF API requests run in a thread pool per v2 request (requests lib)
+# asyncio: all CF API requests run on one event loop per process (aiohttp lib), no thread per parallel request
+cfapi_engine = os.getenv("CFG_CF_API_ENGINE", "threads")
+logger.info(f"cfapi_engine: {cfapi_engine}")
+if cfapi_engine == "threads":
+    cfapi = CFApiClient(
+        pool_connections=cfapi_pool_connections,
+        pool_maxsize=cfapi_pool_maxsize,
+        pool_block=cfapi_pool_block,
+        cache=cache,
+        concurrency=cfapi_concurrency,
+        single_flight=single_flight,
+        metrics=metrics,
+        rate_limiter=rate_limiter,
+        retry_policy=retry_policy,
+    )
+elif cfapi_engine == "asyncio":
+    from shim.aio import AsyncCFApiClient
+
+    cfapi = AsyncCFApiClient(
+        pool_maxsize=cfapi_pool_maxsize,
+        cache=cache,
+        concurrency=cfapi_concurrency,
+        single_flight=single_flight,
+        metrics=metrics,
+        rate_limiter=rate_limiter,
+        retry_policy=retry_policy,
+    )
+else:
+    raise ValueError(f"Invalid CFG_CF_API_ENGINE: {cfapi_engine}")
+
+# v3 jobs of synchronous v2 requests (e.g. DELETE /v2/apps/:guid) are polled by one loop per process, not by the requests
+# poll interval per job starts at min and grows up to max, jobs that are due are polled together
+job_poll_min_interval = float(os.getenv("CFG_JOB_POLL_MIN_INTERVAL", "0.2"))
+job_poll_max_interval = float(os.getenv("CFG_JOB_POLL_MAX_INTERVAL", "5"))
+# max. seconds a synchronous v2 request waits for its job, then it returns the v2 job like async=true
+job_sync_timeout = float(os.getenv("CFG_JOB_SYNC_TIMEOUT", "60"))
+# waiting requests block a server thread: max. synchronous v2 requests per process that wait for their job (0: no limit),
+# further requests return the v2 job right away
+job_sync_max_waiting = int(os.getenv("CFG_JOB_SYNC_MAX_WAITING", "8"))
+logger.info(
+    f"job_poller: min_interval={job_poll_min_interval}, max_interval={job_poll_max_interval}, sync_timeout={job_sync_timeout}, "
+    f"sync_max_waiting={job_sync_max_waiting}"
+)
+job_poller = JobPoller(
+    cfapi,
+    min_interval=job_poll_min_interval,
+    max_interval=job_poll_max_interval,
+    concurrency=cfapi_concurrency,
+    max_waiting=job_sync_max_waiting,
+)
+
+# cache for global resources like stacks and buildpacks
+catalog_ttl = float(os.getenv("CFG_CATALOG_TTL", "300"))
+catalog_max_size = int(os.getenv("CFG_CATALOG_MAX_SIZE", "1000"))
+logger.info(f"catalog: ttl={catalog_ttl}, max_size={catalog_max_size}")
+catalog = Catalog(cfapi_url, ttl=catalog_ttl, max_size=catalog_max_size, backend=cache_backend)
+
+# compression of json and text responses (Accept-Encoding), encodings in order of preference, empty disables compression
+# br and zstd need the brotli resp. zstandard package, streamed lists are compressed while they are sent
+compression_encodings = [e for e in os.getenv("CFG_COMPRESSION_ENCODINGS", "br,zstd,gzip").split(",") if e in AVAILABLE_ENCODINGS]
+# smaller responses are sent uncompressed, level: gzip 1 (fast) - 9 (small), brotli 0-11, zstd 1-22
+compression_min_bytes = int(os.getenv("CFG_COMPRESSION_MIN_BYTES", "1024"))
+compression_level = int(os.getenv("CFG_COMPRESSION_LEVEL", "6"))
+logger.info(f"compression: encodings={compression_encodings}, min_bytes={compression_min_bytes}, level={compression_level}")
+
 app = flask.Flask(__name__)
 
 # import modules with route definitions
 import shim.root  # noqa: F401
+import shim.jobs  # noqa: F401
 import shim.apps  # noqa: F401
 import shim.spaces  # noqa: F401
 import shim.stacks  # noqa: F401
 
 
-# TODO: graceful shutdown
 port = int(os.getenv("PORT", 8080))
 # don't expose for local testing
 host = "127.0.0.1" if shim_url.startswith("http://localhost") else "0.0.0.0"
-logger.info(f"Starting shim on {host}:{port}")
-app.run(host=host, port=port)
+# flask: Flask dev server for local development, gunicorn: multi-worker server with keep-alive and graceful shutdown,
+# none: don't start a server (app is served by the caller, e.g. Flask test client in tests)
+server = os.getenv("CFG_SERVER", "flask")
+logger.info(f"Starting shim on {host}:{port} using {server} server")
+if server == "gunicorn":
+    from shim.server import run_gunicorn
+
+    run_gunicorn(
+        app,
+        host,
+        port,
+        workers=int(os.getenv("CFG_SERVER_WORKERS", "1")),
+        threads=int(os.getenv("CFG_SERVER_THREADS", "16")),
+        backlog=int(os.getenv("CFG_SERVER_BACKLOG", "2048")),
+        timeout=int(os.getenv("CFG_SERVER_TIMEOUT", "120")),
+        keepalive=int(os.getenv("CFG_SERVER_KEEPALIVE", "75")),
+        graceful_timeout=int(os.getenv("CFG_SERVER_GRACEFUL_TIMEOUT", "10")),
+    )
+elif server == "flask":
+    app.run(host=host, port=port)
+elif server == "none":
+    pass
+else:
+    raise ValueError(f"Invalid CFG_SERVER: {server}")
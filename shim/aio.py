@@ -0,0 +1,234 @@
+import asyncio
+import datetime
+import logging
+import os
+import threading
+import time
+import aiohttp
+import requests
+import requests.structures
+import requests.utils
+import yarl
+from concurrent.futures import Future
+from typing import Awaitable
+from shim.cache import SAFE_METHODS, ResponseCache, auth_scope
+from shim.cfapi import CFApiSession
+from shim.metrics import Metrics, Trace, current_trace
+from shim.ratelimit import RateLimiter
+from shim.retry import RetryBudget, RetryPolicy
+from shim.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# connection errors of GETs that are retried (connection refused or reset, server disconnected etc), not timeouts
+RETRY_ERRORS = (aiohttp.ClientConnectionError,)
+
+
+class AsyncCFApiClient:
+    """CF API client that runs all requests as coroutines on one asyncio event loop per process (asyncio engine).
+
+    Same interface as CFApiClient. Parallel requests of a v2 request don't need a thread per request, so one worker can
+    have hundreds of v3 requests in flight. The handler thread only waits for the results. Connections are pooled by aiohttp.
+    """
+
+    def __init__(
+        self,
+        pool_maxsize: int = 10,
+        cache: ResponseCache = None,
+        concurrency: int = 8,
+        keepalive_timeout: float = 30,
+        single_flight: SingleFlight = None,
+        metrics: Metrics = None,
+        rate_limiter: RateLimiter = None,
+        retry_policy: RetryPolicy = None,
+    ):
+        self.pool_maxsize = pool_maxsize
+        self.keepalive_timeout = keepalive_timeout
+        self.cache = cache
+        self.concurrency = concurrency
+        self.single_flight = single_flight
+        self.metrics = metrics
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.lock = threading.Lock()
+        self.pid = None
+        self.loop = None
+        self.client_session = None
+        self.num_connections = 0
+        self.num_requests = 0
+
+    def _loop(self) -> asyncio.AbstractEventLoop:
+        # event loop is started on first use, i.e. in every (forked) worker process
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name="cfapi-asyncio", daemon=True).start()
+                    self.client_session = asyncio.run_coroutine_threadsafe(self._create_client_session(), loop).result()
+                    self.loop = loop
+                    self.pid = os.getpid()
+        return self.loop
+
+    async def _create_client_session(self) -> aiohttp.ClientSession:
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_connection_create_end)
+        trace_config.on_request_start.append(self._on_request_start)
+        # limit_per_host = max. connections per host, further requests wait for a free connection
+        connector = aiohttp.TCPConnector(limit=0, limit_per_host=self.pool_maxsize, keepalive_timeout=self.keepalive_timeout)
+        # never share cookies between requests of different users
+        return aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar(), trace_configs=[trace_config])
+
+    async def _on_connection_create_end(self, session, context, params):
+        self.num_connections += 1
+
+    async def _on_request_start(self, session, context, params):
+        self.num_requests += 1
+
+    async def _request(
+        self,
+        semaphore: asyncio.Semaphore,
+        method: str,
+        url: str,
+        headers: dict,
+        retry_budget: RetryBudget = None,
+        params: dict = None,
+        data=None,
+        cookies=None,
+        timeout: float = None,
+        allow_redirects: bool = False,
+        stream: bool = False,
+    ) -> requests.Response:
+        if params:
+            # same query param encoding as requests
+            url = requests.Request(method, url, params=params).prepare().url
+
+        def send() -> Awaitable[requests.Response]:
+            return self._send(method, url, headers, data, cookies, timeout, allow_redirects, stream)
+
+        def send_within_rate_limit() -> Awaitable[requests.Response]:
+            return self.rate_limiter.call_async(method, headers, send) if self.rate_limiter else send()
+
+        if semaphore:
+            await semaphore.acquire()
+        try:
+            if self.retry_policy:
+                return await self.retry_policy.call_async(method, url, retry_budget, send_within_rate_limit, RETRY_ERRORS)
+            return await send_within_rate_limit()
+        finally:
+            if semaphore:
+                semaphore.release()
+
+    async def _send(
+        self, method: str, url: str, headers: dict, data, cookies, timeout: float, allow_redirects: bool, stream: bool
+    ) -> requests.Response:
+        start = time.monotonic()
+        aiohttp_res = await self.client_session.request(
+            method,
+            yarl.URL(url, encoded=True),
+            headers=headers,
+            data=data,
+            cookies=cookies,
+            allow_redirects=allow_redirects,
+            timeout=aiohttp.ClientTimeout(total=timeout),
+            # streamed bodies are passed through as is
+            auto_decompress=not stream,
+        )
+        if stream:
+            res = to_requests_response(aiohttp_res, None, time.monotonic() - start)
+            res.raw = AsyncRawResponse(aiohttp_res, self.loop)
+            return res
+        try:
+            content = await aiohttp_res.read()
+        finally:
+            aiohttp_res.release()
+        return to_requests_response(aiohttp_res, content, time.monotonic() - start)
+
+    async def _coalesced_request(
+        self, semaphore: asyncio.Semaphore, trace: Trace, method: str, url: str, headers: dict, retry_budget: RetryBudget = None, **kwargs
+    ) -> requests.Response:
+        start = time.perf_counter()
+        status = "error"
+        try:
+            key = self.single_flight.key(method, url, headers, kwargs) if self.single_flight else None
+            if key:
+                res = await self.single_flight.do_async(key, lambda: self._request(semaphore, method, url, headers, retry_budget, **kwargs))
+            else:
+                res = await self._request(semaphore, method, url, headers, retry_budget, **kwargs)
+            status = str(res.status_code)
+            return res
+        finally:
+            if self.metrics:
+                self.metrics.observe_upstream(method, url, status, time.perf_counter() - start, trace)
+
+    def request(self, method: str, url: str, headers: dict, retry_budget: RetryBudget = None, **kwargs) -> requests.Response:
+        # trace of the v2 request is taken from the handler thread, the request runs on the event loop thread
+        coro = self._coalesced_request(None, current_trace(), method, url, headers, retry_budget, **kwargs)
+        try:
+            return asyncio.run_coroutine_threadsafe(coro, self._loop()).result()
+        finally:
+            if method not in SAFE_METHODS:
+                self.invalidate_cache(headers)
+
+    def invalidate_cache(self, headers: dict):
+        """Cached responses of the caller are outdated, e.g. after a write or when its v3 job finished."""
+        if self.cache:
+            self.cache.invalidate(auth_scope(headers))
+
+    def submit_request(self, session: CFApiSession, method: str, url: str, **kwargs) -> Future:
+        """Schedule the request on the event loop, the semaphore of the session limits the number of parallel requests."""
+        loop = self._loop()
+        if session.semaphore is None:
+            session.semaphore = asyncio.Semaphore(self.concurrency)
+        coro = self._coalesced_request(session.semaphore, current_trace(), method, url, session.headers, session.retry_budget, **kwargs)
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    def session(self, headers: dict) -> CFApiSession:
+        return CFApiSession(self, headers)
+
+    def close(self):
+        if self.loop and self.pid == os.getpid():
+            asyncio.run_coroutine_threadsafe(self.client_session.close(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.pid = None
+
+    def stats(self) -> dict:
+        return {
+            "engine": "asyncio",
+            "connections": self.num_connections,  # = TCP/TLS handshakes
+            "requests": self.num_requests,
+            "reused_connections": max(0, self.num_requests - self.num_connections),
+        }
+
+
+class AsyncRawResponse:
+    """Body of a streamed aiohttp response for the handler thread, used as requests.Response.raw (see utils.stream_body)."""
+
+    def __init__(self, aiohttp_res: aiohttp.ClientResponse, loop: asyncio.AbstractEventLoop):
+        self.aiohttp_res = aiohttp_res
+        self.loop = loop
+
+    def stream(self, chunk_size: int, decode_content: bool = False):
+        # body is never decoded (auto_decompress=False)
+        while True:
+            chunk = asyncio.run_coroutine_threadsafe(self.aiohttp_res.content.read(chunk_size), self.loop).result()
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        # returns the connection to the pool if the body was read completely, closes it otherwise
+        self.loop.call_soon_threadsafe(self.aiohttp_res.release)
+
+
+def to_requests_response(aiohttp_res: aiohttp.ClientResponse, content: bytes, elapsed: float) -> requests.Response:
+    # handlers, cache etc work with requests.Response
+    res = requests.Response()
+    res.status_code = aiohttp_res.status
+    res.reason = aiohttp_res.reason
+    res.headers = requests.structures.CaseInsensitiveDict(aiohttp_res.headers)
+    res.url = str(aiohttp_res.url)
+    res.encoding = requests.utils.get_encoding_from_headers(res.headers)
+    res.elapsed = datetime.timedelta(seconds=elapsed)
+    res._content = content
+    res._content_consumed = True  # iter_content() slices the content
+    return res
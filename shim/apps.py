@@ -1,8 +1,23 @@
 import json
 import flask
-import requests
 import logging
-from __main__ import app, cfapi_url
+from __main__ import app, catalog, cfapi, cfapi_url, cfapi_batch_deadline
+from shim.fetch import ChunkedFetch, FetchedResources, LatestChunkedFetch, fetch_json_all, list_json
+from shim.jobs import v2_associations_error, v2_job_response
+from shim.jsonstream import v2_list_response
+from shim.metrics import timed
+from shim.plan import Plan, first_resource, json_body, json_or_none
+from shim.projection import AppRecord, BuildRecord, DropletRecord, PackageRecord, ProcessRecord
+from shim.summary import (
+    all_domains,
+    app_summary_v3_to_v2,
+    domain_v3_to_v2_summary,
+    domains_of_organization,
+    instance_bindings_fetch,
+    running_instances,
+    service_plans_fetch,
+    services_v3_to_v2_summary,
+)
 from shim.utils import (
     cfapi_request_headers,
     cfapi_response_headers,
@@ -25,6 +40,7 @@ def packackage_state_v3_to_v2(v3_package_state: str, v3_droplet_state: str) -> s
         return "PENDING"
 
 
+@timed
 def app_v3_to_v2(
     v3_app,
     v3_web_process,
@@ -78,7 +94,7 @@ def app_v3_to_v2(
             "buildpack": v3_buildpack,
             "detected_buildpack": v3_detected_buildpack["buildpack_name"] if v3_detected_buildpack else None,
             "detected_buildpack_guid": v3_detected_system_buildpack["guid"] if v3_detected_system_buildpack else None,
-            "environment_json": v3_app_env["var"] if len(v3_app_env["var"]) > 0 else None,
+            "environment_json": v3_app_env["var"] if v3_app_env and len(v3_app_env["var"]) > 0 else None,
             "memory": v3_web_process["memory_in_mb"],
             "instances": v3_web_process["instances"],
             "disk_quota": v3_web_process["disk_in_mb"],
@@ -107,7 +123,7 @@ def app_v3_to_v2(
             "detected_start_command": (
                 v3_droplet["process_types"]["web"] if v3_droplet and "web" in v3_droplet["process_types"] else v3_web_process["command"]
             ),
-            "enable_ssh": v3_app_feature_ssh["enabled"],
+            "enable_ssh": v3_app_feature_ssh["enabled"] if v3_app_feature_ssh else None,
             "ports": v2_ports,
             "space_url": f"/v2/spaces/{v3_app['relationships']['space']['data']['guid']}",
             "stack_url": f"/v2/stacks/{v3_stack['guid']}" if v3_stack else None,
@@ -119,161 +135,393 @@ def app_v3_to_v2(
     }
 
 
+def app_stack(session, v3_app, v3_stacks):
+    if v3_app is None:
+        return None
+    if v3_app["lifecycle"]["type"] == "buildpack":
+        stack = v3_app["lifecycle"]["data"]["stack"]
+        return v3_stacks.by_name.get(stack) if stack else None
+    elif v3_app["lifecycle"]["type"] == "docker":
+        # for whatever reason, v2 reports the default stack for docker apps
+        return v3_stacks.default
+    return None
+
+
+def app_detected_buildpack(session, v3_app, v3_droplet, v3_buildpacks):
+    if v3_app is None:
+        return None
+    if v3_app["lifecycle"]["type"] == "buildpack" and v3_droplet and v3_droplet["buildpacks"]:
+        # take stack and buildpack from droplet (= detected buildpack)
+        return v3_buildpacks.by_name_and_stack.get((v3_droplet["buildpacks"][0]["name"], v3_app["lifecycle"]["data"]["stack"]))
+    return None
+
+
+# v3 requests of GET /v2/apps/<guid>, independent requests run in parallel
+# TODO: error handling after every request (e.g. exceptions, rate limits, not found etc)
+app_plan = (
+    Plan(inputs=["guid"])
+    .fetch("v3_app_res", lambda guid: f"{cfapi_url}/v3/apps/{guid}", ["guid"], cached=True)
+    .fetch("v3_droplet", lambda guid: f"{cfapi_url}/v3/apps/{guid}/droplets/current", ["guid"], cached=True, then=json_or_none)
+    .fetch("v3_web_process", lambda guid: f"{cfapi_url}/v3/apps/{guid}/processes/web", ["guid"], cached=True, then=json_or_none)
+    .fetch(
+        "v3_latest_package",
+        lambda guid: f"{cfapi_url}/v3/apps/{guid}/packages?order_by=-created_at&per_page=1",
+        ["guid"],
+        cached=True,
+        then=first_resource,
+    )
+    .fetch(
+        "v3_latest_build",
+        lambda guid: f"{cfapi_url}/v3/apps/{guid}/builds?order_by=-created_at&per_page=1",
+        ["guid"],
+        cached=True,
+        then=first_resource,
+    )
+    .fetch("v3_app_env", lambda guid: f"{cfapi_url}/v3/apps/{guid}/environment_variables", ["guid"], cached=True, then=json_or_none)
+    .fetch("v3_app_feature_ssh", lambda guid: f"{cfapi_url}/v3/apps/{guid}/features/ssh", ["guid"], cached=True, then=json_or_none)
+    # stacks and buildpacks are cached, loaded while the requests above are running if needed
+    .step("v3_stacks", lambda session: catalog.stacks.get(session))
+    .step("v3_buildpacks", lambda session: catalog.buildpacks.get(session))
+    .step("v3_app", lambda session, v3_app_res: json_or_none(v3_app_res), ["v3_app_res"])
+    .step("v3_stack", app_stack, ["v3_app", "v3_stacks"])
+    .step("v3_buildpack", app_detected_buildpack, ["v3_app", "v3_droplet", "v3_buildpacks"])
+)
+
+
 @app.route("/v2/apps/<uuid:guid>")
 def v2_get_app(guid):
-    # TODO: error handling after every request (e.g. exceptions, rate limits, not found etc)
-    # TODO: requests could run in parallel
-    with requests.Session() as session:
-        session.headers.update(cfapi_request_headers(flask.request.headers))
-        session.allow_redirects = False
-        v3_app_res = session.get(f"{cfapi_url}/v3/apps/{guid}")
-        v3_web_process_res = session.get(f"{cfapi_url}/v3/apps/{guid}/processes/web")
-        v3_latest_package_res = session.get(f"{cfapi_url}/v3/apps/{guid}/packages?order_by=-created_at&per_page=1")
-        v3_latest_build_res = session.get(f"{cfapi_url}/v3/apps/{guid}/builds?order_by=-created_at&per_page=1")
-        v3_droplet_res = session.get(f"{cfapi_url}/v3/apps/{guid}/droplets/current")
-        v3_app_env_res = session.get(f"{cfapi_url}/v3/apps/{guid}/environment_variables")
-        v3_app_feature_ssh_res = session.get(f"{cfapi_url}/v3/apps/{guid}/features/ssh")
-
-        v3_app = v3_app_res.json()
-        v3_web_process = v3_web_process_res.json()
-
-        v3_latest_package_json = v3_latest_package_res.json()
-        v3_latest_package = (
-            v3_latest_package_json["resources"][0]
-            if v3_latest_package_res.status_code == 200 and v3_latest_package_json["pagination"]["total_results"] > 0
-            else None
-        )
-
-        v3_latest_build_json = v3_latest_build_res.json()
-        v3_latest_build = (
-            v3_latest_build_json["resources"][0]
-            if v3_latest_build_res.status_code == 200 and v3_latest_build_json["pagination"]["total_results"] > 0
-            else None
-        )
+    with cfapi.session(cfapi_request_headers(flask.request.headers)) as session:
+        v3 = app_plan.run(session, guid=guid)
 
-        v3_droplet = v3_droplet_res.json() if v3_droplet_res.status_code == 200 else None
-
-        v3_app_env = v3_app_env_res.json()
-        v3_app_feature_ssh = v3_app_feature_ssh_res.json()
-
-        v3_stack = None
-        v3_buildpack = None
-        if v3_app["lifecycle"]["type"] == "buildpack":
-            stack = v3_app["lifecycle"]["data"]["stack"]
-            if stack:
-                # TODO: cache stacks as they don't change
-                v3_stack_res = session.get(f"{cfapi_url}/v3/stacks?names={stack}&per_page=1")
-                v3_stack = v3_stack_res.json()["resources"][0] if v3_stack_res.status_code == 200 else None
-            if v3_droplet:
-                # take stack and buildpack from droplet (= detected buildpack)
-                v3_buildpack_res = session.get(
-                    f"{cfapi_url}/v3/buildpacks",
-                    params={
-                        "names": v3_droplet["buildpacks"][0]["name"],
-                        "stacks": stack,
-                        "per_page": 1,
-                    },
-                )
-                v3_buildpack = (
-                    v3_buildpack_res.json()["resources"][0]
-                    if v3_buildpack_res.status_code == 200 and len(v3_buildpack_res.json()["resources"]) > 0
-                    else None
-                )
-        elif v3_app["lifecycle"]["type"] == "docker":
-            # for whatever reason, v2 reports the default stack for docker apps
-            v3_stack_res = session.get(f"{cfapi_url}/v3/stacks?default=true&per_page=1")
-            v3_stack = v3_stack_res.json()["resources"][0] if v3_stack_res.status_code == 200 else None
+    v3_app_res = v3["v3_app_res"]
+    if v3_app_res.status_code >= 400:
+        # e.g. 404 right after a delete, the other requests of the plan failed as well
+        # TODO: error mapping
+        return flask.make_response(v3_app_res.content, v3_app_res.status_code, cfapi_response_headers(v3_app_res.headers))
 
     v2_app = app_v3_to_v2(
-        v3_app, v3_web_process, v3_latest_package, v3_latest_build, v3_droplet, v3_buildpack, v3_stack, v3_app_env, v3_app_feature_ssh
+        v3["v3_app"],
+        v3["v3_web_process"],
+        v3["v3_latest_package"],
+        v3["v3_latest_build"],
+        v3["v3_droplet"],
+        v3["v3_buildpack"],
+        v3["v3_stack"],
+        v3["v3_app_env"],
+        v3["v3_app_feature_ssh"],
     )
 
     return flask.make_response(v2_app, v3_app_res.status_code, cfapi_response_headers(v3_app_res.headers))
 
 
+@app.route("/v2/apps/<uuid:guid>", methods=["DELETE"])
+def v2_delete_app(guid):
+    if flask.request.args.get("recursive") != "true":
+        # v2 default: apps with service bindings are not deleted, v3 deletes them
+        with cfapi.session(cfapi_request_headers(flask.request.headers)) as session:
+            associations = {"service_bindings": f"{cfapi_url}/v3/service_credential_bindings?app_guids={guid}"}
+            error_response = v2_associations_error(session, "apps", associations)
+        if error_response is not None:
+            return error_response
+    v3_res = cfapi.request("DELETE", f"{cfapi_url}/v3/apps/{guid}", cfapi_request_headers(flask.request.headers))
+    return v2_job_response(v3_res, sync=flask.request.args.get("async") != "true")
+
+
+def app_guid(resource):
+    return resource["relationships"]["app"]["data"]["guid"]
+
+
+def apps_env_and_ssh(session, app_guids):
+    # fetch env vars and ssh flag per app - should be improved in v3 to include in app response
+    # missing results (deadline exceeded) are reported as unknown instead of failing the whole page
+    results = fetch_json_all(
+        session,
+        [f"{cfapi_url}/v3/apps/{guid}/environment_variables" for guid in app_guids]
+        + [f"{cfapi_url}/v3/apps/{guid}/features/ssh" for guid in app_guids],
+        cfapi_batch_deadline,
+        cached=True,
+    )
+    return (dict(zip(app_guids, results[: len(app_guids)])), dict(zip(app_guids, results[len(app_guids) :])))
+
+
+def apps_web_process_stats(session, v3_apps):
+    # one request per started app (no v3 list endpoint for process stats), stopped apps have no running instances
+    started = [guid for (guid, app) in v3_apps.items() if app["state"] == "STARTED"]
+    results = fetch_json_all(session, [f"{cfapi_url}/v3/apps/{guid}/processes/web/stats" for guid in started], cfapi_batch_deadline)
+    return dict(zip(started, results))
+
+
+def apps_stacks(session, v3_apps, v3_stacks):
+    return {
+        guid: (v3_stacks.by_name.get(app["lifecycle"]["data"].get("stack")) if app["lifecycle"]["data"].get("stack") else v3_stacks.default)
+        for (guid, app) in v3_apps.items()
+    }
+
+
+def apps_detected_buildpacks(session, v3_droplets, v3_buildpacks):
+    return {
+        app_guid: v3_buildpacks.by_name_and_stack.get(
+            (droplet["buildpacks"][0]["name"] if droplet["buildpacks"] else None, droplet["stack"])
+        )
+        for (app_guid, droplet) in v3_droplets.items()
+    }
+
+
+# v2 app filters that the v3 processes, packages and droplets queries support as well: these queries run in parallel to the
+# apps query instead of waiting for its app guids (not for builds, v3 builds can only be filtered by app)
+PUSHDOWN_FILTERS = ["space_guids", "organization_guids"]
+# expected packages resp. droplets per app on a pushed down page, apps with more fall back to app_guids queries
+PUSHDOWN_RESOURCES_PER_APP = 5
+
+
+def pushdown_submit(session, url: str, pushdown_params: dict, params: dict):
+    """First page of url with the filters of the apps query, None if the filters can't be pushed down."""
+    if pushdown_params is None:
+        return None
+    return session.submit(url, params={**pushdown_params, **params})
+
+
+def pushed_down(res, app_guids: list[str], record: type, latest: bool = False) -> FetchedResources:
+    """Resources of the apps of the page from a pushed down query, projected to record. None if not available, e.g. more
+    resources than fit on one page (the app page is only a part of the filtered apps). latest: newest resource per app
+    (order_by=-created_at)."""
+    if res is None or res.status_code != 200:
+        return None
+    res_json = list_json(res, record)
+    if res_json["pagination"]["next"]:
+        return None
+    guids = set(app_guids)
+    resources = {}
+    for resource in res_json["resources"]:
+        if app_guid(resource) in guids:
+            if latest:
+                resources.setdefault(app_guid(resource), resource)
+            else:
+                resources[app_guid(resource)] = resource
+    return FetchedResources(list(resources.values()))
+
+
+# v3 requests of GET /v2/apps
+# TODO: could optimize for name filter
+# long guid lists are split into chunks (url length limit), the chunked fetches only start requests and run in parallel
+# v3 resources are parsed into compact records with only the fields used by app_v3_to_v2 (pages with up to 5000 resources)
+apps_plan = (
+    Plan(inputs=["params", "pushdown_params"])
+    .fetch("v3_apps_res", f"{cfapi_url}/v3/apps", ["params"], params=lambda params: params)
+    .step(
+        "v3_web_processes_pushdown",
+        lambda session, params, pushdown_params: pushdown_submit(
+            session, f"{cfapi_url}/v3/processes", pushdown_params, {"types": "web", "per_page": int(params.get("per_page", 50))}
+        ),
+        ["params", "pushdown_params"],
+    )
+    .step(
+        "v3_packages_pushdown",
+        lambda session, params, pushdown_params: pushdown_submit(
+            session,
+            f"{cfapi_url}/v3/packages",
+            pushdown_params,
+            {"order_by": "-created_at", "per_page": min(5000, PUSHDOWN_RESOURCES_PER_APP * int(params.get("per_page", 50)))},
+        ),
+        ["params", "pushdown_params"],
+    )
+    .step(
+        "v3_droplets_pushdown",
+        lambda session, params, pushdown_params: pushdown_submit(
+            session,
+            f"{cfapi_url}/v3/droplets",
+            pushdown_params,
+            {"order_by": "-created_at", "per_page": min(5000, PUSHDOWN_RESOURCES_PER_APP * int(params.get("per_page", 50)))},
+        ),
+        ["params", "pushdown_params"],
+    )
+    .step("v3_apps_json", lambda session, v3_apps_res: list_json(v3_apps_res, AppRecord), ["v3_apps_res"])
+    .step("v3_apps", lambda session, v3_apps_json: {app["guid"]: app for app in v3_apps_json["resources"]}, ["v3_apps_json"])
+    .step("app_guids", lambda session, v3_apps: list(v3_apps.keys()), ["v3_apps"])
+    # only the latest package, build and droplet per app is needed (apps may have up to 100 builds)
+    # could improve for droplets when current_droplet is part of app relations
+    .step(
+        "v3_builds_fetch",
+        lambda session, app_guids: LatestChunkedFetch(
+            session, f"{cfapi_url}/v3/builds", "app_guids", app_guids, app_guid, record=BuildRecord
+        ),
+        ["app_guids"],
+    )
+    .step(
+        "v3_web_processes_fetch",
+        lambda session, app_guids, v3_web_processes_pushdown: pushed_down(v3_web_processes_pushdown, app_guids, ProcessRecord)
+        or ChunkedFetch(
+            session, f"{cfapi_url}/v3/processes", "app_guids", app_guids, {"per_page": 5000, "types": "web"}, record=ProcessRecord
+        ),
+        ["app_guids", "v3_web_processes_pushdown"],
+    )
+    .step(
+        "v3_packages_fetch",
+        lambda session, app_guids, v3_packages_pushdown: pushed_down(v3_packages_pushdown, app_guids, PackageRecord, latest=True)
+        or LatestChunkedFetch(session, f"{cfapi_url}/v3/packages", "app_guids", app_guids, app_guid, record=PackageRecord),
+        ["app_guids", "v3_packages_pushdown"],
+    )
+    .step(
+        "v3_droplets_fetch",
+        lambda session, app_guids, v3_droplets_pushdown: pushed_down(v3_droplets_pushdown, app_guids, DropletRecord, latest=True)
+        or LatestChunkedFetch(session, f"{cfapi_url}/v3/droplets", "app_guids", app_guids, app_guid, record=DropletRecord),
+        ["app_guids", "v3_droplets_pushdown"],
+    )
+    # blocking steps, after all requests above are started
+    .step(
+        "v3_app_env_and_ssh",
+        lambda session, app_guids, **fetches: apps_env_and_ssh(session, app_guids),
+        ["app_guids", "v3_builds_fetch", "v3_web_processes_fetch", "v3_packages_fetch", "v3_droplets_fetch"],
+    )
+    # v2 apps are ordered like the web processes (v3 default order), restore the order if processes came in several chunks
+    .step(
+        "v3_web_processes",
+        lambda session, v3_web_processes_fetch: dict(
+            sorted(v3_web_processes_fetch.result_by(app_guid).items(), key=lambda item: item[1]["created_at"])
+        ),
+        ["v3_web_processes_fetch"],
+    )
+    .step("v3_packages", lambda session, v3_packages_fetch: v3_packages_fetch.result_by(app_guid), ["v3_packages_fetch"])
+    .step("v3_builds", lambda session, v3_builds_fetch: v3_builds_fetch.result_by(app_guid), ["v3_builds_fetch"])
+    .step("v3_droplets", lambda session, v3_droplets_fetch: v3_droplets_fetch.result_by(app_guid), ["v3_droplets_fetch"])
+    # stacks and system buildpacks are cached
+    .step("v3_stacks", lambda session: catalog.stacks.get(session))
+    .step("v3_buildpacks", lambda session: catalog.buildpacks.get(session))
+    .step("v3_app_stacks", apps_stacks, ["v3_apps", "v3_stacks"])
+    .step("v3_app_buildpacks", apps_detected_buildpacks, ["v3_droplets", "v3_buildpacks"])
+)
+
+
 # v2 apps endpoint is based on processes not apps - impacts sort order
 @app.route("/v2/apps")
 def v2_get_apps():
-    with requests.Session() as session:
-        session.headers.update(cfapi_request_headers(flask.request.headers))
-        session.allow_redirects = False
+    with cfapi.session(cfapi_request_headers(flask.request.headers)) as session:
         # Valid filters: name, space_guid, organization_guid, diego, stack_guid
         # TODO: q: diego, stack_guid
         params = {**pagination_params_v2_to_v3(flask.request.args), **filter_params_v2_to_v3(flask.request.args)}
-        v3_apps_res = session.get(f"{cfapi_url}/v3/apps", params=params)
-        v3_apps_json = v3_apps_res.json()
-        v3_apps = {app["guid"]: app for app in v3_apps_json["resources"]}
-
-        # TODO: could optimize for most filters and reuse apps filter (but not for name)
-        # TODO: handle too many guids
-        # TODO: list requests may need pagination
-        query_params = {
-            "app_guids": ",".join([guid for guid in v3_apps.keys()]),
-            "per_page": 5000,
-        }
-
-        v3_web_processes_res = session.get(
-            f"{cfapi_url}/v3/processes",
-            params={
-                **query_params,
-                "types": "web",
-            },
-        )
-        v3_web_processes = {
-            process["relationships"]["app"]["data"]["guid"]: process for process in v3_web_processes_res.json()["resources"]
-        }
-
-        v3_packages_res = session.get(f"{cfapi_url}/v3/packages", params=query_params)
-        v3_packages = {package["relationships"]["app"]["data"]["guid"]: package for package in v3_packages_res.json()["resources"]}
-
-        v3_builds_res = session.get(f"{cfapi_url}/v3/builds?per_page=5000", params=query_params)
-        v3_builds = {build["relationships"]["app"]["data"]["guid"]: build for build in v3_builds_res.json()["resources"]}
-
-        # could improve when current_droplet is part of app relations
-        v3_droplets_res = session.get(f"{cfapi_url}/v3/droplets", params=query_params)
-        v3_droplets = {droplet["relationships"]["app"]["data"]["guid"]: droplet for droplet in v3_droplets_res.json()["resources"]}
-
-        # TODO: stacks and system buildpacks could be cached
-        v3_stacks_res = session.get(f"{cfapi_url}/v3/stacks")
-        v3_stacks = {stack["name"]: stack for stack in v3_stacks_res.json()["resources"]}
-        v3_default_stack = next((stack for stack in v3_stacks.values() if stack["default"]), None)
-        v3_app_stacks = {
-            # guid: v3_stacks.get(app["lifecycle"]["data"].get("stack") if app["lifecycle"]["data"].get("stack") else v3_default_stack)
-            guid: v3_stacks.get(app["lifecycle"]["data"].get("stack")) if app["lifecycle"]["data"].get("stack") else v3_default_stack
-            for (guid, app) in v3_apps.items()
-        }
-        v3_buildpacks_res = session.get(f"{cfapi_url}/v3/buildpacks")
-        v3_buildpacks = {(buildpack["name"], buildpack["stack"]): buildpack for buildpack in v3_buildpacks_res.json()["resources"]}
-        v3_app_buildpacks = {
-            app_guid: v3_buildpacks.get((droplet["buildpacks"][0]["name"] if droplet["buildpacks"] else None, droplet["stack"]))
-            for (app_guid, droplet) in v3_droplets.items()
-        }
-
-        # TODO: fetch env vars and ssh flag per app - should be improved in v3 to include in app response
-        v3_app_env_vars = {}
-        v3_app_feature_ssh = {}
-        for guid in v3_apps.keys():
-            env_vars = session.get(f"{cfapi_url}/v3/apps/{guid}/environment_variables").json()
-            feature_ssh = session.get(f"{cfapi_url}/v3/apps/{guid}/features/ssh").json()
-            v3_app_env_vars[guid] = env_vars
-            v3_app_feature_ssh[guid] = feature_ssh
-
-    v2_apps = {
-        **pagination_v3_to_v2(v3_apps_json["pagination"], flask.request.args),
-        "resources": [
+        # pushed down queries pay off if all filtered apps fit on the page, likely only for the first page
+        pushdown_params = filter_params_v2_to_v3(flask.request.args, PUSHDOWN_FILTERS) if params.get("page", "1") == "1" else None
+        v3 = apps_plan.run(session, params=params, pushdown_params=pushdown_params)
+
+    v3_apps = v3["v3_apps"]
+    v3_app_env_vars, v3_app_feature_ssh = v3["v3_app_env_and_ssh"]
+    return v2_list_response(
+        pagination_v3_to_v2(v3["v3_apps_json"]["pagination"], flask.request.args),
+        (
             # v2 is based on processes not apps - impacts sort order
             app_v3_to_v2(
                 v3_apps[guid],
                 v3_proc,
-                v3_packages.get(guid),
-                v3_builds.get(guid),
-                v3_droplets.get(guid),
-                v3_app_buildpacks.get(guid),
-                v3_app_stacks.get(guid),
+                v3["v3_packages"].get(guid),
+                v3["v3_builds"].get(guid),
+                v3["v3_droplets"].get(guid),
+                v3["v3_app_buildpacks"].get(guid),
+                v3["v3_app_stacks"].get(guid),
                 v3_app_env_vars.get(guid),
                 v3_app_feature_ssh.get(guid),
             )
-            for (guid, v3_proc) in v3_web_processes.items()
-        ],
-    }
-    return flask.make_response(v2_apps, 200, cfapi_response_headers(v3_apps_res.headers))
+            for (guid, v3_proc) in v3["v3_web_processes"].items()
+        ),
+        cfapi_response_headers(v3["v3_apps_res"].headers),
+    )
+
+
+def app_bindings_fetch(session, app_guids):
+    # app bindings with their service instances
+    return ChunkedFetch(
+        session,
+        f"{cfapi_url}/v3/service_credential_bindings",
+        "app_guids",
+        app_guids,
+        {"per_page": 5000, "type": "app", "include": "service_instance"},
+    )
+
+
+def bound_service_instances(session, v3_app_bindings_fetch):
+    v3_app_bindings_fetch.result()
+    return v3_app_bindings_fetch.included.get("service_instances", {})
+
+
+# v3 requests of GET /v2/apps/<guid>/summary: the requests of GET /v2/apps/<guid> plus routes, bindings, process stats and
+# domains, all in parallel. Service plans and bound app counts of the bound instances follow in one more round trip.
+app_summary_plan = (
+    Plan(inputs=["guid"])
+    .step(
+        "v3_routes_fetch",
+        lambda session, guid: ChunkedFetch(
+            session, f"{cfapi_url}/v3/routes", "app_guids", [str(guid)], {"per_page": 5000, "include": "domain"}
+        ),
+        ["guid"],
+    )
+    .step("v3_app_bindings_fetch", lambda session, guid: app_bindings_fetch(session, [str(guid)]), ["guid"])
+    .fetch("v3_web_process_stats", lambda guid: f"{cfapi_url}/v3/apps/{guid}/processes/web/stats", ["guid"], then=json_or_none)
+    .fetch("v3_domains_res", f"{cfapi_url}/v3/domains", params={"per_page": 5000}, cached=True)
+    .extend(app_plan)
+    .step(
+        "v3_space",
+        # no space for an unknown or deleted app (v3_app_res has the error)
+        lambda session, v3_app: (
+            session.submit(f"{cfapi_url}/v3/spaces/{v3_app['relationships']['space']['data']['guid']}", cached=True) if v3_app else None
+        ),
+        ["v3_app"],
+        json_body,
+    )
+    # blocking steps, after all requests above are started
+    .step("v3_service_instances", bound_service_instances, ["v3_app_bindings_fetch"])
+    .step(
+        "v3_service_plans_fetch",
+        lambda session, v3_service_instances: service_plans_fetch(session, cfapi_url, v3_service_instances),
+        ["v3_service_instances"],
+    )
+    .step(
+        "v3_instance_bindings_fetch",
+        lambda session, v3_service_instances: instance_bindings_fetch(session, cfapi_url, v3_service_instances),
+        ["v3_service_instances"],
+    )
+    .step("v3_routes", lambda session, v3_routes_fetch: v3_routes_fetch.result(), ["v3_routes_fetch"])
+    .step("v3_domains", all_domains, ["v3_domains_res"])
+    .step(
+        "v2_services",
+        lambda session, v3_service_instances, v3_service_plans_fetch, v3_instance_bindings_fetch: services_v3_to_v2_summary(
+            v3_service_instances, v3_service_plans_fetch, v3_instance_bindings_fetch
+        ),
+        ["v3_service_instances", "v3_service_plans_fetch", "v3_instance_bindings_fetch"],
+    )
+)
+
+
+@app.route("/v2/apps/<uuid:guid>/summary")
+def v2_get_app_summary(guid):
+    with cfapi.session(cfapi_request_headers(flask.request.headers)) as session:
+        v3 = app_summary_plan.run(session, guid=guid)
+
+    v3_app_res = v3["v3_app_res"]
+    if v3_app_res.status_code >= 400:
+        # e.g. 404 for an unknown or deleted app
+        # TODO: error mapping
+        return flask.make_response(v3_app_res.content, v3_app_res.status_code, cfapi_response_headers(v3_app_res.headers))
+
+    v2_app = app_v3_to_v2(
+        v3["v3_app"],
+        v3["v3_web_process"],
+        v3["v3_latest_package"],
+        v3["v3_latest_build"],
+        v3["v3_droplet"],
+        v3["v3_buildpack"],
+        v3["v3_stack"],
+        v3["v3_app_env"],
+        v3["v3_app_feature_ssh"],
+    )
+    # routes may have domains that are not visible to the user (e.g. private domains of other orgs), these are included
+    v3_domains = {**v3["v3_routes_fetch"].included.get("domains", {}), **{d["guid"]: d for d in v3["v3_domains"]}}
+    org_guid = v3["v3_space"]["relationships"]["organization"]["data"]["guid"]
+    v2_app_summary = app_summary_v3_to_v2(
+        v2_app,
+        v3["v3_routes"],
+        v3_domains,
+        v3["v2_services"],
+        running_instances(v3["v3_web_process_stats"]),
+        [domain_v3_to_v2_summary(d) for d in domains_of_organization(v3["v3_domains"], org_guid)],
+    )
+
+    return flask.make_response(v2_app_summary, v3_app_res.status_code, cfapi_response_headers(v3_app_res.headers))
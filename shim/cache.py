@@ -0,0 +1,133 @@
+import hashlib
+import json
+import logging
+import re
+import struct
+import uuid
+import zlib
+import requests
+import requests.structures
+import requests.utils
+from shim.cachebackend import CacheBackend, InProcessBackend
+
+logger = logging.getLogger(__name__)
+
+# cache scope of responses that are the same for all users, can't collide with auth scopes (sha256 hex)
+SHARED_SCOPE = "shared"
+# requests that may change resources, they invalidate the cached responses of the caller
+SAFE_METHODS = ["GET", "HEAD", "OPTIONS"]
+# responses with secrets (env vars of apps), only cached in the process, never sent to a networked backend
+SECRET_URLS = re.compile(r"/v3/apps/[^/?]+/(environment_variables|env)(\?|$)")
+# headers of the response to one request, not stored for responses cached for all users
+PER_REQUEST_HEADERS = ["x-vcap-request-id", "x-ratelimit-limit", "x-ratelimit-remaining", "x-ratelimit-reset", "set-cookie", "date"]
+
+# serialized responses (see encode_response): version byte, flags byte, status and length of the headers
+FORMAT_VERSION = 1
+FLAG_ZLIB = 1
+RESPONSE_HEADER = struct.Struct(">HI")
+# smaller responses are not compressed, level 1: fast, most of the gain for json
+COMPRESS_MIN_BYTES = 1024
+COMPRESS_LEVEL = 1
+
+
+def auth_scope(headers: dict) -> str:
+    """Identity of the caller derived from the Authorization header, None for anonymous requests."""
+    authorization = next((v for (k, v) in headers.items() if k.lower() == "authorization"), None)
+    return hashlib.sha256(authorization.encode()).hexdigest() if authorization else None
+
+
+class ResponseCache:
+    """Short-lived cache for v3 GET responses, scoped to the caller identity (Authorization header).
+
+    Caching is per user as apps, processes, env vars etc. are only visible to users with the right roles.
+    Responses are serialized (see encode_response) and stored in the backend, by default in the process (least recently
+    used entries are evicted if the size of all cached responses exceeds max_bytes), or e.g. in Redis for all instances.
+    Responses with secrets (SECRET_URLS) are kept in the process (max_bytes) with a networked backend.
+
+    Keys contain the generation of the scope: invalidate() (after a write of the caller, e.g. DELETE or cf push) starts a
+    new generation, so the next GETs of the caller don't see responses cached before (read your writes).
+    """
+
+    def __init__(self, ttl: float = 10, max_bytes: int = 16 * 1024 * 1024, backend: CacheBackend = None):
+        self.ttl = ttl
+        self.backend = backend or InProcessBackend(max_bytes)
+        networked = not isinstance(self.backend, InProcessBackend)
+        self.secrets_backend = InProcessBackend(max_bytes) if networked else self.backend
+        # networked backends: less network traffic and server memory, the in-process backend doesn't pay for compression
+        self.compress = networked
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, scope: str, url: str, params: dict = None) -> str:
+        generation = self.backend.get(f"generation {scope}") if scope != SHARED_SCOPE else None
+        return f"{scope} {generation.decode() if generation else 0} {requests.Request('GET', url, params=params).prepare().url}"
+
+    def invalidate(self, scope: str):
+        """Cached responses of the scope are not used anymore (new generation). Entries expire after ttl, so does the generation."""
+        if scope:
+            self.backend.set(f"generation {scope}", uuid.uuid4().hex.encode(), self.ttl, wait=True)
+
+    def _backend(self, key: str) -> CacheBackend:
+        return self.secrets_backend if SECRET_URLS.search(key) else self.backend
+
+    def get(self, key: str) -> requests.Response:
+        value = self._backend(key).get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return decode_response(value)
+
+    def put(self, key: str, response: requests.Response, ttl: float = None, shared: bool = False):
+        """Stores a successful response, shared: cached for all users, without the headers of the request of the caller."""
+        if response.status_code != 200:
+            return
+        if shared:
+            stored = requests.Response()
+            stored.status_code = response.status_code
+            stored.headers = requests.structures.CaseInsensitiveDict(
+                (k, v) for (k, v) in response.headers.items() if k.lower() not in PER_REQUEST_HEADERS
+            )
+            stored._content = response.content
+            response = stored
+        backend = self._backend(key)
+        backend.set(key, encode_response(response, self.compress and backend is self.backend), self.ttl if ttl is None else ttl)
+
+    def stats(self) -> dict:
+        return {**self.backend.stats(), "hits": self.hits, "misses": self.misses}
+
+
+def encode_response(response: requests.Response, compress: bool = False) -> bytes:
+    """Compact binary form of a response: format version, flags, then (zlib compressed if compress and large enough)
+    status, length of the headers, headers ("name: value" lines) and body."""
+    headers = "\r\n".join(f"{k}: {v}" for (k, v) in response.headers.items()).encode()
+    payload = RESPONSE_HEADER.pack(response.status_code, len(headers)) + headers + response.content
+    if compress and len(payload) >= COMPRESS_MIN_BYTES:
+        return bytes([FORMAT_VERSION, FLAG_ZLIB]) + zlib.compress(payload, COMPRESS_LEVEL)
+    return bytes([FORMAT_VERSION, 0]) + payload
+
+
+def decode_response(value: bytes) -> requests.Response:
+    if value[0] != FORMAT_VERSION:
+        raise ValueError(f"Unknown cache format version {value[0]}")
+    payload = zlib.decompress(value[2:]) if value[1] & FLAG_ZLIB else memoryview(value)[2:]
+    status_code, headers_length = RESPONSE_HEADER.unpack_from(payload)
+    headers_end = RESPONSE_HEADER.size + headers_length
+    res = requests.Response()
+    res.status_code = status_code
+    res.headers = requests.structures.CaseInsensitiveDict(
+        line.split(": ", 1) for line in bytes(payload[RESPONSE_HEADER.size : headers_end]).decode().split("\r\n") if line
+    )
+    res.encoding = requests.utils.get_encoding_from_headers(res.headers)
+    res._content = bytes(payload[headers_end:])
+    res._content_consumed = True  # iter_content() slices the content
+    return res
+
+
+def encode_json(obj) -> bytes:
+    """Compact serialization of json values, e.g. catalog lists."""
+    return zlib.compress(json.dumps(obj, separators=(",", ":")).encode(), COMPRESS_LEVEL)
+
+
+def decode_json(value: bytes):
+    return json.loads(zlib.decompress(value))
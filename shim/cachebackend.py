@@ -0,0 +1,281 @@
+import collections
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+import urllib.parse
+
+logger = logging.getLogger(__name__)
+
+# a networked backend that failed is not used (all lookups miss) for RETRY_INTERVAL seconds
+RETRY_INTERVAL = 5.0
+# pending writes of the networked backend, further writes are dropped (caching is best effort)
+MAX_PENDING_WRITES = 1000
+
+
+class CacheBackend:
+    """Key-value store behind the shim caches (ResponseCache, Catalog): bytes values that expire after ttl seconds.
+
+    Backends are best effort: get() returns None for missing and expired keys and if the backend is not available,
+    set() may drop values (e.g. evicted or not reachable). set() may write in the background, with wait=True the value is
+    written before it returns (e.g. invalidations that the next get() must see).
+    """
+
+    def get(self, key: str) -> bytes:
+        raise NotImplementedError()
+
+    def set(self, key: str, value: bytes, ttl: float, wait: bool = False):
+        raise NotImplementedError()
+
+    def delete(self, key: str):
+        raise NotImplementedError()
+
+    def stats(self) -> dict:
+        return {}
+
+
+class InProcessBackend(CacheBackend):
+    """Backend in the memory of the process, least recently used entries are evicted if all entries exceed max_bytes."""
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()  # key -> (expires_at, size, value)
+        self.size = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> bytes:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                return entry[2]
+            if entry:
+                self._remove(key)
+            return None
+
+    def set(self, key: str, value: bytes, ttl: float, wait: bool = False):
+        size = len(value) + len(key)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            while self.size + size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+            self.entries[key] = (time.monotonic() + ttl, size, value)
+            self.size += size
+
+    def delete(self, key: str):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+
+    def _remove(self, key: str):
+        _, size, _ = self.entries.pop(key)
+        self.size -= size
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.size, "evictions": self.evictions}
+
+
+class RespError(Exception):
+    """Error reply of the server."""
+
+
+class RespConnection:
+    """Connection to a server that speaks RESP (Redis serialization protocol), e.g. Redis or Valkey."""
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+
+    def send(self, *commands: tuple):
+        """Sends commands (pipelined, e.g. many SETs) without waiting for the replies."""
+        self.sock.sendall(b"".join(encode_command(*command) for command in commands))
+
+    def execute(self, *args):
+        self.send(args)
+        return self.read_reply()
+
+    def read_reply(self):
+        line = self.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection closed by server")
+        kind, value = line[:1], line[1:-2]
+        if kind == b"+":
+            return value.decode()
+        if kind == b"-":
+            raise RespError(value.decode())
+        if kind == b":":
+            return int(value)
+        if kind == b"$":
+            length = int(value)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError("Connection closed by server")
+            return data[:-2]
+        if kind == b"*":
+            length = int(value)
+            return None if length < 0 else [self.read_reply() for _ in range(length)]
+        raise RespError(f"Invalid reply: {line[:50]}")
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+
+def encode_command(*args) -> bytes:
+    # array of bulk strings
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        arg = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(f"${len(arg)}\r\n".encode())
+        parts.append(arg)
+        parts.append(b"\r\n")
+    return b"".join(parts)
+
+
+class RespBackend(CacheBackend):
+    """Networked backend shared by all shim instances, e.g. Redis: redis://[:password@]host[:port][/db].
+
+    Lookups block the calling thread (max. timeout seconds), writes are queued and sent in the background (pipelined)
+    so that requests don't wait for them. Connections are pooled, the pool and the writer thread are started on first use
+    in every (forked) worker process. If the server fails, the backend is skipped for RETRY_INTERVAL seconds (lookups
+    miss, writes are dropped) instead of slowing down every request.
+    """
+
+    def __init__(self, url: str, pool_size: int = 16, timeout: float = 0.5, prefix: str = "shim:"):
+        parsed = urllib.parse.urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = urllib.parse.unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.strip("/") or 0)
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.pid = None
+        self.pool = None
+        self.writes = None
+        self.down_until = 0.0
+        self.errors = 0
+        self.dropped_writes = 0
+
+    def _start(self):
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.pool = queue.LifoQueue()
+                    self.writes = queue.Queue(maxsize=MAX_PENDING_WRITES)
+                    threading.Thread(target=self._write_loop, name="cache-writer", daemon=True).start()
+                    self.pid = os.getpid()
+
+    def _connect(self) -> RespConnection:
+        connection = RespConnection(self.host, self.port, self.timeout)
+        try:
+            if self.password:
+                connection.execute("AUTH", self.password)
+            if self.db:
+                connection.execute("SELECT", self.db)
+        except Exception:
+            connection.close()
+            raise
+        return connection
+
+    def _execute(self, fn):
+        """fn(connection) with a pooled connection, None if the server is not available."""
+        if time.monotonic() < self.down_until:
+            return None
+        self._start()
+        try:
+            connection = self.pool.get_nowait()
+        except queue.Empty:
+            connection = None
+        try:
+            connection = connection or self._connect()
+            result = fn(connection)
+        except (OSError, RespError) as e:
+            if connection:
+                connection.close()
+            self._failed(e)
+            return None
+        if self.pool.qsize() < self.pool_size:
+            self.pool.put(connection)
+        else:
+            connection.close()
+        return result
+
+    def _failed(self, e: Exception):
+        with self.lock:
+            self.errors += 1
+            if time.monotonic() >= self.down_until:
+                logger.warning(f"Cache backend {self.host}:{self.port} failed, not used for {RETRY_INTERVAL} s: {e}")
+            self.down_until = time.monotonic() + RETRY_INTERVAL
+
+    def get(self, key: str) -> bytes:
+        return self._execute(lambda connection: connection.execute("GET", self.prefix + key))
+
+    def set(self, key: str, value: bytes, ttl: float, wait: bool = False):
+        command = ("SET", self.prefix + key, value, "PX", max(1, int(ttl * 1000)))
+        if wait:
+            self._execute(lambda connection: connection.execute(*command))
+            return
+        if time.monotonic() < self.down_until:
+            return
+        self._start()
+        try:
+            self.writes.put_nowait(command)
+        except queue.Full:
+            self.dropped_writes += 1
+
+    def delete(self, key: str):
+        self._execute(lambda connection: connection.execute("DEL", self.prefix + key))
+
+    def _write_loop(self):
+        writes = self.writes
+        while True:
+            commands = [writes.get()]
+            # all pending writes are sent at once, replies are read afterwards
+            while len(commands) < 100:
+                try:
+                    commands.append(writes.get_nowait())
+                except queue.Empty:
+                    break
+            self._execute(lambda connection, commands=commands: self._pipeline(connection, commands))
+            for _ in commands:
+                writes.task_done()
+
+    def _pipeline(self, connection: RespConnection, commands: list):
+        connection.send(*commands)
+        for _ in commands:
+            connection.read_reply()
+
+    def flush(self):
+        """Waits until all queued writes are sent (e.g. for tests)."""
+        if self.writes is not None:
+            self.writes.join()
+
+    def stats(self) -> dict:
+        return {
+            "connections": self.pool.qsize() if self.pool else 0,
+            "pending_writes": self.writes.qsize() if self.writes else 0,
+            "dropped_writes": self.dropped_writes,
+            "errors": self.errors,
+        }
+
+
+def create_cache_backend(url: str, max_bytes: int) -> CacheBackend:
+    """Backend for CFG_CACHE_BACKEND_URL: empty for the in-process backend (max_bytes), redis://... for a networked backend."""
+    if not url:
+        return InProcessBackend(max_bytes)
+    if urllib.parse.urlparse(url).scheme in ["redis", "resp"]:
+        return RespBackend(url)
+    raise ValueError(f"Invalid cache backend url: {url}")
@@ -0,0 +1,115 @@
+import logging
+import threading
+import time
+from shim.cache import decode_json, encode_json
+from shim.cachebackend import CacheBackend
+from shim.cfapi import CFApiSession
+from shim.fetch import fetch_all_pages
+from shim.projection import BuildpackRecord
+
+logger = logging.getLogger(__name__)
+
+# start a background refresh when an entry reaches this fraction of its ttl
+REFRESH_AHEAD = 0.8
+
+
+class CatalogResources:
+    """All resources of a v3 list endpoint indexed by guid, name and (name, stack)."""
+
+    def __init__(self, resources: list[dict]):
+        self.resources = resources
+        self.by_guid = {r["guid"]: r for r in resources}
+        self.by_name = {r["name"]: r for r in resources}
+        # buildpack names are only unique per stack
+        self.by_name_and_stack = {(r["name"], r.get("stack")): r for r in resources}
+        self.default = next((r for r in resources if r.get("default")), None)
+
+
+class CatalogList:
+    """Cached list of global v3 resources that are the same for all users and rarely change.
+
+    Entries expire after ttl seconds. Shortly before, a background refresh is started so that requests don't have to wait.
+    Lists with more than max_size resources are not cached. With a backend, loaded lists are shared with other processes
+    and shim instances: a list loaded by another instance is used instead of loading it again if it isn't due for refresh.
+    With record, only compact records of the resources are kept (e.g. projection.BuildpackRecord), the backend stores the
+    resources as loaded.
+    """
+
+    def __init__(self, url: str, ttl: float, max_size: int, backend: CacheBackend = None, record: type = None):
+        self.url = url
+        self.record = record
+        self.ttl = ttl
+        self.max_size = max_size
+        self.backend = backend
+        self.key = f"catalog {url}"
+        self.lock = threading.Lock()
+        self.entry = None
+        self.loaded_at = 0.0
+        self.refreshing = False
+
+    def get(self, session: CFApiSession) -> CatalogResources:
+        entry = self.entry
+        age = time.monotonic() - self.loaded_at
+        if entry and age < self.ttl:
+            if age > self.ttl * REFRESH_AHEAD and not self.refreshing:
+                self.refreshing = True
+                threading.Thread(target=self._refresh, args=(session,), daemon=True).start()
+            return entry
+
+        # only one request loads the list, others wait for it
+        with self.lock:
+            if self.entry and time.monotonic() - self.loaded_at < self.ttl:
+                return self.entry
+            try:
+                return self._load(session)
+            except Exception as e:
+                if self.entry:
+                    logger.warning(f"Using stale {self.url}, reload failed: {e}")
+                    return self.entry
+                raise
+
+    def invalidate(self):
+        self.entry = None
+        if self.backend:
+            self.backend.delete(self.key)
+
+    def _load(self, session: CFApiSession) -> CatalogResources:
+        shared = self._load_shared()
+        resources, age = shared or (fetch_all_pages(session, self.url, {"per_page": 5000}), 0.0)
+        entry = CatalogResources([self.record(r) for r in resources] if self.record else resources)
+        if len(entry.resources) <= self.max_size:
+            self.entry = entry
+            self.loaded_at = time.monotonic() - age
+            if self.backend and not shared:
+                self.backend.set(self.key, encode_json({"loaded_at": time.time(), "resources": resources}), self.ttl)
+        else:
+            logger.warning(f"Not caching {self.url}: {len(entry.resources)} resources exceed max size {self.max_size}")
+        return entry
+
+    def _load_shared(self) -> tuple:
+        """Resources and age of the list loaded by another instance, None if there is none or it is due for refresh."""
+        value = self.backend.get(self.key) if self.backend else None
+        if value is None:
+            return None
+        shared = decode_json(value)
+        age = max(0.0, time.time() - shared["loaded_at"])
+        return (shared["resources"], age) if age < self.ttl * REFRESH_AHEAD else None
+
+    def _refresh(self, session: CFApiSession):
+        # own session: the session of the triggering request is closed when it's done (e.g. its executor is shut down)
+        try:
+            with self.lock, session.client.session(session.headers) as refresh_session:
+                self._load(refresh_session)
+        except Exception as e:
+            logger.warning(f"Background refresh of {self.url} failed: {e}")
+        finally:
+            self.refreshing = False
+
+
+class Catalog:
+    """Global CF resources that are visible to all users: stacks and (system) buildpacks."""
+
+    def __init__(self, cfapi_url: str, ttl: float = 300, max_size: int = 1000, backend: CacheBackend = None):
+        self.stacks = CatalogList(f"{cfapi_url}/v3/stacks", ttl, max_size, backend)
+        # only used to find the guid of detected buildpacks
+        self.buildpacks = CatalogList(f"{cfapi_url}/v3/buildpacks", ttl, max_size, backend, BuildpackRecord)
@@ -0,0 +1,222 @@
+import http.cookiejar
+import logging
+import threading
+import time
+import requests
+from concurrent.futures import Future, ThreadPoolExecutor
+import requests.adapters
+import urllib3
+from shim.cache import SAFE_METHODS, SHARED_SCOPE, ResponseCache, auth_scope
+from shim.metrics import Metrics, Trace, current_trace
+from shim.ratelimit import RateLimiter
+from shim.retry import RetryBudget, RetryPolicy
+from shim.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class CountingHTTPAdapter(requests.adapters.HTTPAdapter):
+    """HTTPAdapter that counts opened connections (TCP/TLS handshakes) incl. reconnects of pooled connections.
+
+    urllib3 pools only count new connection objects, not reconnects after the server closed a kept-alive connection.
+    """
+
+    def __init__(self, **kwargs):
+        self.lock = threading.Lock()
+        self.num_connections = 0
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": self._counting_pool_class(urllib3.HTTPConnectionPool),
+            "https": self._counting_pool_class(urllib3.HTTPSConnectionPool),
+        }
+
+    def _counting_pool_class(self, pool_class):
+        adapter = self
+
+        class CountingConnection(pool_class.ConnectionCls):
+            def connect(self):
+                with adapter.lock:
+                    adapter.num_connections += 1
+                super().connect()
+
+        return type(f"Counting{pool_class.__name__}", (pool_class,), {"ConnectionCls": CountingConnection})
+
+
+class CFApiClient:
+    """Process-wide client for all CF API requests.
+
+    Connections are kept alive and pooled (one pool per host). All threads share the same connection pool,
+    every thread gets its own requests.Session on top of it as sessions are not thread-safe.
+    Request headers (auth, vcap-request-id etc) are passed per request, no state is kept between requests.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        pool_block: bool = False,
+        cache: ResponseCache = None,
+        concurrency: int = 8,
+        single_flight: SingleFlight = None,
+        metrics: Metrics = None,
+        rate_limiter: RateLimiter = None,
+        retry_policy: RetryPolicy = None,
+    ):
+        # pool_connections = number of hosts with pooled connections, pool_maxsize = max. pooled connections per host
+        # pool_block = wait for a free connection instead of opening a non-pooled one if all pooled connections are in use
+        self.adapter = CountingHTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block)
+        self.local = threading.local()
+        # optional cache for GET responses, see CFApiSession.get
+        self.cache = cache
+        # max. number of parallel requests per session, see CFApiSession.submit
+        self.concurrency = concurrency
+        # optional coalescing of identical GETs in flight (also across v2 requests)
+        self.single_flight = single_flight
+        # optional metrics of all CF API requests, see Metrics.observe_upstream
+        self.metrics = metrics
+        # optional per-user budget and concurrency based on the rate limit headers of the CF API
+        self.rate_limiter = rate_limiter
+        # optional retries and hedging of GETs within the retry budget of the session (v2 request)
+        self.retry_policy = retry_policy
+
+    def _session(self) -> requests.Session:
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("http://", self.adapter)
+            session.mount("https://", self.adapter)
+            # never share cookies between requests of different users
+            session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+            self.local.session = session
+        return session
+
+    def request(self, method: str, url: str, headers: dict, retry_budget: RetryBudget = None, **kwargs) -> requests.Response:
+        try:
+            return self._request(current_trace(), method, url, headers, retry_budget, **kwargs)
+        finally:
+            if method not in SAFE_METHODS:
+                self.invalidate_cache(headers)
+
+    def invalidate_cache(self, headers: dict):
+        """Cached responses of the caller are outdated, e.g. after a write or when its v3 job finished."""
+        if self.cache:
+            self.cache.invalidate(auth_scope(headers))
+
+    def _request(self, trace: Trace, method: str, url: str, headers: dict, retry_budget: RetryBudget = None, **kwargs) -> requests.Response:
+        # trace of the v2 request is passed explicitly as requests may run in another thread
+        kwargs.setdefault("allow_redirects", False)
+        start = time.perf_counter()
+        status = "error"
+        try:
+            key = self.single_flight.key(method, url, headers, kwargs) if self.single_flight else None
+            if key:
+                res = self.single_flight.do(key, lambda: self._send(method, url, headers, retry_budget, **kwargs))
+            else:
+                res = self._send(method, url, headers, retry_budget, **kwargs)
+            status = str(res.status_code)
+            return res
+        finally:
+            if self.metrics:
+                self.metrics.observe_upstream(method, url, status, time.perf_counter() - start, trace)
+
+    def _send(self, method: str, url: str, headers: dict, retry_budget: RetryBudget, **kwargs) -> requests.Response:
+        def send() -> requests.Response:
+            # thread-local session, hedged requests run in another thread
+            return self._session().request(method, url, headers=headers, **kwargs)
+
+        def send_within_rate_limit() -> requests.Response:
+            return self.rate_limiter.call(method, headers, send) if self.rate_limiter else send()
+
+        if self.retry_policy:
+            return self.retry_policy.call(method, url, retry_budget, send_within_rate_limit, (requests.ConnectionError,))
+        return send_within_rate_limit()
+
+    def submit_request(self, session: "CFApiSession", method: str, url: str, **kwargs) -> Future:
+        """Run the request in the background, the thread pool of the session limits the number of parallel requests."""
+        if session.executor is None:
+            session.executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        return session.executor.submit(self._request, current_trace(), method, url, session.headers, session.retry_budget, **kwargs)
+
+    def session(self, headers: dict) -> "CFApiSession":
+        return CFApiSession(self, headers)
+
+    def stats(self) -> dict:
+        pools = self.adapter.poolmanager.pools
+        connections = self.adapter.num_connections
+        requests_sent = 0
+        idle_connections = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            requests_sent += pool.num_requests
+            # the pool queue is pre-filled with None placeholders for not yet opened connections
+            idle_connections += sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0
+        return {
+            "pools": len(pools),
+            "connections": connections,  # = TCP/TLS handshakes
+            "idle_connections": idle_connections,
+            "requests": requests_sent,
+            "reused_connections": max(0, requests_sent - connections),
+        }
+
+
+class CFApiSession:
+    """CF API requests on behalf of one v2 request (e.g. with the same auth header)."""
+
+    def __init__(self, client: CFApiClient, headers: dict):
+        self.client = client
+        self.headers = headers
+        self.scope = auth_scope(headers)
+        # retries and hedges of all requests of the session
+        self.retry_budget = client.retry_policy.budget() if client.retry_policy else None
+        self.executor = None  # created on first submit (threads engine)
+        self.semaphore = None  # created on first submit (asyncio engine)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        if self.executor:
+            # don't wait for requests that are not needed anymore (e.g. after an error or deadline)
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        return self.client.request(method, url, self.headers, self.retry_budget, **kwargs)
+
+    def get(self, url: str, params: dict = None, cached: bool = False, shared: bool = False, **kwargs) -> requests.Response:
+        """GET url, cached=True uses and fills the response cache of the client (only for authenticated requests).
+
+        shared=True caches the response for all users, only for resources that are the same for all users that can see them
+        (e.g. space features) and if the caller checked that the user can see the resource (e.g. space in a list of the user).
+        """
+        cache, key, res = self._cache_lookup(url, params, cached, shared)
+        if res is None:
+            res = self.request("GET", url, params=params, **kwargs)
+            if cache:
+                cache.put(key, res, shared=shared)
+        return res
+
+    def submit(self, url: str, params: dict = None, cached: bool = False, shared: bool = False, **kwargs) -> Future:
+        """GET url in the background and return a future for the response, used to run independent requests in parallel."""
+        cache, key, res = self._cache_lookup(url, params, cached, shared)
+        if res is not None:
+            future = Future()
+            future.set_result(res)
+            return future
+        future = self.client.submit_request(self, "GET", url, params=params, **kwargs)
+        if cache:
+            future.add_done_callback(
+                lambda f: cache.put(key, f.result(), shared=shared) if not f.cancelled() and not f.exception() else None
+            )
+        return future
+
+    def _cache_lookup(self, url: str, params: dict, cached: bool, shared: bool = False) -> tuple:
+        cache = self.client.cache if cached and self.scope else None
+        if not cache:
+            return (None, None, None)
+        key = cache.key(SHARED_SCOPE if shared else self.scope, url, params)
+        return (cache, key, cache.get(key))
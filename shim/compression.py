@@ -0,0 +1,126 @@
+import logging
+import zlib
+from typing import Iterable
+import flask
+
+try:
+    import brotli
+except ImportError:  # optional, better ratio than gzip for json
+    brotli = None
+try:
+    import zstandard
+except ImportError:  # optional, faster than gzip at a similar ratio
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# supported encodings in order of preference (if the client accepts several with the same q-value)
+ENCODINGS = ["br", "zstd", "gzip"]
+AVAILABLE_ENCODINGS = [e for e in ENCODINGS if e == "gzip" or (e == "br" and brotli) or (e == "zstd" and zstandard)]
+COMPRESSIBLE_MIMETYPES = ["application/json", "application/javascript", "application/xml"]
+
+
+class Compressor:
+    """Incremental compression of a response body: compress() returns the compressed data of a chunk so far (flushed so
+    that the client can decode it, e.g. for streamed lists), finish() the rest."""
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self.compressor = zlib.compressobj(max(1, min(level, 9)), zlib.DEFLATED, 31)  # 31 = gzip header
+        elif encoding == "br":
+            self.compressor = brotli.Compressor(quality=max(0, min(level, 11)))
+        elif encoding == "zstd":
+            self.compressor = zstandard.ZstdCompressor(level=max(1, min(level, 22))).compressobj()
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "gzip":
+            return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        if self.encoding == "br":
+            return self.compressor.process(data) + self.compressor.flush()
+        return self.compressor.compress(data) + self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        if self.encoding == "gzip":
+            return self.compressor.flush()
+        if self.encoding == "br":
+            return self.compressor.finish()
+        return self.compressor.flush()
+
+
+def negotiate(accept_encoding: str, encodings: list[str]) -> str:
+    """Encoding of encodings (in order of preference) with the highest q-value in the Accept-Encoding header, None if none
+    is accepted (identity)."""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name.strip():
+            accepted[name.strip().lower()] = q
+    candidates = [(accepted.get(e, accepted.get("*", 0.0)), -i, e) for (i, e) in enumerate(encodings)]
+    q, _, encoding = max(candidates, default=(0.0, 0, None))
+    return encoding if q > 0 else None
+
+
+def compressible(response: flask.Response) -> bool:
+    mimetype = response.mimetype or ""
+    return (
+        response.status_code >= 200
+        and response.status_code not in [204, 206, 304]
+        and "Content-Encoding" not in response.headers
+        and not response.direct_passthrough
+        and (mimetype.startswith("text/") or mimetype in COMPRESSIBLE_MIMETYPES or mimetype.endswith("+json"))
+    )
+
+
+def compress_response(
+    response: flask.Response, accept_encoding: str, min_bytes: int = 1024, level: int = 6, encodings: list[str] = None
+) -> flask.Response:
+    """Compresses the body of a json or text response with the best encoding accepted by the client.
+
+    Bodies smaller than min_bytes are sent as is. Streamed bodies (e.g. v2 lists) are compressed chunk by chunk while they
+    are sent, their size isn't known in advance, they are always compressed.
+    """
+    if not compressible(response):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate(accept_encoding, AVAILABLE_ENCODINGS if encodings is None else encodings)
+    if encoding is None:
+        return response
+    compressor = Compressor(encoding, level)
+    if response.is_streamed:
+        response.response = compressed_chunks(response.response, compressor)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < min_bytes:
+            return response
+        response.set_data(compressor.compress(data) + compressor.finish())
+    response.headers["Content-Encoding"] = encoding
+    etag = response.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        # same resource, different bytes
+        response.headers["ETag"] = f"W/{etag}"
+    return response
+
+
+def compressed_chunks(chunks: Iterable[bytes], compressor: Compressor):
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield compressor.finish()
+    finally:
+        # e.g. closes the upstream response of a streamed proxy response
+        if hasattr(chunks, "close"):
+            chunks.close()
@@ -0,0 +1,217 @@
+import logging
+import urllib.parse
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Callable
+import requests
+from shim.cfapi import CFApiSession
+from shim.projection import parse_list
+
+logger = logging.getLogger(__name__)
+
+# conservative limit, CF API (nginx, gorouter) and proxies in between may reject longer request lines
+MAX_URL_LENGTH = 4096
+# bytes of the body that are decoded and parsed at a time, see list_json
+PARSE_CHUNK_SIZE = 64 * 1024
+
+
+def fetch_json_all(session: CFApiSession, urls: list[str], deadline: float, cached: bool = False, shared: bool = False) -> list:
+    """GET all urls in parallel (limited by the concurrency of the session), cached and shared like CFApiSession.get.
+
+    Returns the json responses in the order of urls. Responses that are not available within deadline (seconds) or failed are None.
+    """
+    futures = [session.submit(url, cached=cached, shared=shared, timeout=deadline) for url in urls]
+    done, not_done = wait(futures, timeout=deadline)
+    if not_done:
+        logger.warning(f"{len(not_done)} of {len(urls)} requests not finished within {deadline} s")
+        for future in not_done:
+            future.cancel()
+
+    results = []
+    for future in futures:
+        if future in done and not future.exception():
+            res = future.result()
+            results.append(res.json() if res.status_code == 200 else None)
+        else:
+            if future in done:
+                logger.warning(f"request failed: {future.exception()}")
+            results.append(None)
+    return results
+
+
+def fetch_all_pages(session: CFApiSession, url: str, params: dict = None) -> list:
+    """GET all resources of a v3 list endpoint by following the pagination links."""
+    resources = []
+    while url:
+        res = session.get(url, params=params)
+        res.raise_for_status()
+        res_json = res.json()
+        resources.extend(res_json["resources"])
+        url = res_json["pagination"]["next"]["href"] if res_json["pagination"]["next"] else None
+        params = None  # next link contains all query params
+    return resources
+
+
+def list_json(res: requests.Response, record: type = None) -> dict:
+    """Parsed v3 list response, the resources projected to record (e.g. projection.BuildRecord) while parsing if given.
+
+    With record, the body is parsed chunk by chunk: read from the connection for streamed responses (stream=True), else
+    sliced from the loaded body without decoding all of it at once.
+    """
+    return parse_list(res.iter_content(PARSE_CHUNK_SIZE), record) if record else res.json()
+
+
+def guid_chunks(url: str, params: dict, guids_param: str, guids: list[str], max_url_length: int = MAX_URL_LENGTH) -> list[list[str]]:
+    """Split guids into chunks so that url with params and guids_param=<chunk> stays below max_url_length."""
+    base_length = len(requests.Request("GET", url, params=params).prepare().url) + len(f"&{guids_param}=")
+    chunks = []
+    chunk = []
+    length = base_length
+    for guid in guids:
+        guid_length = len(urllib.parse.quote(guid, safe="")) + (len("%2C") if chunk else 0)
+        if chunk and length + guid_length > max_url_length:
+            chunks.append(chunk)
+            chunk = []
+            length = base_length
+            guid_length = len(urllib.parse.quote(guid, safe=""))
+        chunk.append(guid)
+        length += guid_length
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+class ChunkedFetch:
+    """GET all resources of a v3 list endpoint filtered by a (long) list of guids, e.g. processes of all apps of a page.
+
+    The guids are split into chunks that fit into the url. The first page of every chunk is requested immediately and in
+    parallel, result() follows the pagination links of all chunks and returns the resources in the order of chunks and pages.
+    Included resources (params include=...) are available after result() in included: name -> {guid: resource}.
+    With record, the resources are projected to compact records while the pages are parsed (see projection.parse_list).
+    """
+
+    def __init__(
+        self,
+        session: CFApiSession,
+        url: str,
+        guids_param: str,
+        guids: list[str],
+        params: dict = None,
+        max_url_length: int = MAX_URL_LENGTH,
+        record: type = None,
+    ):
+        self.session = session
+        self.record = record
+        self.url = url
+        self.guids_param = guids_param
+        self.params = params or {}
+        self.chunks = guid_chunks(url, self.params, guids_param, guids, max_url_length)
+        self.pages = [[] for _ in self.chunks]
+        self.included = {}
+        self.futures = {}
+        for i in range(len(self.chunks)):
+            self._submit_chunk(i)
+
+    def _submit_chunk(self, i: int):
+        params = {**self.params, self.guids_param: ",".join(self.chunks[i])}
+        self.futures[self.session.submit(self.url, params=params)] = i
+
+    def _add_page(self, i: int, resources: list):
+        self.pages[i].append(resources)
+
+    def _next_page(self, i: int, res_json: dict):
+        if res_json["pagination"]["next"]:
+            # next link contains all query params
+            self.futures[self.session.submit(res_json["pagination"]["next"]["href"])] = i
+
+    def result(self) -> list:
+        try:
+            while self.futures:
+                done, _ = wait(self.futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = self.futures.pop(future)
+                    res = future.result()
+                    res.raise_for_status()
+                    res_json = list_json(res, self.record)
+                    self._add_page(i, res_json["resources"])
+                    for name, resources in res_json.get("included", {}).items():
+                        self.included.setdefault(name, {}).update((resource["guid"], resource) for resource in resources)
+                    self._next_page(i, res_json)
+        finally:
+            for future in self.futures:
+                future.cancel()
+        return [resource for chunk_pages in self.pages for page in chunk_pages for resource in page]
+
+    def result_by(self, key: Callable[[dict], str]) -> dict:
+        """Resources of all chunks merged into a map key(resource) -> resource, the last resource wins for duplicate keys."""
+        return {key(resource): resource for resource in self.result()}
+
+
+class FetchedResources:
+    """Resources that are already available (e.g. from a query with pushed down filters) with the interface of ChunkedFetch."""
+
+    def __init__(self, resources: list[dict]):
+        self.resources = resources
+
+    def result(self) -> list:
+        return self.resources
+
+    def result_by(self, key: Callable[[dict], str]) -> dict:
+        return {key(resource): resource for resource in self.resources}
+
+
+class LatestChunkedFetch(ChunkedFetch):
+    """Like ChunkedFetch but only fetches the newest resource per guid, e.g. the latest build of every app of a page.
+
+    Resources are requested newest first (order_by=-created_at). Instead of reading all pages, the next request of a chunk
+    only asks for the guids without a resource so far, with a page size based on the number of these guids. Every request
+    finds the newest resource of at least one more guid. key(resource) must return the guid used in the filter.
+    """
+
+    def __init__(
+        self,
+        session: CFApiSession,
+        url: str,
+        guids_param: str,
+        guids: list[str],
+        key: Callable[[dict], str],
+        params: dict = None,
+        max_url_length: int = MAX_URL_LENGTH,
+        record: type = None,
+    ):
+        self.key = key
+        # chunk -> guids with a resource so far
+        self.found = {}
+        # per_page with max. length for the url length calculation of the chunks
+        params = {**(params or {}), "order_by": "-created_at", "per_page": 5000}
+        super().__init__(session, url, guids_param, guids, params, max_url_length, record)
+
+    def _submit_chunk(self, i: int):
+        # expect about 2 resources per guid on the first page (e.g. after restaging), at least 50
+        per_page = min(5000, max(50, 2 * len(self.chunks[i])))
+        params = {**self.params, "per_page": per_page, self.guids_param: ",".join(self.chunks[i])}
+        self.futures[self.session.submit(self.url, params=params)] = i
+
+    def _add_page(self, i: int, resources: list):
+        # only the newest resource per guid is kept, e.g. not all builds of the apps on the first page
+        found = self.found.setdefault(i, set())
+        page = []
+        for resource in resources:
+            key = self.key(resource)
+            if key not in found:
+                found.add(key)
+                page.append(resource)
+        self.pages[i].append(page)
+
+    def _next_page(self, i: int, res_json: dict):
+        if res_json["pagination"]["next"]:
+            found = self.found.get(i, set())
+            self.chunks[i] = [guid for guid in self.chunks[i] if guid not in found]
+            if self.chunks[i]:
+                self._submit_chunk(i)
+
+    def result(self) -> list:
+        latest = {}
+        for resource in super().result():
+            # first = newest resource per guid
+            latest.setdefault(self.key(resource), resource)
+        return list(latest.values())
@@ -0,0 +1,172 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+import requests
+from shim.cache import auth_scope
+
+logger = logging.getLogger(__name__)
+
+# v3 job states that end polling (other states: PROCESSING, POLLING)
+FINAL_JOB_STATES = ["COMPLETE", "FAILED"]
+
+
+class PolledJob:
+    def __init__(self, url: str, headers: dict, interval: float):
+        self.url = url
+        self.headers = headers
+        self.interval = interval
+        self.next_poll = time.monotonic() + interval
+        self.polling = False
+        self.futures = []
+
+
+class JobPoller:
+    """Polls the v3 jobs that synchronous v2 requests wait for (e.g. DELETE /v2/apps/:guid -> job of DELETE /v3/apps/:guid).
+
+    All outstanding jobs of a process are tracked by one background loop, waiting v2 requests only wait for the future
+    returned by submit(), they don't poll themselves. Jobs that are due are polled together in one round, in parallel
+    (limited by concurrency), the same job of the same caller is polled once for all requests waiting for it. The poll
+    interval of a job starts at min_interval and grows by backoff after every poll up to max_interval: short jobs finish
+    with little delay, long jobs cause few requests. Futures complete with the final job response (state COMPLETE or
+    FAILED, or an error response) or with the exception of the poll request.
+
+    A request that waits in wait() still blocks its server thread. At most max_waiting requests per process wait (0: no
+    limit), further requests don't wait (like a timeout) so that waiting requests don't take all server threads.
+    """
+
+    def __init__(
+        self,
+        client,
+        min_interval: float = 0.2,
+        max_interval: float = 5.0,
+        backoff: float = 1.5,
+        concurrency: int = 8,
+        max_waiting: int = 0,
+    ):
+        self.client = client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.concurrency = concurrency
+        self.max_waiting = max_waiting
+        self.lock = threading.Lock()
+        self.pid = None
+        self.cond = None
+        self.executor = None
+        self.jobs = {}  # caller identity + job url -> PolledJob
+        self.polls = 0
+        self.completed = 0
+        self.waiting = 0
+        self.not_waited = 0
+
+    def _start(self):
+        # loop thread and executor are started on first use, i.e. in every (forked) worker process
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.cond = threading.Condition()
+                    self.jobs = {}
+                    self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="job-poll")
+                    threading.Thread(target=self._run, name="job-poller", daemon=True).start()
+                    self.pid = os.getpid()
+
+    def submit(self, url: str, headers: dict) -> Future:
+        """Future for the final response of the job at url, polled with the headers (auth) of the caller."""
+        self._start()
+        future = Future()
+        key = self._key(url, headers)
+        with self.cond:
+            job = self.jobs.get(key)
+            if job is None:
+                job = PolledJob(url, headers, self.min_interval)
+                self.jobs[key] = job
+                self.cond.notify()
+            job.futures.append(future)
+        return future
+
+    def _key(self, url: str, headers: dict) -> str:
+        return f"{auth_scope(headers)} {url}"
+
+    def _run(self):
+        while True:
+            with self.cond:
+                now = time.monotonic()
+                due = [(key, job) for (key, job) in self.jobs.items() if not job.polling and job.next_poll <= now]
+                if not due:
+                    next_poll = min((job.next_poll for job in self.jobs.values() if not job.polling), default=None)
+                    # woken up by submit() and finished polls
+                    self.cond.wait(next_poll - now if next_poll else None)
+                    continue
+                for _, job in due:
+                    job.polling = True
+            logger.debug(f"Polling {len(due)} of {len(self.jobs)} jobs")
+            for key, job in due:
+                self.executor.submit(self._poll, key, job)
+
+    def _poll(self, key: str, job: PolledJob):
+        res = None
+        error = None
+        try:
+            res = self.client.request("GET", job.url, job.headers)
+        except Exception as e:
+            error = e
+        with self.cond:
+            self.polls += 1
+            final = error is not None or res.status_code != 200 or res.json().get("state") in FINAL_JOB_STATES
+            job.polling = False
+            if not final and not job.futures:
+                # all waiting requests timed out
+                del self.jobs[key]
+                return
+            if not final:
+                job.interval = min(self.max_interval, job.interval * self.backoff)
+                job.next_poll = time.monotonic() + job.interval
+                self.cond.notify()
+                return
+            del self.jobs[key]
+            self.completed += 1
+            futures = job.futures
+        for future in futures:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(res)
+
+    def wait(self, url: str, headers: dict, timeout: float) -> requests.Response:
+        """Final response of the job, None if the job didn't finish within timeout (seconds) or max_waiting requests
+        already wait (returns immediately)."""
+        with self.lock:
+            if self.max_waiting and self.waiting >= self.max_waiting:
+                self.not_waited += 1
+                return None
+            self.waiting += 1
+        try:
+            return self._wait(url, headers, timeout)
+        finally:
+            with self.lock:
+                self.waiting -= 1
+
+    def _wait(self, url: str, headers: dict, timeout: float) -> requests.Response:
+        future = self.submit(url, headers)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            # stop polling if no other request waits for the job
+            with self.cond:
+                job = self.jobs.get(self._key(url, headers))
+                if job and future in job.futures:
+                    job.futures.remove(future)
+                    if not job.futures and not job.polling:
+                        del self.jobs[self._key(url, headers)]
+            return None
+
+    def stats(self) -> dict:
+        return {
+            "jobs": len(self.jobs),
+            "polls": self.polls,
+            "completed": self.completed,
+            "waiting": self.waiting,
+            "not_waited": self.not_waited,
+        }
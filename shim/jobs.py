@@ -0,0 +1,121 @@
+import flask
+import logging
+from __main__ import app, cfapi, cfapi_url, job_poller, job_sync_timeout
+from shim.jobpoller import FINAL_JOB_STATES
+from shim.metrics import timed
+from shim.utils import cfapi_request_headers, cfapi_response_headers
+
+logger = logging.getLogger(__name__)
+
+# error of a failed v3 job without errors
+UNKNOWN_JOB_ERROR = {"code": 10001, "title": "CF-UnknownError", "detail": "An unknown error occurred."}
+
+
+def v2_associations_error(session, resource_type: str, associations: dict) -> flask.Response | None:
+    """Error response of a v2 delete with recursive=false (v2 default) if the resource still has associations, None if it has
+    none (or the error of a v3 list request). associations: name -> url of the v3 list of the associated resources.
+    v3 deletes recursively, associations created after the check are deleted as well.
+    """
+    futures = {name: session.submit(url, params={"per_page": 1}) for name, url in associations.items()}
+    for name, future in futures.items():
+        v3_res = future.result()
+        if v3_res.status_code >= 400:
+            # TODO: error mapping
+            return flask.make_response(v3_res.content, v3_res.status_code, cfapi_response_headers(v3_res.headers))
+        if v3_res.json()["pagination"]["total_results"] > 0:
+            v2_error = {
+                "code": 10006,
+                "description": f"Please delete the {name} associations for your {resource_type}.",
+                "error_code": "CF-AssociationNotEmpty",
+            }
+            return flask.make_response(v2_error, 400)
+    return None
+
+
+def job_state_v3_to_v2(v3_state: str) -> str:
+    if v3_state == "COMPLETE":
+        return "finished"
+    elif v3_state == "FAILED":
+        return "failed"
+    else:
+        # PROCESSING, POLLING
+        return "running"
+
+
+def job_error_v3_to_v2(v3_error: dict) -> dict:
+    return {"code": v3_error["code"], "description": v3_error["detail"], "error_code": v3_error["title"]}
+
+
+def job_error(v3_job: dict) -> dict:
+    """First error of a failed v3 job."""
+    return (v3_job.get("errors") or [UNKNOWN_JOB_ERROR])[0]
+
+
+@timed
+def job_v3_to_v2(v3_job: dict) -> dict:
+    guid = v3_job["guid"]
+    v2_job = {
+        "metadata": {
+            "guid": guid,
+            "created_at": v3_job["created_at"],
+            "url": f"/v2/jobs/{guid}",
+        },
+        "entity": {
+            "guid": guid,
+            "status": job_state_v3_to_v2(v3_job["state"]),
+        },
+    }
+    if v3_job["state"] == "FAILED":
+        v2_job["entity"]["error"] = "Use of entity>error is deprecated in favor of entity>error_details."
+        v2_job["entity"]["error_details"] = job_error_v3_to_v2(job_error(v3_job))
+    return v2_job
+
+
+def v2_job_response(v3_res, sync: bool) -> flask.Response:
+    """Response of a v2 request whose v3 request always runs as job (202 with job url in the Location header).
+
+    sync (v2 async=false): waits for the job (polled by the job poller, not by this request) and returns 204, or the error
+    of the failed job. Jobs that don't finish within job_sync_timeout, requests that exceed the max. number of waiting
+    requests (the request thread is blocked while waiting) and async=true return 202 with the v2 job.
+    Only deletes are shimmed this way: v3 updates of the shimmed resources (apps, spaces) don't run as jobs.
+    """
+    headers = cfapi_request_headers(flask.request.headers)
+    if v3_res.status_code != 202:
+        # TODO: error mapping
+        return flask.make_response(v3_res.content, v3_res.status_code, cfapi_response_headers(v3_res.headers))
+
+    job_url = v3_res.headers.get("Location")
+    if not job_url:
+        logger.error(f"v3 job response without Location header: {v3_res.url}")
+        error = {**UNKNOWN_JOB_ERROR, "detail": "Job of the CF API request not found (no Location header)."}
+        return flask.make_response(job_error_v3_to_v2(error), 502, cfapi_response_headers(v3_res.headers))
+    if sync:
+        job_res = job_poller.wait(job_url, headers, job_sync_timeout)
+        if job_res is not None and job_res.status_code == 200:
+            v3_job = job_res.json()
+            # e.g. the deleted app is gone now, not only after the v3 request that started the job
+            cfapi.invalidate_cache(headers)
+            if v3_job["state"] == "COMPLETE":
+                return flask.Response(status=204, headers=cfapi_response_headers(v3_res.headers))
+            # TODO: error mapping (v3 job errors have no http status)
+            return flask.make_response(job_error_v3_to_v2(job_error(v3_job)), 422, cfapi_response_headers(job_res.headers))
+        if job_res is not None:
+            return flask.make_response(job_res.content, job_res.status_code, cfapi_response_headers(job_res.headers))
+        logger.info(f"Job {job_url} not finished within {job_sync_timeout} s or too many waiting requests, responding with v2 job")
+
+    job_res = cfapi.request("GET", job_url, headers)
+    if job_res.status_code != 200:
+        return flask.make_response(job_res.content, job_res.status_code, cfapi_response_headers(job_res.headers))
+    return flask.make_response(job_v3_to_v2(job_res.json()), 202, cfapi_response_headers(job_res.headers))
+
+
+@app.route("/v2/jobs/<uuid:guid>")
+def v2_get_job(guid):
+    headers = cfapi_request_headers(flask.request.headers)
+    v3_job_res = cfapi.request("GET", f"{cfapi_url}/v3/jobs/{guid}", headers)
+    if v3_job_res.status_code >= 400:
+        # TODO: error mapping
+        return flask.make_response(v3_job_res.content, v3_job_res.status_code, cfapi_response_headers(v3_job_res.headers))
+    if v3_job_res.json()["state"] in FINAL_JOB_STATES:
+        cfapi.invalidate_cache(headers)
+    return flask.make_response(job_v3_to_v2(v3_job_res.json()), v3_job_res.status_code, cfapi_response_headers(v3_job_res.headers))
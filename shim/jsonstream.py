@@ -0,0 +1,60 @@
+import itertools
+import json
+import logging
+from typing import Iterable
+import flask
+
+try:
+    import orjson
+except ImportError:  # optional, about 5x faster than json
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+def dumps(obj) -> bytes:
+    """Compact json with sorted keys like flask.jsonify, using orjson if available (non-ascii characters are not escaped)."""
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, separators=(",", ":"), sort_keys=True).encode()
+
+
+def v2_list_body(pagination: dict, resources: Iterable[dict], chunk_size: int = CHUNK_SIZE):
+    """v2 list response body: pagination attributes followed by the resources, each resource is encoded as soon as it is
+    produced (e.g. by a generator that translates v3 to v2 resources). Yields the first chunk after the first resource,
+    later chunks when they reach chunk_size."""
+    header = dumps(pagination)
+    buffer = bytearray(header[:-1] + b',"resources":[' if len(header) > 2 else b'{"resources":[')
+    count = 0
+    try:
+        for resource in resources:
+            if count:
+                buffer += b","
+            buffer += dumps(resource)
+            if not count or len(buffer) >= chunk_size:
+                yield bytes(buffer)
+                buffer.clear()
+            count += 1
+    except Exception:
+        if count:
+            # status and first chunks are sent: the exception aborts the connection (no end of the chunked body), the
+            # client sees a failed transfer instead of a complete response
+            logger.exception(f"Aborting streamed v2 list response after {count} resources")
+        raise
+    buffer += b"]}"
+    yield bytes(buffer)
+
+
+def v2_list_response(pagination: dict, resources: Iterable[dict], headers: dict = None) -> flask.Response:
+    """Streamed v2 list response, resources are translated and encoded while the response is sent.
+
+    The first chunk (pagination and first resource) is produced before the response is returned: if the translation fails
+    already there, the handler fails with an error status. Runs with the request context, e.g. for the trace of translation
+    times.
+    """
+    chunks = v2_list_body(pagination, resources)
+    first = next(chunks)
+    body = flask.stream_with_context(itertools.chain([first], chunks))
+    return flask.Response(body, 200, headers, mimetype="application/json")
@@ -0,0 +1,41 @@
+import logging
+from typing import Callable, Iterable
+from shim.utils import paginate_v3
+
+logger = logging.getLogger(__name__)
+
+PAGINATION_PARAMS = ["page", "per_page", "order_by"]
+
+# v3 filters that can be evaluated in the shim: filter param -> value of the resource
+LOCAL_FILTERS: dict[str, Callable[[dict], str]] = {
+    "guids": lambda r: r["guid"],
+    "names": lambda r: r.get("name"),
+    "organization_guids": lambda r: r["relationships"]["organization"]["data"]["guid"],
+    "space_guids": lambda r: r["relationships"]["space"]["data"]["guid"],
+}
+
+
+class LocalQuery:
+    """v3 list query (filters, order_by, page, per_page) evaluated in the shim on a set of candidate resources.
+
+    For v2 queries that v3 can't answer with one request, e.g. the spaces of a user with many roles (too many guids for
+    an url): the candidates come from another query (e.g. roles with include=space), the remaining filters, the order
+    and the pagination are applied locally. run() returns a v3 list response, pagination_v3_to_v2 translates it to v2.
+    """
+
+    def __init__(self, v3_params: dict):
+        self.params = v3_params
+        self.filters = {k: set(v.split(",")) for (k, v) in v3_params.items() if k not in PAGINATION_PARAMS}
+        unsupported = self.filters.keys() - LOCAL_FILTERS.keys()
+        if unsupported:
+            raise ValueError(f"Filters not supported locally: {sorted(unsupported)}")
+
+    @staticmethod
+    def supports(v3_params: dict) -> bool:
+        return all(k in LOCAL_FILTERS for k in v3_params if k not in PAGINATION_PARAMS)
+
+    def matches(self, resource: dict) -> bool:
+        return all(LOCAL_FILTERS[k](resource) in values for (k, values) in self.filters.items())
+
+    def run(self, resources: Iterable[dict], path: str) -> dict:
+        return paginate_v3([r for r in resources if self.matches(r)], path, self.params)
@@ -0,0 +1,164 @@
+import bisect
+import collections
+import functools
+import logging
+import re
+import threading
+import time
+import urllib.parse
+import flask
+
+logger = logging.getLogger(__name__)
+
+# seconds, same as the Prometheus client default buckets
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+CALLS_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500]
+GUID_PATTERN = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", re.IGNORECASE)
+
+
+def path_template(url: str) -> str:
+    """Path of a CF API url without query and with guids replaced, e.g. /v3/apps/:guid/processes/web."""
+    return GUID_PATTERN.sub(":guid", urllib.parse.urlparse(url).path) or "/"
+
+
+class Trace:
+    """Upstream calls and translation times of one v2 request, reported in the Server-Timing header and in /metrics."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()  # upstream calls are recorded by parallel threads resp. the event loop
+        self.upstream_calls = []  # (method, path, status, duration)
+        # forwarded requests (e.g. unshimmed v2 requests) have client-chosen paths, see Metrics.observe_upstream
+        self.forwarded = False
+        self.spans = collections.defaultdict(lambda: [0, 0.0])  # name -> [count, duration]
+
+    def add_upstream_call(self, method: str, path: str, status: str, duration: float):
+        with self.lock:
+            self.upstream_calls.append((method, path, status, duration))
+
+    def add_span(self, name: str, duration: float):
+        with self.lock:
+            span = self.spans[name]
+            span[0] += 1
+            span[1] += duration
+
+    def server_timing(self, total: float) -> str:
+        """Server-Timing header value: one cfapi entry per upstream method, path and status (dur = sum of the durations of
+        all calls, calls may run in parallel), one entry per translation function and the total duration."""
+        with self.lock:
+            upstream = collections.defaultdict(lambda: [0, 0.0])
+            for method, path, status, duration in self.upstream_calls:
+                entry = upstream[(method, path, status)]
+                entry[0] += 1
+                entry[1] += duration
+            entries = [
+                f'cfapi;desc="{method} {path} {status} {count}x";dur={duration * 1000:.1f}'
+                for ((method, path, status), (count, duration)) in upstream.items()
+            ]
+            entries += [f'{name};desc="{count}x";dur={duration * 1000:.1f}' for (name, (count, duration)) in self.spans.items()]
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries)
+
+
+def current_trace() -> Trace:
+    """Trace of the v2 request handled by the current thread, None outside of requests (e.g. background refresh)."""
+    return flask.g.get("trace") if flask.has_app_context() else None
+
+
+def timed(fn):
+    """Adds the time spent in fn (e.g. a v3 to v2 translation) to the trace of the current request."""
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        trace = current_trace()
+        if trace is None:
+            return fn(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            trace.add_span(fn.__name__, time.perf_counter() - start)
+
+    return wrapper
+
+
+class Histogram:
+    def __init__(self, buckets: list):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Process-wide request metrics in Prometheus text format (/metrics).
+
+    - shim_request_duration_seconds: v2 requests per endpoint (route), method and status
+    - shim_request_cfapi_calls: number of CF API calls per v2 request
+    - shim_translation_duration_seconds: time spent in v3 to v2 translations per v2 request
+    - shim_cfapi_request_duration_seconds: CF API requests per method, path (guids replaced) and status, path="other" for
+      forwarded requests (any path a client sends, would be unbounded)
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}  # (name, labels) -> Histogram
+
+    def _observe(self, name: str, labels: tuple, value: float, buckets: list):
+        with self.lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[(name, labels)] = Histogram(buckets)
+            histogram.observe(value)
+
+    def observe_request(self, endpoint: str, method: str, status: int, duration: float, trace: Trace):
+        labels = (("endpoint", endpoint), ("method", method), ("status", str(status)))
+        self._observe("shim_request_duration_seconds", labels, duration, DURATION_BUCKETS)
+        self._observe("shim_request_cfapi_calls", (("endpoint", endpoint),), len(trace.upstream_calls), CALLS_BUCKETS)
+        for name, (_, span_duration) in trace.spans.items():
+            self._observe(
+                "shim_translation_duration_seconds", (("endpoint", endpoint), ("translation", name)), span_duration, DURATION_BUCKETS
+            )
+
+    def observe_upstream(self, method: str, url: str, status: str, duration: float, trace: Trace = None):
+        path = path_template(url)
+        labels = (("method", method), ("path", "other" if trace and trace.forwarded else path), ("status", status))
+        self._observe("shim_cfapi_request_duration_seconds", labels, duration, DURATION_BUCKETS)
+        if trace:
+            trace.add_upstream_call(method, path, status, duration)
+
+    def render(self, stats: dict = None) -> str:
+        """Prometheus text format, stats = additional gauges e.g. {"cache": {"hits": 1}} -> shim_cache_hits 1."""
+        lines = []
+        with self.lock:
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+            snapshot = [(key, histogram.buckets, list(histogram.counts), histogram.sum, histogram.count) for (key, histogram) in histograms]
+        last_name = None
+        for (name, labels), buckets, counts, total, count in snapshot:
+            if name != last_name:
+                lines.append(f"# TYPE {name} histogram")
+                last_name = name
+            cumulative = 0
+            for bucket, bucket_count in zip(buckets + ["+Inf"], counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', str(bucket)),))} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+        for group, values in (stats or {}).items():
+            for key, value in (values or {}).items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"# TYPE shim_{group}_{key} gauge")
+                    lines.append(f"shim_{group}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels: tuple) -> str:
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return "{" + ",".join(f'{k}="{escape(v)}"' for (k, v) in labels) + "}"
@@ -0,0 +1,123 @@
+import logging
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Callable
+from shim.cfapi import CFApiSession
+
+logger = logging.getLogger(__name__)
+
+
+class Step:
+    def __init__(self, name: str, fn: Callable, deps: list[str], then: Callable = None):
+        self.name = name
+        self.fn = fn
+        self.deps = deps
+        self.then = then
+
+    def start(self, session: CFApiSession, results: dict):
+        return self.fn(session, **{dep: results[dep] for dep in self.deps})
+
+    def complete(self, future: Future):
+        return self.then(future.result()) if self.then else future.result()
+
+
+class Plan:
+    """v3 requests of a v2 endpoint declared as named steps with dependencies, run() executes them as a DAG.
+
+    A step is a function of the session and the results of its dependencies (keyword args named like the dependencies).
+    It returns the step result or a Future for it (e.g. session.submit), then= is applied to the result of a Future (e.g.
+    response -> json). run() starts every step as soon as the results of its dependencies are available, so independent
+    requests run in parallel and dependent requests don't wait for unrelated ones.
+
+    Steps run in the thread of the v2 request, ready steps in declaration order. Steps that block (e.g. ChunkedFetch.result(),
+    catalog lookups) should be declared after the steps that only start requests. Dependencies must be declared before
+    the step (no cycles). Plans are immutable after declaration and can be shared by all requests of an endpoint.
+    """
+
+    def __init__(self, inputs: list[str] = None):
+        self.inputs = inputs or []
+        self.steps = {}
+
+    def step(self, name: str, fn: Callable, deps: list[str] = None, then: Callable = None) -> "Plan":
+        deps = deps or []
+        if name in self.steps or name in self.inputs:
+            raise ValueError(f"Duplicate step {name}")
+        unknown = [dep for dep in deps if dep not in self.steps and dep not in self.inputs]
+        if unknown:
+            raise ValueError(f"Step {name} depends on unknown steps {unknown}")
+        self.steps[name] = Step(name, fn, deps, then)
+        return self
+
+    def fetch(
+        self, name: str, url, deps: list[str] = None, params=None, cached: bool = False, shared: bool = False, then: Callable = None
+    ) -> "Plan":
+        """GET url in the background, url and params are values or functions of the dependencies (keyword args)."""
+
+        def submit(session: CFApiSession, **results):
+            return session.submit(
+                url(**results) if callable(url) else url,
+                params=params(**results) if callable(params) else params,
+                cached=cached,
+                shared=shared,
+            )
+
+        return self.step(name, submit, deps, then)
+
+    def extend(self, plan: "Plan") -> "Plan":
+        """Adds the steps of another plan (e.g. the single app plan to the app summary plan), its inputs must be inputs or
+        steps of this plan."""
+        for step in plan.steps.values():
+            self.step(step.name, step.fn, step.deps, step.then)
+        return self
+
+    def run(self, session: CFApiSession, **inputs) -> dict:
+        """Executes all steps and returns their results (and the inputs) by name. The first failing step fails the run."""
+        missing = [name for name in self.inputs if name not in inputs]
+        if missing:
+            raise ValueError(f"Missing plan inputs {missing}")
+        results = dict(inputs)
+        waiting = list(self.steps.values())
+        pending = {}
+        try:
+            waiting = self._start_ready(session, waiting, pending, results)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step = pending.pop(future)
+                    results[step.name] = step.complete(future)
+                waiting = self._start_ready(session, waiting, pending, results)
+        finally:
+            # e.g. after a failed step
+            for future in pending:
+                future.cancel()
+        return results
+
+    def _start_ready(self, session: CFApiSession, waiting: list[Step], pending: dict, results: dict) -> list[Step]:
+        # steps are in declaration order (dependencies first), one pass also starts steps that depend on immediate results
+        not_ready = []
+        for step in waiting:
+            if all(dep in results for dep in step.deps):
+                result = step.start(session, results)
+                if isinstance(result, Future):
+                    pending[result] = step
+                else:
+                    results[step.name] = result
+            else:
+                not_ready.append(step)
+        return not_ready
+
+
+def json_body(res) -> dict:
+    return res.json()
+
+
+def json_or_none(res) -> dict:
+    """json of a successful response, None otherwise (e.g. 404 for the current droplet of an app without droplet)."""
+    return res.json() if res.status_code == 200 else None
+
+
+def first_resource(res) -> dict:
+    """First resource of a v3 list response, None for an empty list or failed request (e.g. latest build of an app)."""
+    if res.status_code != 200:
+        return None
+    res_json = res.json()
+    return res_json["resources"][0] if res_json["pagination"]["total_results"] > 0 else None
@@ -0,0 +1,256 @@
+import codecs
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+decoder = json.JSONDecoder()
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+def project(value, projection: dict):
+    """value reduced to the keys of projection: key -> projection of the nested value, None keeps the whole value. Lists
+    are projected item by item, missing keys are left out (like in the v3 resource)."""
+    if projection is None or value is None:
+        return value
+    if isinstance(value, list):
+        return [project(item, projection) for item in value]
+    if isinstance(value, dict):
+        return {key: value[key] if nested is None else project(value[key], nested) for (key, nested) in projection.items() if key in value}
+    return value
+
+
+def relationship_guid(relationship: dict) -> str:
+    data = relationship.get("data") if relationship else None
+    return data["guid"] if data else None
+
+
+class Record:
+    """Compact read-only v3 resource with only the fields that the v2 translation needs.
+
+    Fields are accessed like in the parsed json (record["guid"], record.get("stack")) so that translators work with both.
+    FIELDS maps the kept fields to the projection of their value (see project()), RELATIONSHIPS are the to-one
+    relationships of which only the guids are kept (record["relationships"]["app"]["data"]["guid"]). Subclasses declare
+    __slots__ = tuple(FIELDS): no per-record dict, a record of a few fields is a fraction of the size of the parsed json.
+    """
+
+    __slots__ = ("relationship_guids",)
+    FIELDS = {}
+    RELATIONSHIPS = ()
+    # derived from FIELDS: fields kept as they are resp. (field, projection) of nested fields
+    PLAIN_FIELDS = ()
+    NESTED_FIELDS = ()
+
+    def __init_subclass__(cls):
+        super().__init_subclass__()
+        cls.PLAIN_FIELDS = tuple(name for (name, projection) in cls.FIELDS.items() if projection is None)
+        cls.NESTED_FIELDS = tuple((name, projection) for (name, projection) in cls.FIELDS.items() if projection is not None)
+
+    def __init__(self, resource: dict):
+        # called for every resource of a page, plain fields without project()
+        get = resource.get
+        for name in self.PLAIN_FIELDS:
+            setattr(self, name, get(name))
+        for name, projection in self.NESTED_FIELDS:
+            setattr(self, name, project(get(name), projection))
+        if self.RELATIONSHIPS:
+            relationships = get("relationships") or {}
+            self.relationship_guids = tuple([relationship_guid(relationships.get(name)) for name in self.RELATIONSHIPS])
+        else:
+            self.relationship_guids = ()
+
+    @property
+    def relationships(self) -> dict:
+        return {name: {"data": {"guid": guid} if guid else None} for (name, guid) in zip(self.RELATIONSHIPS, self.relationship_guids)}
+
+    def __getitem__(self, name: str):
+        if name not in self:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.FIELDS or (name == "relationships" and bool(self.RELATIONSHIPS))
+
+    def get(self, name: str, default=None):
+        return getattr(self, name) if name in self else default
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({', '.join(f'{name}={getattr(self, name)!r}' for name in self.FIELDS)})"
+
+
+class AppRecord(Record):
+    FIELDS = {
+        "guid": None,
+        "name": None,
+        "state": None,
+        "lifecycle": {"type": None, "data": {"buildpacks": None, "stack": None}},
+    }
+    RELATIONSHIPS = ("space",)
+    __slots__ = tuple(FIELDS)
+
+
+class ProcessRecord(Record):
+    FIELDS = {
+        "guid": None,
+        "type": None,
+        "command": None,
+        "instances": None,
+        "memory_in_mb": None,
+        "disk_in_mb": None,
+        "log_rate_limit_in_bytes_per_second": None,
+        "version": None,
+        "health_check": {"type": None, "data": {"endpoint": None, "timeout": None}},
+        "created_at": None,
+        "updated_at": None,
+    }
+    RELATIONSHIPS = ("app",)
+    __slots__ = tuple(FIELDS)
+
+
+class PackageRecord(Record):
+    FIELDS = {
+        "guid": None,
+        "type": None,
+        "state": None,
+        # docker image and credentials, bits packages have checksums here
+        "data": {"image": None, "username": None, "password": None},
+        "created_at": None,
+    }
+    RELATIONSHIPS = ("app",)
+    __slots__ = tuple(FIELDS)
+
+
+class BuildRecord(Record):
+    FIELDS = {"guid": None, "state": None, "error": None, "created_at": None}
+    RELATIONSHIPS = ("app",)
+    __slots__ = tuple(FIELDS)
+
+
+class DropletRecord(Record):
+    FIELDS = {
+        "guid": None,
+        "state": None,
+        "error": None,
+        "stack": None,
+        "buildpacks": {"name": None, "buildpack_name": None},
+        "lifecycle": {"type": None},
+        # only the start command of the web process, apps may have many process types
+        "process_types": {"web": None},
+        "execution_metadata": None,
+        "created_at": None,
+    }
+    RELATIONSHIPS = ("app",)
+    __slots__ = tuple(FIELDS)
+
+
+class BuildpackRecord(Record):
+    FIELDS = {"guid": None, "name": None, "stack": None}
+    __slots__ = tuple(FIELDS)
+
+
+def parse_list(body, record: type) -> dict:
+    """Parsed body of a v3 list response with the resources projected to records (e.g. BuildRecord) while parsing.
+
+    body is the whole body (bytes or str) or an iterable of byte chunks (e.g. response.iter_content()). The body is
+    decoded and parsed chunk by chunk, resources are parsed one by one and projected right away: at most one fully parsed
+    resource and a few chunks of text are in memory at a time, not the parsed page (several times the size of the body,
+    e.g. 5000 builds). Other attributes (pagination, included) are parsed as usual.
+    """
+    return ListParser([body] if isinstance(body, (bytes, bytearray, str)) else body, record).parse()
+
+
+class ListParser:
+    """Incremental parser of a v3 list response, see parse_list(). text[i:] is the unparsed text read so far."""
+
+    def __init__(self, chunks, record: type):
+        self.chunks = iter(chunks)
+        self.record = record
+        # utf-8 sequences may be split across chunks
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.i = 0
+        self.done = False
+
+    def parse(self) -> dict:
+        self.expect("{")
+        res_json = {}
+        if self.peek() == "}":
+            self.i += 1
+        else:
+            while True:
+                if self.peek() != '"':
+                    self.error("Expecting property name enclosed in double quotes")
+                key = self.value()
+                self.expect(":")
+                if key == "resources" and self.peek() == "[":
+                    res_json[key] = self.resources()
+                else:
+                    res_json[key] = self.value()
+                if self.peek() == "}":
+                    self.i += 1
+                    break
+                self.expect(",")
+        if self.peek():
+            self.error("Extra data")
+        return res_json
+
+    def resources(self) -> list:
+        self.expect("[")
+        resources = []
+        if self.peek() == "]":
+            self.i += 1
+            return resources
+        while True:
+            resources.append(self.record(self.value()))
+            if self.peek() == "]":
+                self.i += 1
+                return resources
+            self.expect(",")
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.text, self.i)
+                # a value at the end of the text read so far may be incomplete (e.g. a number split across chunks)
+                if end < len(self.text) or self.done:
+                    self.i = end
+                    return value
+            except json.JSONDecodeError:
+                if self.done:
+                    raise
+            # at least as much text again: values spanning many chunks are parsed a few times, not once per chunk
+            self.read(len(self.text) - self.i)
+
+    def peek(self) -> str:
+        """Next character after whitespace, "" at the end of the body."""
+        while True:
+            self.i = WHITESPACE.match(self.text, self.i).end()
+            if self.i < len(self.text) or self.done:
+                return self.text[self.i : self.i + 1]
+            self.read(1)
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            self.error(f"Expecting '{char}'")
+        self.i += 1
+
+    def read(self, length: int):
+        """Reads chunks until length more characters are available or the body is read, drops the parsed text."""
+        parts = [self.text[self.i :]]
+        available = 0
+        while available < length:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                parts.append(self.decoder.decode(b"", final=True))
+                self.done = True
+                break
+            part = chunk if isinstance(chunk, str) else self.decoder.decode(chunk)
+            parts.append(part)
+            available += len(part)
+        self.text = "".join(parts)
+        self.i = 0
+
+    def error(self, message: str):
+        raise json.JSONDecodeError(message, self.text, self.i)
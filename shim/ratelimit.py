@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Awaitable, Callable
+import requests
+from shim.cache import auth_scope
+
+logger = logging.getLogger(__name__)
+
+# polling interval of waiting coroutines (asyncio engine), threads are notified
+ASYNC_POLL_INTERVAL = 0.01
+# budgets of users without requests in flight are dropped when there are more
+MAX_IDLE_BUDGETS = 10000
+
+
+class UserBudget:
+    def __init__(self, window: float):
+        self.window = window  # AIMD concurrency window
+        self.in_flight = 0
+        self.limit = None
+        self.remaining = None  # unknown until the first response with rate limit headers
+        self.reset = 0.0  # epoch seconds
+        self.last_decrease = 0.0
+
+
+class RateLimiter:
+    """Per-user budget for CF API requests based on the rate limit headers of the CF API responses.
+
+    One v2 request turns into up to hundreds of v3 requests, all count against the rate limit of the user. The budget
+    of a user (X-RateLimit-Remaining until X-RateLimit-Reset) is shared by all requests of the user in the process,
+    requests wait (queue) instead of failing with 429 when the budget is spent (keeping reserve requests for the user)
+    if it is reset within max_wait seconds. GETs that failed with 429 anyway are retried once after the reset.
+
+    Requests in flight per user are limited by an AIMD window: +1 per window of successful responses up to
+    max_concurrency, halved on 429 and when the remaining budget gets low (at most once per decrease_interval).
+    Anonymous requests are not limited.
+    """
+
+    def __init__(self, max_concurrency: int = 32, reserve: int = 0, max_wait: float = 30, decrease_interval: float = 1.0):
+        self.max_concurrency = max_concurrency
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self.decrease_interval = decrease_interval
+        self.cond = threading.Condition()
+        self.budgets = {}  # auth scope -> UserBudget
+        self.queued = 0
+        self.throttled = 0
+
+    def _budget(self, scope: str) -> UserBudget:
+        budget = self.budgets.get(scope)
+        if budget is None:
+            budget = UserBudget(self.max_concurrency)
+            self.budgets[scope] = budget
+        return budget
+
+    def _try_acquire(self, scope: str, now: float) -> float:
+        """0 if a request may start (counted as in flight), else seconds until the budget is available again (None if
+        the window is full, available when a request in flight finishes)."""
+        budget = self._budget(scope)
+        if budget.remaining is not None and now >= budget.reset:
+            # new rate limit window, budget is unknown until the next response
+            budget.remaining = None
+        if budget.in_flight >= int(budget.window):
+            return None
+        if budget.remaining is not None and budget.remaining - budget.in_flight <= self.reserve:
+            return budget.reset - now
+        budget.in_flight += 1
+        return 0
+
+    def acquire(self, headers: dict, deadline: float = None) -> str:
+        """Waits until a request of the caller may start, returns the scope for release().
+
+        Doesn't wait if the budget isn't available again before deadline (default: max_wait), the request is sent anyway.
+        """
+        scope = auth_scope(headers)
+        if scope is None:
+            return None
+        deadline = deadline or time.time() + self.max_wait
+        with self.cond:
+            queued = False
+            while True:
+                now = time.time()
+                wait = self._try_acquire(scope, now)
+                if wait == 0:
+                    break
+                if now >= deadline or (wait is not None and now + wait > deadline):
+                    self._budget(scope).in_flight += 1
+                    break
+                if not queued:
+                    self.queued += 1
+                    queued = True
+                self.cond.wait(deadline - now if wait is None else wait)
+        return scope
+
+    async def acquire_async(self, headers: dict, deadline: float = None) -> str:
+        """Like acquire() for coroutines (asyncio engine), doesn't block the event loop."""
+        scope = auth_scope(headers)
+        if scope is None:
+            return None
+        deadline = deadline or time.time() + self.max_wait
+        queued = False
+        while True:
+            with self.cond:
+                now = time.time()
+                wait = self._try_acquire(scope, now)
+                if wait == 0:
+                    return scope
+                if now >= deadline or (wait is not None and now + wait > deadline):
+                    self._budget(scope).in_flight += 1
+                    return scope
+                if not queued:
+                    self.queued += 1
+                    queued = True
+            await asyncio.sleep(ASYNC_POLL_INTERVAL if wait is None else min(wait, 1))
+
+    def retry_before(self, scope: str, deadline: float) -> bool:
+        """True if the budget of the caller is reset before deadline, e.g. to retry a request that failed with 429."""
+        with self.cond:
+            return scope is not None and self._budget(scope).reset <= deadline
+
+    def release(self, scope: str, res: requests.Response):
+        """Updates the budget of the caller from the response (None if the request failed)."""
+        if scope is None:
+            return
+        with self.cond:
+            budget = self._budget(scope)
+            budget.in_flight -= 1
+            if res is not None:
+                self._update(budget, res)
+            if len(self.budgets) > MAX_IDLE_BUDGETS:
+                self._drop_idle_budgets()
+            self.cond.notify_all()
+
+    def _update(self, budget: UserBudget, res: requests.Response):
+        now = time.time()
+        remaining = res.headers.get("X-RateLimit-Remaining")
+        reset = res.headers.get("X-RateLimit-Reset")
+        if remaining is not None and reset is not None:
+            remaining = int(remaining)
+            reset = float(reset)
+            budget.limit = int(res.headers.get("X-RateLimit-Limit", 0)) or budget.limit
+            if budget.remaining is None or reset > budget.reset:
+                budget.remaining = remaining
+                budget.reset = reset
+            elif reset == budget.reset:
+                # responses of the same window can arrive in any order
+                budget.remaining = min(budget.remaining, remaining)
+        if res.status_code == 429:
+            self.throttled += 1
+            budget.remaining = 0
+            if reset is None:
+                budget.reset = now + float(res.headers.get("Retry-After", 1))
+            self._decrease(budget, now)
+        elif budget.remaining is not None and budget.remaining < 2 * budget.window:
+            self._decrease(budget, now)
+        else:
+            budget.window = min(self.max_concurrency, budget.window + 1 / budget.window)
+
+    def _decrease(self, budget: UserBudget, now: float):
+        if now - budget.last_decrease >= self.decrease_interval:
+            budget.window = max(1.0, budget.window / 2)
+            budget.last_decrease = now
+
+    def _drop_idle_budgets(self):
+        now = time.time()
+        for scope in [s for (s, b) in self.budgets.items() if b.in_flight == 0 and b.reset <= now]:
+            del self.budgets[scope]
+
+    def call(self, method: str, headers: dict, send: Callable[[], requests.Response]) -> requests.Response:
+        """send() within the budget of the caller (threads engine), GETs that fail with 429 are retried once after the reset."""
+        deadline = time.time() + self.max_wait
+        retried = False
+        while True:
+            scope = self.acquire(headers, deadline)
+            res = None
+            try:
+                res = send()
+            finally:
+                self.release(scope, res)
+            if res.status_code != 429 or method != "GET" or retried or not self.retry_before(scope, deadline):
+                return res
+            logger.info("CF API rate limit exceeded, retrying after reset")
+            retried = True
+
+    async def call_async(self, method: str, headers: dict, send: Callable[[], Awaitable[requests.Response]]) -> requests.Response:
+        """Like call() for coroutines (asyncio engine)."""
+        deadline = time.time() + self.max_wait
+        retried = False
+        while True:
+            scope = await self.acquire_async(headers, deadline)
+            res = None
+            try:
+                res = await send()
+            finally:
+                self.release(scope, res)
+            if res.status_code != 429 or method != "GET" or retried or not self.retry_before(scope, deadline):
+                return res
+            logger.info("CF API rate limit exceeded, retrying after reset")
+            retried = True
+
+    def stats(self) -> dict:
+        with self.cond:
+            return {
+                "users": len(self.budgets),
+                "in_flight": sum(b.in_flight for b in self.budgets.values()),
+                "queued": self.queued,
+                "throttled": self.throttled,
+            }
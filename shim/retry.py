@@ -0,0 +1,274 @@
+import asyncio
+import collections
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable
+import requests
+from shim.metrics import path_template
+
+logger = logging.getLogger(__name__)
+
+# gateway errors of gorouter/nginx in front of the CF API, the request didn't reach (or wasn't processed by) the CF API
+RETRY_STATUSES = [502, 503]
+# latency samples per path template for the hedge delay, hedging starts after MIN_SAMPLES samples
+LATENCY_WINDOW = 500
+MIN_SAMPLES = 20
+# path templates with latency samples, the least recently used is dropped (e.g. paths that are requested only once)
+MAX_PATHS = 200
+# the hedge delay percentile is recomputed every RECOMPUTE_INTERVAL samples
+RECOMPUTE_INTERVAL = 50
+
+
+class RetryBudget:
+    """Extra requests (retries and hedges) of one v2 request: at most minimum + ratio * the requests of the v2 request.
+
+    Bounds the additional load on the CF API, e.g. when it is overloaded and all requests are slow or fail.
+    """
+
+    def __init__(self, ratio: float, minimum: int):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.lock = threading.Lock()  # requests of a v2 request run in parallel threads resp. on the event loop
+        self.requests = 0
+        self.extra = 0
+
+    def record(self):
+        with self.lock:
+            self.requests += 1
+
+    def try_spend(self) -> bool:
+        with self.lock:
+            if self.extra >= self.minimum + self.ratio * self.requests:
+                return False
+            self.extra += 1
+            return True
+
+
+class RetryPolicy:
+    """Retries and hedging of idempotent CF API GETs within the RetryBudget of the v2 request.
+
+    GETs that fail with a connection error or 502/503 are retried up to max_retries times after a random delay (full
+    jitter: 0..backoff * 2^attempt seconds, up to max_backoff). Hedging (opt-in, hedge_percentile > 0): if a GET takes
+    longer than the hedge_percentile of the recent latencies of its path (at least hedge_min_delay), a second identical
+    GET is sent and the first usable response is returned. The slower request is not cancelled, it completes in the
+    background and counts as latency sample. Other methods are sent once.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 2,
+        backoff: float = 0.1,
+        max_backoff: float = 2.0,
+        hedge_percentile: float = 0,
+        hedge_min_delay: float = 0.05,
+        budget_ratio: float = 0.1,
+        budget_minimum: int = 3,
+    ):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.budget_ratio = budget_ratio
+        self.budget_minimum = budget_minimum
+        self.lock = threading.Lock()
+        self.latencies = collections.OrderedDict()  # path template -> deque of durations of successful requests, LRU order
+        self.hedge_delays = {}  # path template -> seconds
+        self.pid = None
+        self.executor = None
+        self.background = set()  # hedged tasks that are still running (asyncio engine)
+        # counters are updated by parallel threads (threads engine), under lock
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.exhausted = 0
+
+    def budget(self) -> RetryBudget:
+        """Budget for the requests of one v2 request (see CFApiSession)."""
+        return RetryBudget(self.budget_ratio, self.budget_minimum)
+
+    def _executor(self) -> ThreadPoolExecutor:
+        # hedged requests of the threads engine run in a process-wide pool, started in every (forked) worker process
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.executor = ThreadPoolExecutor(max_workers=256, thread_name_prefix="cfapi-hedge")
+                    self.pid = os.getpid()
+        return self.executor
+
+    def _observe(self, path: str, duration: float):
+        with self.lock:
+            latencies = self.latencies.get(path)
+            if latencies is None:
+                if len(self.latencies) >= MAX_PATHS:
+                    evicted, _ = self.latencies.popitem(last=False)
+                    self.hedge_delays.pop(evicted, None)
+                latencies = self.latencies[path] = collections.deque(maxlen=LATENCY_WINDOW)
+            else:
+                self.latencies.move_to_end(path)
+            latencies.append(duration)
+            if len(latencies) >= MIN_SAMPLES and (path not in self.hedge_delays or len(latencies) % RECOMPUTE_INTERVAL == 0):
+                ordered = sorted(latencies)
+                index = min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))
+                self.hedge_delays[path] = max(self.hedge_min_delay, ordered[index])
+
+    def hedge_delay(self, url: str) -> float:
+        """Seconds after which a GET of url is hedged, None if hedging is disabled or there are too few latency samples."""
+        if self.hedge_percentile <= 0:
+            return None
+        return self.hedge_delays.get(path_template(url))
+
+    def _count(self, counter: str):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _retry_delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+
+    def _can_retry(self, method: str, attempt: int, budget: RetryBudget) -> bool:
+        if method != "GET" or attempt >= self.max_retries:
+            return False
+        if not budget.try_spend():
+            self._count("exhausted")
+            return False
+        self._count("retries")
+        return True
+
+    def call(self, method: str, url: str, budget: RetryBudget, send: Callable[[], requests.Response], errors: tuple) -> requests.Response:
+        """send() with retries on errors (exception types of the client) and 502/503 and hedging (threads engine)."""
+        if budget is None:
+            return send()
+        budget.record()
+        path = path_template(url)
+
+        def timed_send() -> requests.Response:
+            start = time.perf_counter()
+            res = send()
+            if res.status_code not in RETRY_STATUSES:
+                self._observe(path, time.perf_counter() - start)
+            return res
+
+        attempt = 0
+        while True:
+            try:
+                res = self._hedged(url, budget, timed_send) if method == "GET" else timed_send()
+            except errors as e:
+                if not self._can_retry(method, attempt, budget):
+                    raise
+                logger.info(f"CF API request failed ({e}), retrying")
+            else:
+                if res.status_code not in RETRY_STATUSES or not self._can_retry(method, attempt, budget):
+                    return res
+                logger.info(f"CF API request failed with {res.status_code}, retrying")
+                close_response(res)
+            time.sleep(self._retry_delay(attempt))
+            attempt += 1
+
+    def _hedged(self, url: str, budget: RetryBudget, send: Callable[[], requests.Response]) -> requests.Response:
+        delay = self.hedge_delay(url)
+        if delay is None:
+            return send()
+        primary = self._executor().submit(send)
+        try:
+            return primary.result(timeout=delay)
+        except TimeoutError:
+            pass
+        if not budget.try_spend():
+            self._count("exhausted")
+            return primary.result()
+        self._count("hedges")
+        hedge = self._executor().submit(send)
+        done, pending = wait([primary, hedge], return_when=FIRST_COMPLETED)
+        # first usable response, else the response of the slower request
+        future = next((f for f in done if usable(f)), None) or (pending or done).pop()
+        if future is hedge:
+            self._count("hedge_wins")
+        for other in {primary, hedge} - {future}:
+            other.add_done_callback(close_future)
+        return future.result()
+
+    async def call_async(
+        self, method: str, url: str, budget: RetryBudget, send: Callable[[], Awaitable[requests.Response]], errors: tuple
+    ) -> requests.Response:
+        """Like call() for coroutines (asyncio engine)."""
+        if budget is None:
+            return await send()
+        budget.record()
+        path = path_template(url)
+
+        async def timed_send() -> requests.Response:
+            start = time.perf_counter()
+            res = await send()
+            if res.status_code not in RETRY_STATUSES:
+                self._observe(path, time.perf_counter() - start)
+            return res
+
+        attempt = 0
+        while True:
+            try:
+                res = await (self._hedged_async(url, budget, timed_send) if method == "GET" else timed_send())
+            except errors as e:
+                if not self._can_retry(method, attempt, budget):
+                    raise
+                logger.info(f"CF API request failed ({e}), retrying")
+            else:
+                if res.status_code not in RETRY_STATUSES or not self._can_retry(method, attempt, budget):
+                    return res
+                logger.info(f"CF API request failed with {res.status_code}, retrying")
+                close_response(res)
+            await asyncio.sleep(self._retry_delay(attempt))
+            attempt += 1
+
+    async def _hedged_async(self, url: str, budget: RetryBudget, send: Callable[[], Awaitable[requests.Response]]) -> requests.Response:
+        delay = self.hedge_delay(url)
+        if delay is None:
+            return await send()
+        primary = asyncio.ensure_future(send())
+        done, _ = await asyncio.wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        if not budget.try_spend():
+            self._count("exhausted")
+            return await primary
+        self._count("hedges")
+        hedge = asyncio.ensure_future(send())
+        done, pending = await asyncio.wait([primary, hedge], return_when=asyncio.FIRST_COMPLETED)
+        # first usable response, else the response of the slower request
+        future = next((f for f in done if usable(f)), None) or (pending or done).pop()
+        if future is hedge:
+            self._count("hedge_wins")
+        for other in {primary, hedge} - {future}:
+            # keep a reference until the slower request completes
+            self.background.add(other)
+            other.add_done_callback(self.background.discard)
+            other.add_done_callback(close_future)
+        return await future
+
+    def stats(self) -> dict:
+        return {
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "budget_exhausted": self.exhausted,
+        }
+
+
+def usable(future: Future) -> bool:
+    return future.exception() is None and future.result().status_code not in RETRY_STATUSES
+
+
+def close_response(res: requests.Response):
+    # returns the connection of a not needed (e.g. streamed) response to the pool, responses of the asyncio engine that are
+    # not streamed have no raw body
+    if res.raw is not None:
+        res.close()
+
+
+def close_future(future: Future):
+    # response of the slower of two hedged requests
+    if not future.cancelled() and future.exception() is None:
+        close_response(future.result())
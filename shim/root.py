@@ -1,19 +1,46 @@
 import flask
-import requests
 import logging
-from __main__ import app, cfapi_url, shim_url, proxy_v3
-from shim.utils import cfapi_request_headers, cfapi_response_headers
+import time
+from __main__ import app, cfapi, cfapi_url, shim_url, proxy_v3, metrics, job_poller
+from __main__ import compression_encodings, compression_level, compression_min_bytes
+from shim.compression import compress_response
+from shim.metrics import Trace
+from shim.utils import cfapi_request_headers, cfapi_response_headers, forward_request_headers, stream_body
 
 logger = logging.getLogger(__name__)
 
 
+@app.before_request
+def start_trace():
+    flask.g.trace = Trace()
+
+
+@app.after_request
+def finish_trace(response):
+    trace = flask.g.get("trace")
+    if trace is None:
+        return response
+    endpoint = flask.request.url_rule.rule if flask.request.url_rule else "unknown"
+    method = flask.request.method
+    # streamed responses (e.g. v2 lists) are translated while sent: Server-Timing covers the time until then, metrics all
+    response.headers["Server-Timing"] = trace.server_timing(time.perf_counter() - trace.start)
+    response.call_on_close(
+        lambda: metrics.observe_request(endpoint, method, response.status_code, time.perf_counter() - trace.start, trace)
+    )
+    return response
+
+
+@app.after_request
+def compress(response):
+    if not compression_encodings:
+        return response
+    accept_encoding = flask.request.headers.get("Accept-Encoding", "")
+    return compress_response(response, accept_encoding, compression_min_bytes, compression_level, compression_encodings)
+
+
 @app.route("/")
 def root():
-    res = requests.get(
-        url=f"{cfapi_url}/",
-        headers=cfapi_request_headers(flask.request.headers),
-        allow_redirects=False,
-    )
+    res = cfapi.request("GET", f"{cfapi_url}/", cfapi_request_headers(flask.request.headers))
     # TODO: error handling
 
     # adapt response
@@ -30,12 +57,13 @@ def root():
 
 @app.route("/v2/info")
 def v2_info():
-    with requests.Session() as session:
-        session.headers.update(cfapi_request_headers(flask.request.headers))
-        session.allow_redirects = False
-        root_res = session.get(f"{cfapi_url}/")
+    with cfapi.session(cfapi_request_headers(flask.request.headers)) as session:
+        # info documents are public, cached for all (authenticated) users
+        root_future = session.submit(f"{cfapi_url}/", cached=True, shared=True)
+        v3_info_future = session.submit(f"{cfapi_url}/v3/info", cached=True, shared=True)
+        root_res = root_future.result()
         root_res.raise_for_status()
-        v3_info_res = session.get(f"{cfapi_url}/v3/info")
+        v3_info_res = v3_info_future.result()
         v3_info_res.raise_for_status()
         root = root_res.json()
         v3_info = v3_info_res.json()
@@ -78,20 +106,46 @@ def proxy_v3_requests(path):
 
 def forward_to_cfapi():
     # ref. https://stackoverflow.com/a/36601467/248616
-    res = requests.request(
-        method=flask.request.method,
-        url=flask.request.url.replace(flask.request.host_url, f"{cfapi_url}/"),
-        headers=cfapi_request_headers(flask.request.headers),
+    trace = flask.g.get("trace")
+    if trace:
+        trace.forwarded = True
+    res = cfapi.request(
+        flask.request.method,
+        flask.request.url.replace(flask.request.host_url, f"{cfapi_url}/"),
+        forward_request_headers(flask.request.headers),
         data=flask.request.get_data(),
         cookies=flask.request.cookies,
-        allow_redirects=False,
+        stream=True,
     )
     # TODO: error handling
 
-    response = flask.Response(res.content, res.status_code, cfapi_response_headers(res.headers))
+    # body is streamed to the client as is (not decoded, not buffered), e.g. for large event lists or downloads
+    response = flask.Response(stream_body(res), res.status_code, cfapi_response_headers(res.headers, decoded=False))
     return response
 
 
 @app.route("/health")
 def health():
-    return {"shim_url": shim_url, "cfapi_url": cfapi_url}
+    return {
+        "shim_url": shim_url,
+        "cfapi_url": cfapi_url,
+        "cfapi_pool": cfapi.stats(),
+        "cache": cfapi.cache.stats() if cfapi.cache else None,
+        "single_flight": cfapi.single_flight.stats() if cfapi.single_flight else None,
+        "job_poller": job_poller.stats(),
+        "rate_limit": cfapi.rate_limiter.stats() if cfapi.rate_limiter else None,
+        "retry": cfapi.retry_policy.stats() if cfapi.retry_policy else None,
+    }
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    stats = {
+        "cfapi_pool": cfapi.stats(),
+        "cache": cfapi.cache.stats() if cfapi.cache else None,
+        "single_flight": cfapi.single_flight.stats() if cfapi.single_flight else None,
+        "job_poller": job_poller.stats(),
+        "rate_limit": cfapi.rate_limiter.stats() if cfapi.rate_limiter else None,
+        "retry": cfapi.retry_policy.stats() if cfapi.retry_policy else None,
+    }
+    return flask.Response(metrics.render(stats), mimetype="text/plain; version=0.0.4")
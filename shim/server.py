@@ -0,0 +1,51 @@
+import logging
+import flask
+import gunicorn.app.base
+
+logger = logging.getLogger(__name__)
+
+
+class GunicornServer(gunicorn.app.base.BaseApplication):
+    """Embedded gunicorn server with threaded workers (gthread) that support HTTP keep-alive.
+
+    SIGTERM (e.g. sent by CF when stopping the app) shuts down gracefully: workers stop accepting new connections
+    and finish running requests within graceful_timeout.
+    """
+
+    def __init__(self, app: flask.Flask, options: dict):
+        self.application = app
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+def run_gunicorn(
+    app: flask.Flask,
+    host: str,
+    port: int,
+    workers: int,
+    threads: int,
+    backlog: int,
+    timeout: int,
+    keepalive: int,
+    graceful_timeout: int,
+):
+    options = {
+        "bind": f"{host}:{port}",
+        "worker_class": "gthread",
+        "workers": workers,
+        "threads": threads,
+        "backlog": backlog,
+        "timeout": timeout,
+        "keepalive": keepalive,
+        "graceful_timeout": graceful_timeout,
+        "accesslog": "-",
+    }
+    logger.info(f"gunicorn options: {options}")
+    GunicornServer(app, options).run()
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable
+import requests
+from shim.cache import auth_scope
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesces concurrent identical CF API GETs (same url and caller identity) into one upstream request.
+
+    The first caller (leader) sends the request, callers with the same key that arrive while it is in flight wait for it
+    and get the same response. Nothing is kept after the request finished, see ResponseCache for caching.
+    Responses are shared, callers must not modify them (res.json() returns a new object for every call).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}  # key -> Future (threads engine) resp. asyncio.Task (asyncio engine)
+        self.calls = 0
+        self.saved = 0
+
+    def key(self, method: str, url: str, headers: dict, kwargs: dict) -> str:
+        """Key for coalescing or None if the request must not be shared (not a GET, streamed, with cookies or body)."""
+        if method != "GET" or kwargs.get("stream") or kwargs.get("cookies") or kwargs.get("data"):
+            return None
+        return f"{auth_scope(headers)} {requests.Request('GET', url, params=kwargs.get('params')).prepare().url}"
+
+    def do(self, key: str, fn: Callable[[], requests.Response]) -> requests.Response:
+        """Return fn() or the response of an identical request in flight (threads engine)."""
+        with self.lock:
+            future = self.flights.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self.flights[key] = future
+                self.calls += 1
+            else:
+                self.saved += 1
+        if leader:
+            try:
+                future.set_result(fn())
+            except Exception as e:
+                # followers get the same error
+                future.set_exception(e)
+            except BaseException as e:
+                # e.g. KeyboardInterrupt, followers must not wait forever
+                future.set_exception(e)
+                raise
+            finally:
+                with self.lock:
+                    del self.flights[key]
+        return future.result()
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[requests.Response]]) -> requests.Response:
+        """Like do() for coroutines, must run on the event loop of the asyncio engine."""
+        with self.lock:
+            task = self.flights.get(key)
+            if task is None:
+                task = asyncio.ensure_future(fn())
+                self.flights[key] = task
+                task.add_done_callback(self._remove_task(key))
+                self.calls += 1
+            else:
+                self.saved += 1
+        # a cancelled caller (e.g. deadline exceeded) doesn't cancel the request for the other callers
+        return await asyncio.shield(task)
+
+    def _remove_task(self, key: str) -> Callable[[asyncio.Task], None]:
+        def remove(task: asyncio.Task):
+            with self.lock:
+                del self.flights[key]
+            if not task.cancelled():
+                task.exception()  # retrieved, even if all callers were cancelled
+
+        return remove
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "in_flight": len(self.flights),
+                "calls": self.calls,
+                "saved": self.saved,
+            }
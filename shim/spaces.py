@@ -1,11 +1,27 @@
 import flask
-import requests
 import logging
-from __main__ import app, cfapi_url
+from __main__ import app, cfapi, cfapi_url, cfapi_batch_deadline
+from shim.fetch import ChunkedFetch, fetch_json_all, guid_chunks
+from shim.apps import app_bindings_fetch, app_v3_to_v2, apps_plan, apps_web_process_stats
+from shim.jobs import v2_associations_error, v2_job_response
+from shim.jsonstream import v2_list_response
+from shim.localquery import LocalQuery
+from shim.metrics import timed
+from shim.plan import Plan, json_or_none
+from shim.summary import (
+    bindings_by,
+    instance_bindings_fetch,
+    routes_by_app,
+    running_instances,
+    service_plans_fetch,
+    services_v3_to_v2_summary,
+    space_app_summary_v3_to_v2,
+)
 from shim.utils import (
     cfapi_request_headers,
     cfapi_response_headers,
     filter_params_v2_to_v3,
+    paginate_v3,
     pagination_params_v2_to_v3,
     pagination_v3_to_v2,
 )
@@ -13,12 +29,13 @@ from shim.utils import (
 logger = logging.getLogger(__name__)
 
 
+@timed
 def space_v3_to_v2(v3_space, v3_space_feature_ssh) -> dict:
     guid = v3_space["guid"]
     space_quota_guid = v3_space["relationships"]["quota"]["data"]["guid"] if v3_space["relationships"]["quota"]["data"] else None
     v2_space = {
         "entity": {
-            "allow_ssh": v3_space_feature_ssh["enabled"],
+            "allow_ssh": v3_space_feature_ssh["enabled"] if v3_space_feature_ssh else None,
             "app_events_url": f"/v2/spaces/{guid}/app_events",
             "apps_url": f"/v2/spaces/{guid}/apps",
             "auditors_url": f"/v2/spaces/{guid}/auditors",
@@ -46,82 +63,253 @@ def space_v3_to_v2(v3_space, v3_space_feature_ssh) -> dict:
     return v2_space
 
 
+# v3 requests of GET /v2/spaces/<guid>, space and ssh feature are requested in parallel
+# space features are cached for all users (shared), the ssh feature is only returned if the user can see the space
+space_plan = (
+    Plan(inputs=["guid"])
+    .fetch("v3_space_res", lambda guid: f"{cfapi_url}/v3/spaces/{guid}", ["guid"], cached=True)
+    .fetch(
+        "v3_space_feature_ssh",
+        lambda guid: f"{cfapi_url}/v3/spaces/{guid}/features/ssh",
+        ["guid"],
+        cached=True,
+        shared=True,
+        then=json_or_none,
+    )
+)
+
+
 @app.route("/v2/spaces/<uuid:guid>")
 def v2_get_space(guid):
-    with requests.Session() as session:
-        session.headers.update(cfapi_request_headers(flask.request.headers))
-        session.allow_redirects = False
-        v3_space_res = session.get(f"{cfapi_url}/v3/spaces/{guid}")
-        # TODO: v3_space_res.raise_for_status() + global error handling
-        if v3_space_res.status_code >= 400:
-            # TODO: error mapping
-            return flask.make_response(v3_space_res.json(), v3_space_res.status_code, cfapi_response_headers(v3_space_res.headers))
-        
-        v3_space = v3_space_res.json()
-        v3_space_feature_ssh_res = session.get(f"{cfapi_url}/v3/spaces/{guid}/features/ssh")
-        v3_space_feature_ssh = v3_space_feature_ssh_res.json()
-
-        v2_space = space_v3_to_v2(v3_space, v3_space_feature_ssh)
-        return flask.make_response(v2_space, v3_space_res.status_code, cfapi_response_headers(v3_space_res.headers))
+    with cfapi.session(cfapi_request_headers(flask.request.headers)) as session:
+        v3 = space_plan.run(session, guid=guid)
+
+    v3_space_res = v3["v3_space_res"]
+    # TODO: v3_space_res.raise_for_status() + global error handling
+    if v3_space_res.status_code >= 400:
+        # TODO: error mapping
+        return flask.make_response(v3_space_res.json(), v3_space_res.status_code, cfapi_response_headers(v3_space_res.headers))
+
+    v2_space = space_v3_to_v2(v3_space_res.json(), v3["v3_space_feature_ssh"])
+    return flask.make_response(v2_space, v3_space_res.status_code, cfapi_response_headers(v3_space_res.headers))
+
+
+@app.route("/v2/spaces/<uuid:guid>", methods=["DELETE"])
+def v2_delete_space(guid):
+    if flask.request.args.get("recursive") != "true":
+        # v2 default: spaces with apps, service instances or routes are not deleted, v3 always deletes recursively
+        with cfapi.session(cfapi_request_headers(flask.request.headers)) as session:
+            associations = {
+                "apps": f"{cfapi_url}/v3/apps?space_guids={guid}",
+                "service_instances": f"{cfapi_url}/v3/service_instances?space_guids={guid}",
+                "routes": f"{cfapi_url}/v3/routes?space_guids={guid}",
+            }
+            error_response = v2_associations_error(session, "spaces", associations)
+        if error_response is not None:
+            return error_response
+    v3_res = cfapi.request("DELETE", f"{cfapi_url}/v3/spaces/{guid}", cfapi_request_headers(flask.request.headers))
+    return v2_job_response(v3_res, sync=flask.request.args.get("async") != "true")
+
+
+def spaces_apps_fetch(session, app_guids):
+    # translate v2 app_quid query to v3 apps query, the spaces are included
+    if not app_guids:
+        return None
+    return ChunkedFetch(session, f"{cfapi_url}/v3/apps", "guids", app_guids.split(","), {"per_page": 5000, "include": "space"})
+
+
+def spaces_roles_fetch(session, developer_guids):
+    # translate v2 developer_guid query to v3 roles query, the spaces are included
+    if not developer_guids:
+        return None
+    return ChunkedFetch(
+        session,
+        f"{cfapi_url}/v3/roles",
+        "user_guids",
+        developer_guids.split(","),
+        {
+            "types": "space_auditor,space_developer,space_manager",
+            "per_page": 5000,
+            "include": "space",
+        },
+    )
+
+
+def spaces_candidates(session, v3_apps_fetch, v3_roles_fetch):
+    """Spaces of the apps resp. roles of the app_guid and developer_guid filters by guid, None without these filters."""
+    candidates = None
+    for fetch in [v3_apps_fetch, v3_roles_fetch]:
+        if fetch:
+            fetch.result()
+            spaces = fetch.included.get("spaces", {})
+            # intersect with the spaces of the other query (q params are ANDed)
+            candidates = spaces if candidates is None else {guid: space for (guid, space) in candidates.items() if guid in spaces}
+    return candidates
+
+
+def spaces_page(session, params, candidates):
+    """v3 spaces page (json) and response headers."""
+    if candidates is None:
+        v3_spaces_res = session.get(f"{cfapi_url}/v3/spaces", params=params)
+        return (v3_spaces_res.json(), v3_spaces_res.headers)
+    if not candidates:
+        return (paginate_v3([], "/v3/spaces", params), {})
+    if LocalQuery.supports(params):
+        # remaining filters, order and pagination are applied to the candidates locally, no spaces request needed and no
+        # url length limit (e.g. user with many roles)
+        return (LocalQuery(params).run(candidates.values(), "/v3/spaces"), {})
+
+    # other filters (e.g. isolation_segment_guid): spaces query restricted to the candidates
+    space_guids = list(candidates.keys())
+    if len(guid_chunks(f"{cfapi_url}/v3/spaces", params, "guids", space_guids)) > 1:
+        # too many spaces for one request: fetch all in chunks and paginate locally
+        filter_params = {k: v for (k, v) in params.items() if k not in ["page", "per_page", "order_by"]}
+        v3_spaces = ChunkedFetch(session, f"{cfapi_url}/v3/spaces", "guids", space_guids, {**filter_params, "per_page": 5000}).result()
+        return (paginate_v3(v3_spaces, "/v3/spaces", params), {})
+    v3_spaces_res = session.get(f"{cfapi_url}/v3/spaces", params={**params, "guids": ",".join(space_guids)})
+    return (v3_spaces_res.json(), v3_spaces_res.headers)
+
+
+def spaces_feature_ssh(session, v3_spaces):
+    # one request per space (no v3 list endpoint for space features), all in parallel (limited by the concurrency of the session)
+    # space features are cached for all users (shared), spaces of the list are visible to the user
+    # missing results (deadline exceeded, failed) are reported as unknown instead of failing the whole page
+    guids = list(v3_spaces.keys())
+    results = fetch_json_all(
+        session, [f"{cfapi_url}/v3/spaces/{guid}/features/ssh" for guid in guids], cfapi_batch_deadline, cached=True, shared=True
+    )
+    return dict(zip(guids, results))
+
+
+# v3 requests of GET /v2/spaces
+# app and role lookups are independent and run in parallel, long guid lists are split into chunks (url length limit)
+spaces_plan = (
+    Plan(inputs=["params", "app_guids", "developer_guids"])
+    .step("v3_apps_fetch", spaces_apps_fetch, ["app_guids"])
+    .step("v3_roles_fetch", spaces_roles_fetch, ["developer_guids"])
+    .step("candidates", spaces_candidates, ["v3_apps_fetch", "v3_roles_fetch"])
+    .step("v3_spaces_page", spaces_page, ["params", "candidates"])
+    .step(
+        "v3_spaces", lambda session, v3_spaces_page: {space["guid"]: space for space in v3_spaces_page[0]["resources"]}, ["v3_spaces_page"]
+    )
+    .step("v3_space_feature_ssh", spaces_feature_ssh, ["v3_spaces"])
+)
+
 
 @app.route("/v2/spaces")
 def v2_get_spaces():
-    with requests.Session() as session:
-        session.headers.update(cfapi_request_headers(flask.request.headers))
-        session.allow_redirects = False
+    with cfapi.session(cfapi_request_headers(flask.request.headers)) as session:
         # Valid filters: name, organization_guid, developer_guid, app_guid, isolation_segment_guid
         # order-by: id, name
         params = {**pagination_params_v2_to_v3(flask.request.args), **filter_params_v2_to_v3(flask.request.args)}
+        app_guids = params.pop("app_guids", None)
+        developer_guids = params.pop("developer_guids", None)
+        v3 = spaces_plan.run(session, params=params, app_guids=app_guids, developer_guids=developer_guids)
+
+    v3_spaces_json, v3_spaces_headers = v3["v3_spaces_page"]
+    return v2_list_response(
+        pagination_v3_to_v2(v3_spaces_json["pagination"], flask.request.args),
+        (
+            space_v3_to_v2(
+                v3_space,
+                v3["v3_space_feature_ssh"].get(guid),
+            )
+            for (guid, v3_space) in v3["v3_spaces"].items()
+        ),
+        cfapi_response_headers(v3_spaces_headers),
+    )
 
-        space_guids = {}
-        if "app_guids" in params:
-            # translate v2 app_quid query to v3 apps query
-            app_guids = params.pop("app_guids")
-            v3_apps_res = session.get(f"{cfapi_url}/v3/apps", params={
-                "guids": app_guids,
-                "per_page": 5000,
-            })
-            v3_apps_res.raise_for_status()
-            v3_apps = v3_apps_res.json()
-            space_guids = {app["relationships"]["space"]["data"]["guid"] for app in v3_apps["resources"]}
-        if "developer_guids" in params:
-            # translate v2 developer_guid query to v3 roles query
-            # TODO: won't work for users with many roles due to url length limit, alternative: roles query with include=space + local filtering of other q params
-            # -> but breaks order_by and pagination
-            developer_guids = params.pop("developer_guids")
-            v3_roles_res = session.get(f"{cfapi_url}/v3/roles", params={
-                "user_guids": developer_guids,
-                "types": "space_auditor,space_developer,space_manager",
-                "per_page": 5000,
-            })
-            v3_roles_res.raise_for_status()
-            v3_roles = v3_roles_res.json()
-            space_guids_roles = {role["relationships"]["space"]["data"]["guid"] for role in v3_roles["resources"] if role["relationships"]["space"]["data"]}
-            # intersect with existing space_guids from app_guids query (q params are ANDed)
-            if space_guids:
-                space_guids = space_guids.intersection(space_guids_roles)
-            else: 
-                space_guids = space_guids_roles
-        if space_guids:
-            params["guids"] = ",".join(space_guids)
 
-        v3_spaces_res = session.get(f"{cfapi_url}/v3/spaces", params=params)
-        v3_spaces_json = v3_spaces_res.json()
-        v3_spaces = {space["guid"]: space for space in v3_spaces_json["resources"]}
+# v3 requests of GET /v2/spaces/<guid>/summary: space, routes and service instances of the space in parallel to the requests of
+# GET /v2/apps for the apps of the space (filters pushed down). Bindings and process stats of the apps follow the app guids,
+# plans and bound app counts the service instances. All batched by guid lists, only the stats are requested per started app.
+# TODO: spaces with more than 5000 apps
+space_summary_plan = (
+    Plan(inputs=["guid", "params", "pushdown_params"])
+    .fetch("v3_space_res", lambda guid: f"{cfapi_url}/v3/spaces/{guid}", ["guid"], cached=True)
+    .step(
+        "v3_routes_fetch",
+        lambda session, guid: ChunkedFetch(
+            session, f"{cfapi_url}/v3/routes", "space_guids", [str(guid)], {"per_page": 5000, "include": "domain"}
+        ),
+        ["guid"],
+    )
+    .step(
+        "v3_service_instances_fetch",
+        lambda session, guid: ChunkedFetch(session, f"{cfapi_url}/v3/service_instances", "space_guids", [str(guid)], {"per_page": 5000}),
+        ["guid"],
+    )
+    .extend(apps_plan)
+    .step("v3_app_bindings_fetch", app_bindings_fetch, ["app_guids"])
+    # blocking steps, after all requests above are started
+    .step(
+        "v3_service_instances",
+        lambda session, v3_service_instances_fetch: {i["guid"]: i for i in v3_service_instances_fetch.result()},
+        ["v3_service_instances_fetch"],
+    )
+    .step(
+        "v3_service_plans_fetch",
+        lambda session, v3_service_instances: service_plans_fetch(session, cfapi_url, v3_service_instances),
+        ["v3_service_instances"],
+    )
+    .step(
+        "v3_instance_bindings_fetch",
+        lambda session, v3_service_instances: instance_bindings_fetch(session, cfapi_url, v3_service_instances),
+        ["v3_service_instances"],
+    )
+    .step("v3_web_process_stats", apps_web_process_stats, ["v3_apps"])
+    .step("v3_routes", lambda session, v3_routes_fetch: v3_routes_fetch.result(), ["v3_routes_fetch"])
+    .step("v3_app_bindings", lambda session, v3_app_bindings_fetch: v3_app_bindings_fetch.result(), ["v3_app_bindings_fetch"])
+    .step(
+        "v2_services",
+        lambda session, v3_service_instances, v3_service_plans_fetch, v3_instance_bindings_fetch: services_v3_to_v2_summary(
+            v3_service_instances, v3_service_plans_fetch, v3_instance_bindings_fetch
+        ),
+        ["v3_service_instances", "v3_service_plans_fetch", "v3_instance_bindings_fetch"],
+    )
+)
 
-        v3_space_feature_ssh = {}
-        for guid in v3_spaces.keys():
-            feature_ssh = session.get(f"{cfapi_url}/v3/spaces/{guid}/features/ssh").json()
-            v3_space_feature_ssh[guid] = feature_ssh
 
-    v2_spaces = {
-        **pagination_v3_to_v2(v3_spaces_json["pagination"], flask.request.args),
-        "resources": [
-            space_v3_to_v2(
-                v3_space,
-                v3_space_feature_ssh.get(guid),
+@app.route("/v2/spaces/<uuid:guid>/summary")
+def v2_get_space_summary(guid):
+    with cfapi.session(cfapi_request_headers(flask.request.headers)) as session:
+        params = {"space_guids": str(guid), "per_page": 5000}
+        v3 = space_summary_plan.run(session, guid=guid, params=params, pushdown_params={"space_guids": str(guid)})
+
+    v3_space_res = v3["v3_space_res"]
+    if v3_space_res.status_code >= 400:
+        # TODO: error mapping
+        return flask.make_response(v3_space_res.json(), v3_space_res.status_code, cfapi_response_headers(v3_space_res.headers))
+
+    v3_space = v3_space_res.json()
+    v3_apps = v3["v3_apps"]
+    v3_app_env_vars, v3_app_feature_ssh = v3["v3_app_env_and_ssh"]
+    v3_routes = routes_by_app(v3["v3_routes"])
+    v3_domains = v3["v3_routes_fetch"].included.get("domains", {})
+    # service instances of the bindings, incl. instances shared from other spaces
+    v3_bound_instances = v3["v3_app_bindings_fetch"].included.get("service_instances", {})
+    v3_app_bindings = bindings_by(v3["v3_app_bindings"], "app")
+    v2_apps = []
+    for app_guid, v3_proc in v3["v3_web_processes"].items():
+        v2_app = app_v3_to_v2(
+            v3_apps[app_guid],
+            v3_proc,
+            v3["v3_packages"].get(app_guid),
+            v3["v3_builds"].get(app_guid),
+            v3["v3_droplets"].get(app_guid),
+            v3["v3_app_buildpacks"].get(app_guid),
+            v3["v3_app_stacks"].get(app_guid),
+            v3_app_env_vars.get(app_guid),
+            v3_app_feature_ssh.get(app_guid),
+        )
+        service_names = [
+            v3_bound_instances[b["relationships"]["service_instance"]["data"]["guid"]]["name"] for b in v3_app_bindings.get(app_guid, [])
+        ]
+        v2_apps.append(
+            space_app_summary_v3_to_v2(
+                v2_app, v3_routes.get(app_guid, []), v3_domains, service_names, running_instances(v3["v3_web_process_stats"].get(app_guid))
             )
-            for (guid, v3_space) in v3_spaces.items()
-        ],
-    }
-    return flask.make_response(v2_spaces, 200, cfapi_response_headers(v3_spaces_res.headers))
+        )
+
+    v2_space_summary = {"guid": v3_space["guid"], "name": v3_space["name"], "apps": v2_apps, "services": v3["v2_services"]}
+    return flask.make_response(v2_space_summary, v3_space_res.status_code, cfapi_response_headers(v3_space_res.headers))
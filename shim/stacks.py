@@ -1,11 +1,15 @@
 import flask
-import requests
 import logging
-from __main__ import app, cfapi_url
+from __main__ import app, catalog, cfapi, cfapi_url
+from shim.jsonstream import v2_list_response
+from shim.metrics import timed
+from shim.plan import Plan
 from shim.utils import (
     cfapi_request_headers,
     cfapi_response_headers,
     filter_params_v2_to_v3,
+    paginate_v3,
+    pagination_params_error,
     pagination_params_v2_to_v3,
     pagination_v3_to_v2,
 )
@@ -13,6 +17,7 @@ from shim.utils import (
 logger = logging.getLogger(__name__)
 
 
+@timed
 def stack_v3_to_v2(v3_stack):
     return {
         "metadata": {
@@ -30,29 +35,93 @@ def stack_v3_to_v2(v3_stack):
     }
 
 
+def catalog_stack(session, guid, v3_token_res):
+    # stacks are cached, only for users with a valid token
+    return catalog.stacks.get(session).by_guid.get(str(guid)) if v3_token_res.status_code == 200 else None
+
+
+def catalog_stacks_page(session, params, v3_token_res):
+    # stacks are cached, sort and paginate locally if possible
+    if v3_token_res.status_code != 200 or not params.keys() <= {"page", "per_page", "order_by", "names"}:
+        return None
+    v3_stacks_resources = catalog.stacks.get(session).resources
+    if "names" in params:
+        names = params["names"].split(",")
+        v3_stacks_resources = [stack for stack in v3_stacks_resources if stack["name"] in names]
+    return paginate_v3(v3_stacks_resources, "/v3/stacks", params)
+
+
+# v3 requests of GET /v2/stacks/<guid>, the CF API is only asked for stacks that are not in the catalog
+stack_plan = (
+    Plan(inputs=["guid"])
+    # the CF API doesn't see requests served from the catalog, a small cached request validates the token of the user
+    .fetch("v3_token_res", f"{cfapi_url}/v3/stacks", params={"per_page": 1}, cached=True)
+    .step("v3_catalog_stack", catalog_stack, ["guid", "v3_token_res"])
+    .step(
+        "v3_stack_res",
+        lambda session, guid, v3_token_res, v3_catalog_stack: (
+            session.submit(f"{cfapi_url}/v3/stacks/{guid}") if v3_token_res.status_code == 200 and not v3_catalog_stack else None
+        ),
+        ["guid", "v3_token_res", "v3_catalog_stack"],
+    )
+)
+
+
 @app.route("/v2/stacks/<uuid:guid>")
 def v2_get_stack(guid):
-    with requests.Session() as session:
-        session.headers.update(cfapi_request_headers(flask.request.headers))
-        session.allow_redirects = False
-        v3_stack_res = session.get(url=f"{cfapi_url}/v3/stacks/{guid}")
-        v3_stack = v3_stack_res.json()
+    with cfapi.session(cfapi_request_headers(flask.request.headers)) as session:
+        v3 = stack_plan.run(session, guid=guid)
+
+    if v3["v3_catalog_stack"]:
+        return flask.make_response(stack_v3_to_v2(v3["v3_catalog_stack"]), 200)
+    # not requested if the token check failed
+    v3_stack_res = v3["v3_token_res"] if v3["v3_stack_res"] is None else v3["v3_stack_res"]
+    if v3_stack_res.status_code >= 400:
+        # TODO: error mapping
+        return flask.make_response(v3_stack_res.content, v3_stack_res.status_code, cfapi_response_headers(v3_stack_res.headers))
+    return flask.make_response(stack_v3_to_v2(v3_stack_res.json()), 200, cfapi_response_headers(v3_stack_res.headers))
+
 
-    return flask.make_response(stack_v3_to_v2(v3_stack), 200, cfapi_response_headers(v3_stack_res.headers))
+# v3 requests of GET /v2/stacks
+stacks_plan = (
+    Plan(inputs=["params"])
+    .fetch("v3_token_res", f"{cfapi_url}/v3/stacks", params={"per_page": 1}, cached=True)
+    .step("v3_catalog_stacks", catalog_stacks_page, ["params", "v3_token_res"])
+    .step(
+        "v3_stacks_res",
+        lambda session, params, v3_token_res, v3_catalog_stacks: (
+            session.submit(f"{cfapi_url}/v3/stacks", params=params) if v3_token_res.status_code == 200 and not v3_catalog_stacks else None
+        ),
+        ["params", "v3_token_res", "v3_catalog_stacks"],
+    )
+)
 
 
 # TODO inline-relations-depth - should not exist for this endpoint
 @app.route("/v2/stacks")
 def v2_get_stacks():
-    with requests.Session() as session:
-        session.headers.update(cfapi_request_headers(flask.request.headers))
-        session.allow_redirects = False
+    with cfapi.session(cfapi_request_headers(flask.request.headers)) as session:
         params = {**pagination_params_v2_to_v3(flask.request.args), **filter_params_v2_to_v3(flask.request.args)}
-        v3_stacks_res = session.get(url=f"{cfapi_url}/v3/stacks", params=params)
+        error = pagination_params_error(params)
+        if error:
+            return flask.make_response(
+                {"code": 1010, "description": f"The query parameter is invalid: {error}", "error_code": "CF-BadQueryParameter"}, 400
+            )
+        v3 = stacks_plan.run(session, params=params)
+
+    if v3["v3_catalog_stacks"]:
+        v3_stacks = v3["v3_catalog_stacks"]
+        response_headers = {}
+    else:
+        v3_stacks_res = v3["v3_token_res"] if v3["v3_stacks_res"] is None else v3["v3_stacks_res"]
+        if v3_stacks_res.status_code >= 400:
+            # TODO: error mapping
+            return flask.make_response(v3_stacks_res.content, v3_stacks_res.status_code, cfapi_response_headers(v3_stacks_res.headers))
         v3_stacks = v3_stacks_res.json()
+        response_headers = cfapi_response_headers(v3_stacks_res.headers)
 
-    v2_stacks = {
-        **pagination_v3_to_v2(v3_stacks["pagination"], flask.request.args),
-        "resources": [stack_v3_to_v2(v3_stack) for v3_stack in v3_stacks["resources"]],
-    }
-    return flask.make_response(v2_stacks, 200, cfapi_response_headers(v3_stacks_res.headers))
+    return v2_list_response(
+        pagination_v3_to_v2(v3_stacks["pagination"], flask.request.args),
+        (stack_v3_to_v2(v3_stack) for v3_stack in v3_stacks["resources"]),
+        response_headers,
+    )
@@ -0,0 +1,164 @@
+import logging
+from shim.cfapi import CFApiSession
+from shim.fetch import ChunkedFetch, fetch_all_pages
+from shim.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# v2 counts starting and running instances of an app
+RUNNING_INSTANCE_STATES = ["RUNNING", "STARTING"]
+
+
+def route_v3_to_v2_summary(v3_route: dict, v3_domain: dict) -> dict:
+    return {
+        "guid": v3_route["guid"],
+        "host": v3_route["host"],
+        "port": v3_route["port"],
+        "path": v3_route["path"],
+        "domain": {
+            "guid": v3_route["relationships"]["domain"]["data"]["guid"],
+            "name": v3_domain["name"] if v3_domain else None,
+        },
+    }
+
+
+def domain_v3_to_v2_summary(v3_domain: dict) -> dict:
+    owner = v3_domain["relationships"]["organization"]["data"]
+    if owner:
+        # private domain
+        return {"guid": v3_domain["guid"], "name": v3_domain["name"], "owning_organization_guid": owner["guid"]}
+    return {
+        "guid": v3_domain["guid"],
+        "name": v3_domain["name"],
+        "router_group_guid": v3_domain["router_group"]["guid"] if v3_domain["router_group"] else None,
+        # TODO: v3 domains don't contain the router group type (routing API)
+        "router_group_type": None,
+    }
+
+
+def domains_of_organization(v3_domains: list[dict], org_guid: str) -> list[dict]:
+    """Shared domains and private domains owned by or shared with the org (v2 available_domains of an app)."""
+    return [
+        d
+        for d in v3_domains
+        if not d["relationships"]["organization"]["data"]
+        or d["relationships"]["organization"]["data"]["guid"] == org_guid
+        or org_guid in {o["guid"] for o in d["relationships"]["shared_organizations"]["data"]}
+    ]
+
+
+def service_instance_v3_to_v2_summary(v3_instance: dict, v3_plan: dict, v3_offering: dict, bound_app_count: int) -> dict:
+    v2_instance = {"guid": v3_instance["guid"], "name": v3_instance["name"], "bound_app_count": bound_app_count}
+    if v3_instance["type"] == "user-provided":
+        v2_instance["type"] = "user_provided_service_instance"
+        return v2_instance
+    v2_instance["last_operation"] = v3_instance.get("last_operation")
+    v2_instance["dashboard_url"] = v3_instance.get("dashboard_url")
+    v2_instance["service_plan"] = (
+        {
+            "guid": v3_plan["guid"],
+            "name": v3_plan["name"],
+            "service": {
+                "guid": v3_offering["guid"] if v3_offering else None,
+                "label": v3_offering["name"] if v3_offering else None,
+                "provider": None,
+                "version": None,
+            },
+        }
+        if v3_plan
+        else None
+    )
+    return v2_instance
+
+
+def service_plans_fetch(session: CFApiSession, api_url: str, v3_instances: dict) -> ChunkedFetch:
+    """Plans of the managed service instances (guid -> instance) with their service offerings."""
+    plan_guids = sorted(
+        {i["relationships"]["service_plan"]["data"]["guid"] for i in v3_instances.values() if "service_plan" in i["relationships"]}
+    )
+    return ChunkedFetch(session, f"{api_url}/v3/service_plans", "guids", plan_guids, {"per_page": 5000, "include": "service_offering"})
+
+
+def instance_bindings_fetch(session: CFApiSession, api_url: str, v3_instances: dict) -> ChunkedFetch:
+    """App bindings of the service instances (guid -> instance), for the bound app count."""
+    return ChunkedFetch(
+        session,
+        f"{api_url}/v3/service_credential_bindings",
+        "service_instance_guids",
+        list(v3_instances),
+        {"per_page": 5000, "type": "app"},
+    )
+
+
+def services_v3_to_v2_summary(v3_instances: dict, v3_plans_fetch: ChunkedFetch, v3_instance_bindings_fetch: ChunkedFetch) -> list[dict]:
+    v3_plans = {p["guid"]: p for p in v3_plans_fetch.result()}
+    v3_offerings = v3_plans_fetch.included.get("service_offerings", {})
+    bindings = bindings_by(v3_instance_bindings_fetch.result(), "service_instance")
+    v2_services = []
+    for guid, v3_instance in v3_instances.items():
+        plan_data = v3_instance["relationships"].get("service_plan", {}).get("data")
+        v3_plan = v3_plans.get(plan_data["guid"]) if plan_data else None
+        v3_offering = v3_offerings.get(v3_plan["relationships"]["service_offering"]["data"]["guid"]) if v3_plan else None
+        v2_services.append(service_instance_v3_to_v2_summary(v3_instance, v3_plan, v3_offering, len(bindings.get(guid, []))))
+    return v2_services
+
+
+def all_domains(session: CFApiSession, v3_domains_res) -> list[dict]:
+    """Domains of the first page (already requested) and of the following pages."""
+    res_json = v3_domains_res.json()
+    if res_json["pagination"]["next"]:
+        return res_json["resources"] + fetch_all_pages(session, res_json["pagination"]["next"]["href"])
+    return res_json["resources"]
+
+
+def running_instances(v3_stats: dict) -> int:
+    """Starting and running instances of a process (stats response), 0 if stats are not available (e.g. deadline exceeded)."""
+    if not v3_stats:
+        return 0
+    return sum(1 for instance in v3_stats["resources"] if instance["state"] in RUNNING_INSTANCE_STATES)
+
+
+def routes_by_app(v3_routes: list[dict]) -> dict[str, list[dict]]:
+    """app guid -> routes with a destination of the app (v2: route mappings)."""
+    routes = {}
+    for v3_route in v3_routes:
+        for app_guid in dict.fromkeys(d["app"]["guid"] for d in v3_route["destinations"]):
+            routes.setdefault(app_guid, []).append(v3_route)
+    return routes
+
+
+def bindings_by(v3_bindings: list[dict], relationship: str) -> dict[str, list[dict]]:
+    """guid of the relationship (app, service_instance) -> service credential bindings."""
+    bindings = {}
+    for v3_binding in v3_bindings:
+        bindings.setdefault(v3_binding["relationships"][relationship]["data"]["guid"], []).append(v3_binding)
+    return bindings
+
+
+@timed
+def app_summary_v3_to_v2(
+    v2_app: dict, v3_routes: list[dict], v3_domains: dict, v2_services: list[dict], running: int, v2_available_domains: list[dict]
+) -> dict:
+    """GET /v2/apps/:guid/summary: v2 app entity with guid, routes, services, running instances and available domains."""
+    return {
+        **v2_app["entity"],
+        "guid": v2_app["metadata"]["guid"],
+        "routes": [route_v3_to_v2_summary(r, v3_domains.get(r["relationships"]["domain"]["data"]["guid"])) for r in v3_routes],
+        "running_instances": running,
+        "services": v2_services,
+        "available_domains": v2_available_domains,
+    }
+
+
+@timed
+def space_app_summary_v3_to_v2(v2_app: dict, v3_routes: list[dict], v3_domains: dict, service_names: list[str], running: int) -> dict:
+    """App of GET /v2/spaces/:guid/summary: v2 app entity with guid, urls, routes, services and running instances."""
+    return {
+        **v2_app["entity"],
+        "guid": v2_app["metadata"]["guid"],
+        "urls": [r["url"] for r in v3_routes],
+        "routes": [route_v3_to_v2_summary(r, v3_domains.get(r["relationships"]["domain"]["data"]["guid"])) for r in v3_routes],
+        "service_count": len(service_names),
+        "service_names": service_names,
+        "running_instances": running,
+    }
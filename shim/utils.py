@@ -1,5 +1,7 @@
+import heapq
 import logging
 import urllib
+import requests
 from werkzeug.datastructures import MultiDict
 
 logger = logging.getLogger(__name__)
@@ -9,13 +11,38 @@ def cfapi_request_headers(headers: dict) -> dict:
     return {k: v for k, v in headers if k.lower() != "host"}  # exclude 'host' header
 
 
-def cfapi_response_headers(headers: dict) -> dict:
+def forward_request_headers(headers: dict) -> dict:
+    # forwarded bodies are streamed as is: the CF API may only encode them as the client accepts, not with the default
+    # 'gzip, deflate' of the HTTP client
+    forward_headers = cfapi_request_headers(headers)
+    if not any(k.lower() == "accept-encoding" for k in forward_headers):
+        forward_headers["Accept-Encoding"] = "identity"
+    return forward_headers
+
+
+# ref. https://www.rfc-editor.org/rfc/rfc2616#section-13.5.1
+HOP_BY_HOP_HEADERS = ["connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailers", "transfer-encoding", "upgrade"]
+
+
+def cfapi_response_headers(headers: dict, decoded: bool = True) -> dict:
     # v2 has no x-runtime header
-    # TODO: exclude all "hop-by-hop headers" defined by RFC 2616 section 13.5.1 ref. https://www.rfc-editor.org/rfc/rfc2616#section-13.5.1
-    excluded_headers = ["content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive", "date", "x-runtime"]
+    # decoded = body was decoded (e.g. gzip) and gets serialized again -> content-encoding and content-length don't fit anymore
+    connection = next((v for (k, v) in headers.items() if k.lower() == "connection"), "")
+    # headers listed in the connection header are hop-by-hop headers as well
+    excluded_headers = HOP_BY_HOP_HEADERS + [h.strip().lower() for h in connection.split(",")] + ["date", "x-runtime"]
+    if decoded:
+        excluded_headers += ["content-encoding", "content-length"]
     return {k: v for k, v in headers.items() if k.lower() not in excluded_headers}
 
 
+def stream_body(res: requests.Response, chunk_size: int = 64 * 1024):
+    """Body of a streamed response (request with stream=True) in chunks, as is i.e. not decoded. Closes the response at the end."""
+    try:
+        yield from res.raw.stream(chunk_size, decode_content=False)
+    finally:
+        res.close()
+
+
 def pagination_url_v3_to_v2(url: str, v2_params: MultiDict) -> str:
     v3_parsed_url = urllib.parse.urlparse(url)
     qs = urllib.parse.parse_qs(v3_parsed_url.query)
@@ -75,12 +102,19 @@ def pagination_params_v2_to_v3(v2_params: MultiDict) -> dict:
 
 
 # TODO: pass valid filter params
-def filter_params_v2_to_v3(v2_params: MultiDict) -> dict:
+def filter_params_v2_to_v3(v2_params: MultiDict, supported: list[str] = None) -> dict:
+    """v3 filter params for the v2 q params.
+
+    supported = v3 filters of a dependent query (e.g. processes of the apps of a v2 apps query): returns the filters only
+    if all of them can be pushed down into the dependent query, None otherwise (also without filters).
+    """
     # logger.debug(f"v2_params: {v2_params}")
     v3_params = {}  # MultiDict?
     for f in v2_params.getlist("q"):
         (key, value) = query_filter_v2_to_v3(f)
         v3_params[key] = value
+    if supported is not None and (not v3_params or not v3_params.keys() <= set(supported)):
+        return None
     return v3_params
 
 
@@ -112,3 +146,56 @@ def query_filter_v2_to_v3(filter: str) -> tuple[str, str]:
         return (split[0] + "s[lt]", split[1])
 
     raise ValueError(f"Invalid filter: {filter}")  # TODO: api compliant error (4xx with error message)
+
+
+def pagination_params_error(v3_params: dict) -> str:
+    """Error message for invalid page or per_page params (like the CF API rejects them), None if they are valid."""
+    for name, maximum in [("page", None), ("per_page", 5000)]:
+        value = v3_params.get(name)
+        if value is None:
+            continue
+        if not str(value).isdigit() or int(value) < 1:
+            return f"{name} must be a positive integer"
+        if maximum and int(value) > maximum:
+            return f"{name} must be between 1 and {maximum}"
+    return None
+
+
+def paginate_v3(resources: list[dict], path: str, v3_params: dict) -> dict:
+    """Sort and paginate resources locally like a v3 list endpoint, e.g. for resources from a cache."""
+    error = pagination_params_error(v3_params)
+    if error:
+        raise ValueError(error)
+    order_by = v3_params.get("order_by", "created_at")
+    reverse = order_by.startswith("-")
+    order_by = order_by.lstrip("+-")
+
+    per_page = int(v3_params.get("per_page", 50))
+    page = int(v3_params.get("page", 1))
+    total_results = len(resources)
+
+    def key(r: dict) -> tuple:
+        return (r.get(order_by) or "", r["guid"])
+
+    # only the resources up to the requested page need to be sorted, e.g. first page of a large list: O(n log(page * per_page))
+    if page * per_page < total_results // 2:
+        resources = (heapq.nlargest if reverse else heapq.nsmallest)(page * per_page, resources, key=key)
+    else:
+        resources = sorted(resources, key=key, reverse=reverse)
+    total_pages = max(1, (total_results + per_page - 1) // per_page)
+    order_by_param = f"&order_by={v3_params['order_by']}" if "order_by" in v3_params else ""
+
+    def page_link(p: int) -> dict:
+        return {"href": f"{path}?page={p}&per_page={per_page}{order_by_param}"}
+
+    return {
+        "pagination": {
+            "total_results": total_results,
+            "total_pages": total_pages,
+            "first": page_link(1),
+            "last": page_link(total_pages),
+            "next": page_link(page + 1) if page < total_pages else None,
+            "previous": page_link(page - 1) if page > 1 else None,
+        },
+        "resources": resources[(page - 1) * per_page : page * per_page],
+    }
@@ -0,0 +1,210 @@
+"""End-to-end benchmark of the shim against the local fake CF API (fakecfapi.py), no CF foundation needed.
+
+Starts the fake CF API and the shim as sub-processes and sends requests to every shimmed endpoint. It reports latency
+percentiles, throughput, upstream (v3) calls per request and the peak memory (RSS) of the shim while serving the requests
+of an endpoint (Linux only). Results are written as json together with the git commit
+and the benchmark settings, --compare shows the difference to the results of another run (e.g. of a previous commit).
+
+    python tests/benchmark.py --apps 1000 --latency 0.02 --requests 50 --concurrency 8 --out benchmark.json
+    python tests/benchmark.py --apps 1000 --latency 0.02 --env CFG_CF_API_ENGINE=asyncio --compare benchmark.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEADERS = {"Authorization": "bearer benchmark"}
+
+
+def start(args: list, env: dict, log_file: str) -> subprocess.Popen:
+    with open(log_file, "w") as log:
+        return subprocess.Popen(args, cwd=ROOT_DIR, env={**os.environ, **env}, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_until_ready(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.ConnectionError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def process_tree(pid: int) -> list[int]:
+    """pid and its child processes, e.g. gunicorn workers."""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [pid, *(child for child_pid in f.read().split() for child in process_tree(int(child_pid)))]
+    except OSError:
+        return [pid]
+
+
+def reset_peak_rss(pid: int):
+    for p in process_tree(pid):
+        try:
+            with open(f"/proc/{p}/clear_refs", "w") as f:
+                f.write("5")  # resets VmHWM
+        except OSError:
+            pass
+
+
+def peak_rss_mb(pid: int) -> float:
+    """Peak RSS of the process and its children since the last reset_peak_rss(), None if not available (not Linux)."""
+    peak = 0
+    for p in process_tree(pid):
+        try:
+            with open(f"/proc/{p}/status") as f:
+                peak += next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+        except (OSError, StopIteration):
+            return None
+    return round(peak / 1024, 1)
+
+
+def endpoints(cfapi_url: str) -> dict:
+    """Shimmed endpoints with guids of the fake CF API, key = name with guid placeholders (stable across runs)."""
+    app_guid = requests.get(f"{cfapi_url}/v3/apps", params={"per_page": 1}).json()["resources"][0]["guid"]
+    space_guid = requests.get(f"{cfapi_url}/v3/spaces", params={"per_page": 1}).json()["resources"][0]["guid"]
+    stack_guid = requests.get(f"{cfapi_url}/v3/stacks", params={"per_page": 1}).json()["resources"][0]["guid"]
+    names = [
+        "/",
+        "/v2/info",
+        "/v2/apps/:app_guid",
+        "/v2/apps",
+        "/v2/apps?results-per-page=100",
+        "/v2/apps?q=space_guid::space_guid",
+        "/v2/spaces",
+        "/v2/spaces/:space_guid",
+        "/v2/spaces?q=developer_guid:user-1",
+        "/v2/stacks",
+        "/v2/stacks/:stack_guid",
+        "/v3/apps",
+    ]
+    return {
+        name: name.replace(":app_guid", app_guid).replace(":space_guid", space_guid).replace(":stack_guid", stack_guid) for name in names
+    }
+
+
+def run_endpoint(shim_url: str, cfapi_url: str, endpoint: str, num_requests: int, concurrency: int, shim_pid: int) -> dict:
+    sessions = {}
+
+    def get(i):
+        # one session (keep-alive connection) per client thread
+        session = sessions.setdefault(i % concurrency, requests.Session())
+        start = time.perf_counter()
+        res = session.get(f"{shim_url}{endpoint}", headers=HEADERS)
+        return (time.perf_counter() - start, res.status_code)
+
+    get(0)  # warm-up, e.g. connections and caches
+    requests.delete(f"{cfapi_url}/_stats")
+    reset_peak_rss(shim_pid)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(get, range(num_requests)))
+    duration = time.perf_counter() - start
+    upstream_calls = requests.get(f"{cfapi_url}/_stats").json().get("_total", 0)
+
+    latencies = sorted(latency * 1000 for (latency, _) in results)
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": num_requests,
+        "errors": sum(1 for (_, status_code) in results if status_code >= 400),
+        "p50_ms": round(percentiles[49], 1),
+        "p90_ms": round(percentiles[89], 1),
+        "p99_ms": round(percentiles[98], 1),
+        "max_ms": round(latencies[-1], 1),
+        "throughput_rps": round(num_requests / duration, 1),
+        "upstream_calls_per_request": round(upstream_calls / num_requests, 2),
+        "peak_rss_mb": peak_rss_mb(shim_pid),
+    }
+
+
+def print_results(results: dict, baseline: dict = None):
+    columns = ["p50_ms", "p90_ms", "p99_ms", "throughput_rps", "upstream_calls_per_request", "peak_rss_mb", "errors"]
+    print(f"{'endpoint':50} " + " ".join(f"{c:>18}" for c in columns))
+    for endpoint, result in results.items():
+        line = f"{endpoint[:50]:50} "
+        for c in columns:
+            value = f"{result[c]}"
+            # results of older runs may lack columns
+            if baseline and endpoint in baseline and baseline[endpoint].get(c) and result[c] is not None:
+                value += f" ({(result[c] - baseline[endpoint][c]) / baseline[endpoint][c]:+.0%})"
+            line += f"{value:>18} "
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the shim against the local fake CF API")
+    parser.add_argument("--apps", type=int, default=100, help="number of apps of the fake CF API (10..10000)")
+    parser.add_argument("--builds", type=int, default=3, help="packages, builds and droplets per app")
+    parser.add_argument("--latency", type=float, default=0.02, help="latency per CF API call in seconds")
+    parser.add_argument("--requests", type=int, default=20, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=4, help="parallel clients")
+    parser.add_argument("--env", action="append", default=[], help="shim config, e.g. CFG_CF_API_ENGINE=asyncio")
+    parser.add_argument("--endpoint", action="append", help="only benchmark these endpoints, e.g. /v2/apps/:app_guid (default: all)")
+    parser.add_argument("--out", help="write results to this json file")
+    parser.add_argument("--compare", help="json file with results of a previous run")
+    parser.add_argument("--cfapi-port", type=int, default=9090)
+    parser.add_argument("--shim-port", type=int, default=8080)
+    args = parser.parse_args()
+
+    cfapi_url = f"http://127.0.0.1:{args.cfapi_port}"
+    shim_url = f"http://127.0.0.1:{args.shim_port}"
+    shim_env = {
+        "CFG_CF_API_URL": cfapi_url,
+        "CFG_PROXY_V3": "true",
+        "PORT": str(args.shim_port),
+        **dict(e.split("=", 1) for e in args.env),
+    }
+    processes = []
+    try:
+        fake_args = ["--apps", str(args.apps), "--builds", str(args.builds), "--latency", str(args.latency), "--port", str(args.cfapi_port)]
+        processes.append(start([sys.executable, "tests/fakecfapi.py", *fake_args], {}, "/tmp/benchmark-fakecfapi.log"))
+        wait_until_ready(f"{cfapi_url}/_stats")
+        shim = start([sys.executable, "-m", "shim"], shim_env, "/tmp/benchmark-shim.log")
+        processes.append(shim)
+        wait_until_ready(f"{shim_url}/health")
+
+        results = {}
+        for name, endpoint in endpoints(cfapi_url).items():
+            if not args.endpoint or name in args.endpoint:
+                results[name] = run_endpoint(shim_url, cfapi_url, endpoint, args.requests, args.concurrency, shim.pid)
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True).stdout.strip()
+    dirty = subprocess.run(["git", "status", "--porcelain", "shim"], cwd=ROOT_DIR, capture_output=True, text=True).stdout.strip()
+    report = {
+        "commit": f"{commit}{'-dirty' if dirty else ''}",
+        "settings": {k: v for (k, v) in vars(args).items() if k not in ["out", "compare", "endpoint"]},
+        "results": results,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            base_report = json.load(f)
+        if base_report["settings"] != report["settings"]:
+            print(f"WARNING: different settings than {args.compare}: {base_report['settings']}")
+        print(f"commit {report['commit']} compared to {base_report['commit']}")
+        baseline = base_report["results"]
+    else:
+        print(f"commit {report['commit']}")
+    print_results(results, baseline)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
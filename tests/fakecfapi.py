@@ -0,0 +1,635 @@
+"""Local stand-in for the CF v3 API with synthetic orgs, spaces, apps, processes, packages, builds, droplets, stacks etc.
+
+Serves the v3 endpoints used by the shim (list endpoints with filters, pagination, order_by and include, resources by
+guid, app sub-resources and process stats) for offline end-to-end tests and benchmarks, see benchmark.py. Data is generated deterministically.
+Auth headers are ignored (except as rate limit identity). DELETE of apps and spaces returns a v3 job that completes after
+--job-duration seconds. --rate-limit N allows N v3 calls per user and --rate-limit-window (X-RateLimit-* headers, 429). --tail-rate and
+--tail-latency add spiky latency to a fraction of calls, --error-rate fails a fraction of v3 calls with 503 (like gorouter).
+Errors of the fake itself (e.g. unknown resources) have CF v3 error bodies.
+
+    python tests/fakecfapi.py --apps 1000 --latency 0.02 --port 9090
+
+GET /_stats returns the number of calls per v3 resource type (+ "_total"), DELETE /_stats resets the counters.
+"""
+
+import argparse
+import collections
+import logging
+import random
+import threading
+import time
+import urllib.parse
+import uuid
+import flask
+import werkzeug.exceptions
+import werkzeug.serving
+
+logger = logging.getLogger(__name__)
+
+app = flask.Flask(__name__)
+data = {}
+index = {}
+calls = collections.Counter()
+calls_lock = threading.Lock()
+latency = 0.0
+tail_latency = 0.0
+tail_rate = 0.0
+error_rate = 0.0
+jobs = {}
+job_duration = 0.5
+rate_limit = 0
+rate_limit_window = 60.0
+rate_limit_budgets = {}  # Authorization header -> [reset (epoch seconds), remaining]
+
+# status -> (code, title) of CF v3 errors
+V3_ERRORS = {
+    400: (10005, "CF-BadQueryParameter"),
+    401: (10002, "CF-NotAuthenticated"),
+    403: (10003, "CF-NotAuthorized"),
+    404: (10010, "CF-ResourceNotFound"),
+    422: (10008, "CF-UnprocessableEntity"),
+}
+
+RESOURCE_TYPES = [
+    "organizations",
+    "spaces",
+    "apps",
+    "processes",
+    "packages",
+    "builds",
+    "droplets",
+    "stacks",
+    "buildpacks",
+    "roles",
+    "domains",
+    "routes",
+    "service_offerings",
+    "service_plans",
+    "service_instances",
+    "service_credential_bindings",
+]
+USER_GUID = "user-1"
+# base url of the links of the generated resources
+LINKS_URL = "https://api.example.org"
+APPS_PER_SPACE = 50
+# every n-th app is bound to a service instance of its space
+APPS_PER_SERVICE_BINDING = 5
+# internal attributes, not part of the v3 resources
+INTERNAL_ATTRIBUTES = ["env", "ssh", "current_droplet", "space_guid"]
+# include param: (resource type, include) -> (included resource type, guid of the included resource)
+INCLUDES = {
+    ("apps", "space"): ("spaces", lambda r: r["relationships"]["space"]["data"]["guid"]),
+    ("roles", "space"): ("spaces", lambda r: r["relationships"]["space"]["data"]["guid"] if r["relationships"]["space"]["data"] else None),
+    ("routes", "domain"): ("domains", lambda r: r["relationships"]["domain"]["data"]["guid"]),
+    ("service_credential_bindings", "service_instance"): (
+        "service_instances",
+        lambda r: r["relationships"]["service_instance"]["data"]["guid"],
+    ),
+    ("service_plans", "service_offering"): ("service_offerings", lambda r: r["relationships"]["service_offering"]["data"]["guid"]),
+}
+
+
+def generate(num_apps: int, builds_per_app: int, seed: int = 0) -> dict:
+    """Synthetic foundation: one org, a space per 50 apps (user-1 is developer in all of them), one web process and
+    builds_per_app packages, builds and droplets per app."""
+    rnd = random.Random(seed)
+
+    def guid() -> str:
+        return str(uuid.UUID(int=rnd.getrandbits(128), version=4))
+
+    def timestamp(i: int) -> str:
+        return f"2024-01-{1 + i // 86400 % 28:02d}T{i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}Z"
+
+    d = {resource_type: [] for resource_type in RESOURCE_TYPES}
+    for name in ["cflinuxfs3", "cflinuxfs4"]:
+        d["stacks"].append(
+            {
+                "guid": guid(),
+                "name": name,
+                "description": name,
+                "build_rootfs_image": name,
+                "run_rootfs_image": name,
+                "default": name == "cflinuxfs4",
+                "created_at": timestamp(0),
+                "updated_at": timestamp(0),
+            }
+        )
+        d["buildpacks"].append(
+            {"guid": guid(), "name": "staticfile_buildpack", "stack": name, "created_at": timestamp(0), "updated_at": timestamp(0)}
+        )
+
+    org = {"guid": guid(), "name": "org", "created_at": timestamp(1), "updated_at": timestamp(1)}
+    d["organizations"].append(org)
+    for i in range(max(1, num_apps // APPS_PER_SPACE)):
+        space = {
+            "guid": guid(),
+            "name": f"space{i}",
+            "created_at": timestamp(2 + i),
+            "updated_at": timestamp(2 + i),
+            "relationships": {"organization": {"data": {"guid": org["guid"]}}, "quota": {"data": None}},
+        }
+        d["spaces"].append(space)
+        d["roles"].append(
+            {
+                "guid": guid(),
+                "type": "space_developer",
+                "created_at": timestamp(2),
+                "updated_at": timestamp(2),
+                "relationships": {
+                    "user": {"data": {"guid": USER_GUID}},
+                    "space": {"data": {"guid": space["guid"]}},
+                    "organization": {"data": None},
+                },
+            }
+        )
+
+    t = 1000
+    for i in range(num_apps):
+        space = d["spaces"][i % len(d["spaces"])]
+        app_guid = guid()
+        t += 10
+        v3_app = {
+            "guid": app_guid,
+            "name": f"app{i:05d}",
+            "state": "STARTED",
+            "created_at": timestamp(t),
+            "updated_at": timestamp(t),
+            "lifecycle": {"type": "buildpack", "data": {"buildpacks": ["staticfile_buildpack"], "stack": "cflinuxfs4"}},
+            "relationships": {"space": {"data": {"guid": space["guid"]}}},
+            "env": {"var": {"K": f"v{i}"}},
+            "ssh": True,
+        }
+        d["apps"].append(v3_app)
+        relationships = {"app": {"data": {"guid": app_guid}}}
+        d["processes"].append(
+            {
+                "guid": guid(),
+                "type": "web",
+                "command": "cmd",
+                "instances": 1,
+                "memory_in_mb": 64,
+                "disk_in_mb": 128,
+                "log_rate_limit_in_bytes_per_second": -1,
+                "version": guid(),
+                "created_at": timestamp(t),
+                "updated_at": timestamp(t),
+                "health_check": {"type": "port", "data": {"timeout": None}},
+                "relationships": relationships,
+                "space_guid": space["guid"],
+            }
+        )
+        for _ in range(builds_per_app):
+            t += 1
+            package = {
+                "guid": guid(),
+                "type": "bits",
+                "state": "READY",
+                "data": {},
+                "created_at": timestamp(t),
+                "updated_at": timestamp(t),
+                "relationships": relationships,
+                "space_guid": space["guid"],
+            }
+            d["packages"].append(package)
+            d["builds"].append(
+                {
+                    "guid": guid(),
+                    "state": "STAGED",
+                    "error": None,
+                    "created_at": timestamp(t),
+                    "updated_at": timestamp(t),
+                    "relationships": relationships,
+                    "package": {"guid": package["guid"]},
+                }
+            )
+            droplet = {
+                "guid": guid(),
+                "state": "STAGED",
+                "error": None,
+                "created_at": timestamp(t),
+                "updated_at": timestamp(t),
+                "stack": "cflinuxfs4",
+                "buildpacks": [{"name": "staticfile_buildpack", "buildpack_name": "staticfile", "version": "1"}],
+                "lifecycle": {"type": "buildpack"},
+                "process_types": {"web": "boot.sh"},
+                "execution_metadata": "",
+                "relationships": relationships,
+                "space_guid": space["guid"],
+            }
+            d["droplets"].append(droplet)
+            v3_app["current_droplet"] = droplet["guid"]
+    generate_routes_and_services(d, guid, timestamp)
+    # like in the CF API, every resource has metadata and links (not used by the shim, but part of the response bodies)
+    for resource_type, resources in d.items():
+        for resource in resources:
+            resource.setdefault("metadata", {"labels": {}, "annotations": {}})
+            resource.setdefault("links", {"self": {"href": f"{LINKS_URL}/v3/{resource_type}/{resource['guid']}"}})
+    return d
+
+
+def generate_routes_and_services(d: dict, guid, timestamp):
+    """A shared domain and a private domain of the org, one route per app, a managed and a user-provided service
+    instance per space, every 5th app is bound to the managed instance of its space."""
+    org_guid = d["organizations"][0]["guid"]
+    for name, owner in [("apps.fake", None), ("org.fake", org_guid)]:
+        d["domains"].append(
+            {
+                "guid": guid(),
+                "name": name,
+                "internal": False,
+                "router_group": None,
+                "supported_protocols": ["http"],
+                "created_at": timestamp(0),
+                "updated_at": timestamp(0),
+                "relationships": {"organization": {"data": {"guid": owner} if owner else None}, "shared_organizations": {"data": []}},
+            }
+        )
+    offering = {
+        "guid": guid(),
+        "name": "fakedb",
+        "description": "fake database",
+        "created_at": timestamp(0),
+        "updated_at": timestamp(0),
+        "relationships": {"service_broker": {"data": {"guid": guid()}}},
+    }
+    d["service_offerings"].append(offering)
+    plan = {
+        "guid": guid(),
+        "name": "small",
+        "free": True,
+        "created_at": timestamp(0),
+        "updated_at": timestamp(0),
+        "relationships": {"service_offering": {"data": {"guid": offering["guid"]}}},
+    }
+    d["service_plans"].append(plan)
+
+    managed_instances = {}
+    for space in d["spaces"]:
+        for service_type in ["managed", "user-provided"]:
+            instance = {
+                "guid": guid(),
+                "name": f"{space['name']}-{service_type}",
+                "type": service_type,
+                "created_at": timestamp(2),
+                "updated_at": timestamp(2),
+                "relationships": {"space": {"data": {"guid": space["guid"]}}},
+                "space_guid": space["guid"],
+            }
+            if service_type == "managed":
+                instance["dashboard_url"] = None
+                instance["last_operation"] = {
+                    "type": "create",
+                    "state": "succeeded",
+                    "description": "",
+                    "created_at": timestamp(2),
+                    "updated_at": timestamp(2),
+                }
+                instance["relationships"]["service_plan"] = {"data": {"guid": plan["guid"]}}
+                managed_instances[space["guid"]] = instance
+            d["service_instances"].append(instance)
+
+    for i, v3_app in enumerate(d["apps"]):
+        space_guid = v3_app["relationships"]["space"]["data"]["guid"]
+        d["routes"].append(
+            {
+                "guid": guid(),
+                "protocol": "http",
+                "host": v3_app["name"],
+                "path": "",
+                "port": None,
+                "url": f"{v3_app['name']}.apps.fake",
+                "created_at": v3_app["created_at"],
+                "updated_at": v3_app["updated_at"],
+                "destinations": [{"guid": guid(), "app": {"guid": v3_app["guid"], "process": {"type": "web"}}, "port": 8080}],
+                "relationships": {"space": {"data": {"guid": space_guid}}, "domain": {"data": {"guid": d["domains"][0]["guid"]}}},
+                "space_guid": space_guid,
+            }
+        )
+        if i % APPS_PER_SERVICE_BINDING == 0:
+            d["service_credential_bindings"].append(
+                {
+                    "guid": guid(),
+                    "type": "app",
+                    "name": None,
+                    "created_at": v3_app["created_at"],
+                    "updated_at": v3_app["updated_at"],
+                    "relationships": {
+                        "app": {"data": {"guid": v3_app["guid"]}},
+                        "service_instance": {"data": {"guid": managed_instances[space_guid]["guid"]}},
+                    },
+                }
+            )
+
+
+def load(d: dict):
+    global data, index
+    data = d
+    index = {resource_type: {r["guid"]: r for r in resources} for (resource_type, resources) in d.items()}
+
+
+def external(resource: dict) -> dict:
+    return {k: v for (k, v) in resource.items() if k not in INTERNAL_ATTRIBUTES}
+
+
+def app_guid_of(resource: dict) -> str:
+    if "destinations" in resource:
+        # routes
+        return next((d["app"]["guid"] for d in resource["destinations"]), None)
+    return resource.get("relationships", {}).get("app", {}).get("data", {}).get("guid")
+
+
+def paginate(path: str, resources: list, args: dict) -> dict:
+    order_by = args.get("order_by", "created_at")
+    key = order_by.lstrip("+-")
+    resources = sorted(resources, key=lambda r: (r.get(key) or "", r["guid"]), reverse=order_by.startswith("-"))
+    per_page = int_param(args, "per_page", 50, 5000)
+    page = int_param(args, "page", 1, 1000000)
+    total_results = len(resources)
+    total_pages = max(1, (total_results + per_page - 1) // per_page)
+    query = {k: v for (k, v) in args.items() if k not in ["page", "per_page"]}
+
+    def link(p: int) -> dict:
+        return {"href": f"{flask.request.host_url.rstrip('/')}{path}?" + urllib.parse.urlencode({**query, "page": p, "per_page": per_page})}
+
+    return {
+        "pagination": {
+            "total_results": total_results,
+            "total_pages": total_pages,
+            "first": link(1),
+            "last": link(total_pages),
+            "next": link(page + 1) if page < total_pages else None,
+            "previous": link(page - 1) if page > 1 else None,
+        },
+        "resources": [external(r) for r in resources[(page - 1) * per_page : page * per_page]],
+    }
+
+
+def int_param(args: dict, name: str, default: int, maximum: int) -> int:
+    value = args.get(name, str(default))
+    if not value.isdigit() or not 1 <= int(value) <= maximum:
+        flask.abort(400, f"The query parameter is invalid: {name} must be between 1 and {maximum}")
+    return int(value)
+
+
+def filtered(resource_type: str, resources: list, args: dict) -> list:
+    for param, value in args.items():
+        values = set(value.split(","))
+        if param == "guids":
+            resources = [r for r in resources if r["guid"] in values]
+        elif param == "names":
+            resources = [r for r in resources if r.get("name") in values]
+        elif param == "app_guids":
+            resources = [r for r in resources if app_guid_of(r) in values]
+        elif param == "space_guids" and resource_type == "apps":
+            resources = [r for r in resources if r["relationships"]["space"]["data"]["guid"] in values]
+        elif param == "space_guids":
+            resources = [r for r in resources if r.get("space_guid") in values]
+        elif param == "user_guids":
+            resources = [r for r in resources if r["relationships"]["user"]["data"]["guid"] in values]
+        elif param == "stacks":
+            resources = [r for r in resources if r.get("stack") in values]
+        elif param == "types" and resource_type != "roles":
+            resources = [r for r in resources if r.get("type") in values]
+        elif param == "states":
+            resources = [r for r in resources if r.get("state") in values]
+        elif param == "default" and value == "true":
+            resources = [r for r in resources if r.get("default")]
+        elif param == "service_instance_guids":
+            resources = [r for r in resources if r["relationships"]["service_instance"]["data"]["guid"] in values]
+    return resources
+
+
+def find(resource_type: str, guid: str) -> dict:
+    resource = index.get(resource_type, {}).get(guid)
+    if resource is None:
+        flask.abort(404, f"{resource_type[:-1].replace('_', ' ').capitalize()} not found")
+    return resource
+
+
+@app.before_request
+def count_and_delay():
+    if flask.request.path.startswith("/_"):
+        return
+    path = flask.request.path
+    with calls_lock:
+        calls[path.split("/")[2] if path.startswith("/v3/") else path] += 1
+        calls["_total"] += 1
+        if rate_limit and path.startswith("/v3/"):
+            now = time.time()
+            budget = rate_limit_budgets.setdefault(flask.request.headers.get("Authorization"), [0, 0])
+            if now >= budget[0]:
+                budget[:] = [int(now + rate_limit_window) + 1, rate_limit]
+            budget[1] -= 1
+            flask.g.rate_limit = (budget[0], max(0, budget[1]))
+            if budget[1] < 0:
+                calls["_throttled"] += 1
+                error = {"errors": [{"code": 10013, "title": "CF-RateLimitExceeded", "detail": "Rate Limit Exceeded"}]}
+                return flask.make_response(error, 429)
+        if error_rate and path.startswith("/v3/") and random.random() < error_rate:
+            calls["_errors"] += 1
+            return flask.make_response("<html><body>503 Service Unavailable</body></html>", 503)
+    if latency:
+        time.sleep(latency)
+    if tail_rate and random.random() < tail_rate:
+        time.sleep(tail_latency)
+
+
+@app.after_request
+def rate_limit_headers(response):
+    if "rate_limit" in flask.g:
+        reset, remaining = flask.g.rate_limit
+        response.headers["X-RateLimit-Limit"] = str(rate_limit)
+        response.headers["X-RateLimit-Remaining"] = str(remaining)
+        response.headers["X-RateLimit-Reset"] = str(reset)
+    return response
+
+
+@app.errorhandler(werkzeug.exceptions.HTTPException)
+def v3_error(e: werkzeug.exceptions.HTTPException):
+    # CF API errors are json (e.g. 404 of an unknown resource), not the html error pages of flask
+    code, title = V3_ERRORS.get(e.code, (10001, "CF-UnknownError"))
+    return flask.make_response({"errors": [{"code": code, "title": title, "detail": e.description}]}, e.code)
+
+
+@app.route("/_stats", methods=["GET", "DELETE"])
+def stats():
+    with calls_lock:
+        if flask.request.method == "DELETE":
+            calls.clear()
+        return dict(calls)
+
+
+@app.route("/")
+def root():
+    url = flask.request.host_url.rstrip("/")
+    return {
+        "links": {
+            "self": {"href": url},
+            "cloud_controller_v2": {"href": f"{url}/v2", "meta": {"version": "2.200.0"}},
+            "cloud_controller_v3": {"href": f"{url}/v3"},
+            "login": {"href": "https://login"},
+            "uaa": {"href": "https://uaa"},
+            "app_ssh": {"href": "ssh:2222", "meta": {"host_key_fingerprint": "fp", "oauth_client": "ssh-proxy"}},
+            "logging": {"href": "wss://doppler"},
+        }
+    }
+
+
+@app.route("/v3/info")
+def info():
+    return {"name": "fake", "build": "1", "version": 1, "description": "fake CF API", "cli_version": {"minimum": None, "recommended": None}}
+
+
+@app.route("/v3/<resource_type>")
+def list_resources(resource_type):
+    if resource_type not in data:
+        flask.abort(404, "Unknown request")
+    res = paginate(f"/v3/{resource_type}", filtered(resource_type, data[resource_type], flask.request.args), flask.request.args)
+    for include in flask.request.args.get("include", "").split(","):
+        if (resource_type, include) in INCLUDES:
+            included_type, included_guid = INCLUDES[(resource_type, include)]
+            guids = {included_guid(r) for r in res["resources"]} - {None}
+            res.setdefault("included", {})[included_type] = [external(index[included_type][guid]) for guid in sorted(guids)]
+    return res
+
+
+@app.route("/v3/<resource_type>/<guid>")
+def get_resource(resource_type, guid):
+    return external(find(resource_type, guid))
+
+
+@app.route("/v3/apps/<guid>/processes/web")
+def app_web_process(guid):
+    find("apps", guid)
+    return external(next(p for p in data["processes"] if app_guid_of(p) == guid and p["type"] == "web"))
+
+
+@app.route("/v3/apps/<guid>/processes/web/stats")
+def app_web_process_stats(guid):
+    v3_app = find("apps", guid)
+    process = next(p for p in data["processes"] if app_guid_of(p) == guid and p["type"] == "web")
+    state = "RUNNING" if v3_app["state"] == "STARTED" else "DOWN"
+    return {"resources": [{"type": "web", "index": i, "state": state, "uptime": 100} for i in range(process["instances"])]}
+
+
+@app.route("/v3/organizations/<guid>/domains")
+def organization_domains(guid):
+    find("organizations", guid)
+    domains = [
+        d
+        for d in data["domains"]
+        if not d["relationships"]["organization"]["data"] or d["relationships"]["organization"]["data"]["guid"] == guid
+    ]
+    return paginate(f"/v3/organizations/{guid}/domains", domains, flask.request.args)
+
+
+@app.route("/v3/apps/<guid>/<resource_type>")
+def app_resources(guid, resource_type):
+    find("apps", guid)
+    if resource_type not in data:
+        flask.abort(404, "Unknown request")
+    resources = [r for r in data[resource_type] if app_guid_of(r) == guid]
+    return paginate(f"/v3/apps/{guid}/{resource_type}", filtered(resource_type, resources, flask.request.args), flask.request.args)
+
+
+@app.route("/v3/apps/<guid>/droplets/current")
+def app_current_droplet(guid):
+    return external(find("droplets", find("apps", guid)["current_droplet"]))
+
+
+@app.route("/v3/apps/<guid>/environment_variables")
+def app_environment_variables(guid):
+    return find("apps", guid)["env"]
+
+
+@app.route("/v3/apps/<guid>/features/ssh")
+def app_feature_ssh(guid):
+    return {"name": "ssh", "description": "Enable SSHing into the app.", "enabled": find("apps", guid)["ssh"]}
+
+
+@app.route("/v3/spaces/<guid>/features/ssh")
+def space_feature_ssh(guid):
+    find("spaces", guid)
+    return {"name": "ssh", "description": "Enable SSHing into apps in the space.", "enabled": True}
+
+
+def delete_resources(resource_type: str, guid: str):
+    if resource_type == "spaces":
+        # v3 deletes spaces recursively
+        for v3_app in [a for a in data["apps"] if a["relationships"]["space"]["data"]["guid"] == guid]:
+            delete_resources("apps", v3_app["guid"])
+        for other_type in data:
+            data[other_type] = [r for r in data[other_type] if r.get("space_guid") != guid]
+    if resource_type == "apps":
+        for other_type in data:
+            data[other_type] = [r for r in data[other_type] if app_guid_of(r) != guid]
+    data[resource_type] = [r for r in data[resource_type] if r["guid"] != guid]
+    load(data)
+
+
+@app.route("/v3/<resource_type>/<guid>", methods=["DELETE"])
+def delete_resource(resource_type, guid):
+    if resource_type not in ["apps", "spaces"]:
+        flask.abort(404, "Unknown request")
+    find(resource_type, guid)
+    now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    job_guid = str(uuid.uuid4())
+    url = f"{flask.request.host_url.rstrip('/')}/v3/jobs/{job_guid}"
+    jobs[job_guid] = {
+        "guid": job_guid,
+        "operation": f"{resource_type[:-1]}.delete",
+        "state": "PROCESSING",
+        "created_at": now,
+        "updated_at": now,
+        "errors": [],
+        "warnings": [],
+        "links": {"self": {"href": url}},
+        "resource": (resource_type, guid),
+        "done_at": time.monotonic() + job_duration,
+    }
+    return flask.Response(status=202, headers={"Location": url})
+
+
+@app.route("/v3/jobs/<guid>")
+def get_job(guid):
+    job = jobs.get(guid)
+    if job is None:
+        flask.abort(404, "Job not found")
+    if job["state"] == "PROCESSING" and time.monotonic() >= job["done_at"]:
+        delete_resources(*job["resource"])
+        job["state"] = "COMPLETE"
+        job["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    return {k: v for (k, v) in job.items() if k not in ["resource", "done_at"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the CF v3 API")
+    parser.add_argument("--apps", type=int, default=10, help="number of apps (10..10000)")
+    parser.add_argument("--builds", type=int, default=3, help="packages, builds and droplets per app")
+    parser.add_argument("--latency", type=float, default=0.0, help="added latency per call in seconds")
+    parser.add_argument("--tail-latency", type=float, default=0.0, help="added latency of slow calls in seconds")
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="fraction of calls with --tail-latency (0..1)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of v3 calls failing with 503 (0..1)")
+    parser.add_argument("--job-duration", type=float, default=0.5, help="duration of v3 jobs (e.g. deletes) in seconds")
+    parser.add_argument("--rate-limit", type=int, default=0, help="v3 calls per user and rate limit window, 0: unlimited")
+    parser.add_argument("--rate-limit-window", type=float, default=60, help="rate limit window in seconds")
+    parser.add_argument("--port", type=int, default=9090)
+    args = parser.parse_args()
+
+    global latency, tail_latency, tail_rate, error_rate, job_duration, rate_limit, rate_limit_window
+    load(generate(args.apps, args.builds))
+    latency = args.latency
+    tail_latency = args.tail_latency
+    tail_rate = args.tail_rate
+    error_rate = args.error_rate
+    job_duration = args.job_duration
+    rate_limit = args.rate_limit
+    rate_limit_window = args.rate_limit_window
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    # keep-alive like the real CF API
+    werkzeug.serving.WSGIRequestHandler.protocol_version = "HTTP/1.1"
+    app.run("127.0.0.1", args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
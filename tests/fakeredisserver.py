@@ -0,0 +1,169 @@
+"""Local stand-in for Redis (RESP protocol) with the commands used by the shim's cache backend.
+
+Serves PING, AUTH, SELECT, GET, SET (EX, PX, NX, XX), DEL, EXISTS, PTTL, DBSIZE, FLUSHDB and FLUSHALL for offline
+end-to-end tests of several shim instances sharing one cache (CFG_CACHE_BACKEND_URL=redis://127.0.0.1:6379).
+
+    python tests/fakeredisserver.py --port 6379 [--password secret]
+"""
+
+import argparse
+import logging
+import socketserver
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Store:
+    """Keys of all databases with expiry (monotonic seconds, None = no expiry), expired keys are removed on access."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.dbs = {}  # db -> key -> (value, expires_at)
+        self.commands = 0
+
+    def db(self, index: int) -> dict:
+        return self.dbs.setdefault(index, {})
+
+    def lookup(self, db: dict, key: bytes) -> tuple:
+        entry = db.get(key)
+        if entry and entry[1] is not None and entry[1] <= time.monotonic():
+            del db[key]
+            return None
+        return entry
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.db_index = 0
+        self.authenticated = self.server.password is None
+        while True:
+            try:
+                args = self.read_command()
+            except (ConnectionError, ValueError):
+                return
+            if args is None:
+                return
+            self.wfile.write(self.execute(args))
+
+    def read_command(self) -> list:
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # inline command, e.g. from telnet
+            return line.split()
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def execute(self, args: list) -> bytes:
+        command = args[0].upper().decode()
+        store = self.server.store
+        if command == "AUTH":
+            if args[-1].decode() != self.server.password:
+                return error("WRONGPASS invalid username-password pair or user is disabled.")
+            self.authenticated = True
+            return simple("OK")
+        if not self.authenticated:
+            return error("NOAUTH Authentication required.")
+        with store.lock:
+            store.commands += 1
+            db = store.db(self.db_index)
+            if command == "PING":
+                return simple("PONG")
+            if command == "SELECT":
+                self.db_index = int(args[1])
+                return simple("OK")
+            if command == "GET":
+                entry = store.lookup(db, args[1])
+                return bulk(entry[0] if entry else None)
+            if command == "SET":
+                return self.set(store, db, args)
+            if command == "DEL":
+                return integer(sum(1 for key in args[1:] if store.lookup(db, key) and db.pop(key)))
+            if command == "EXISTS":
+                return integer(sum(1 for key in args[1:] if store.lookup(db, key)))
+            if command == "PTTL":
+                entry = store.lookup(db, args[1])
+                if not entry:
+                    return integer(-2)
+                return integer(-1 if entry[1] is None else int((entry[1] - time.monotonic()) * 1000))
+            if command == "DBSIZE":
+                return integer(sum(1 for key in list(db.keys()) if store.lookup(db, key)))
+            if command == "FLUSHDB":
+                db.clear()
+                return simple("OK")
+            if command == "FLUSHALL":
+                store.dbs.clear()
+                return simple("OK")
+        return error(f"ERR unknown command '{command}'")
+
+    def set(self, store: Store, db: dict, args: list) -> bytes:
+        key, value = args[1], args[2]
+        expires_at = None
+        options = [arg.upper() for arg in args[3:]]
+        for i, option in enumerate(options):
+            if option == b"EX":
+                expires_at = time.monotonic() + int(options[i + 1])
+            elif option == b"PX":
+                expires_at = time.monotonic() + int(options[i + 1]) / 1000
+        exists = store.lookup(db, key) is not None
+        if (b"NX" in options and exists) or (b"XX" in options and not exists):
+            return bulk(None)
+        db[key] = (value, expires_at)
+        return simple("OK")
+
+
+def simple(value: str) -> bytes:
+    return f"+{value}\r\n".encode()
+
+
+def error(message: str) -> bytes:
+    return f"-{message}\r\n".encode()
+
+
+def integer(value: int) -> bytes:
+    return f":{value}\r\n".encode()
+
+
+def bulk(value: bytes) -> bytes:
+    return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port: int = 0, password: str = None):
+        super().__init__(("127.0.0.1", port), RespHandler)
+        self.password = password
+        self.store = Store()
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self) -> "FakeRedisServer":
+        """Serves in a background thread, e.g. in tests (port 0 = any free port)."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for Redis")
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--password", default=None, help="password for AUTH, default: no auth")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = FakeRedisServer(args.port, args.password)
+    logger.info(f"Serving on 127.0.0.1:{server.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import gzip
+import http.server
+import os
+import threading
+import time
+import unittest
+from shim.aio import AsyncCFApiClient
+from shim.utils import stream_body
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        if self.path.startswith("/slow"):
+            time.sleep(0.2)
+        body = f'{{"path": "{self.path}", "authorization": "{self.headers.get("Authorization", "")}"}}'.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        if self.path.startswith("/gzip"):
+            body = gzip.compress(body + os.urandom(10000))
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Set-Cookie", "session=secret")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class AsyncCFApiClientTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def test_get(self):
+        client = AsyncCFApiClient()
+        self.addCleanup(client.close)
+        with client.session({"Authorization": "bearer a"}) as session:
+            res = session.get(f"{self.url}/v3/apps", params={"names": "a,b", "per_page": 10})
+            self.assertEqual(200, res.status_code)
+            self.assertEqual({"path": "/v3/apps?names=a%2Cb&per_page=10", "authorization": "bearer a"}, res.json())
+            self.assertEqual("application/json", res.headers["content-type"])
+            session.get(f"{self.url}/v3/info")
+        stats = client.stats()
+        self.assertEqual(2, stats["requests"])
+        self.assertEqual(1, stats["connections"])
+
+    def test_submit_parallel(self):
+        client = AsyncCFApiClient(pool_maxsize=50, concurrency=50)
+        self.addCleanup(client.close)
+        start = time.time()
+        with client.session({"Authorization": "bearer a"}) as session:
+            futures = [session.submit(f"{self.url}/slow/{i}") for i in range(50)]
+            results = [future.result().json()["path"] for future in futures]
+        self.assertLess(time.time() - start, 5)  # sequential: 10s
+        self.assertEqual([f"/slow/{i}" for i in range(50)], results)
+
+    def test_concurrency_limit(self):
+        client = AsyncCFApiClient(pool_maxsize=50, concurrency=2)
+        self.addCleanup(client.close)
+        start = time.time()
+        with client.session({}) as session:
+            futures = [session.submit(f"{self.url}/slow/{i}") for i in range(4)]
+            [future.result() for future in futures]
+        self.assertGreaterEqual(time.time() - start, 0.4)
+
+    def test_stream(self):
+        client = AsyncCFApiClient()
+        self.addCleanup(client.close)
+        res = client.request("GET", f"{self.url}/gzip", {}, stream=True)
+        self.assertEqual("gzip", res.headers["content-encoding"])
+        chunks = list(stream_body(res, chunk_size=1024))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(int(res.headers["content-length"]), len(b"".join(chunks)))
+        self.assertTrue(gzip.decompress(b"".join(chunks)).startswith(b'{"path": "/gzip"'))
+        # connection is reused after the body was read completely
+        client.request("GET", f"{self.url}/v3/info", {})
+        self.assertEqual(1, client.stats()["connections"])
@@ -72,6 +72,19 @@ class AppsTest(ShimTestCase):
         (v2_json, shim_json) = self.run_v2_shim_get(endpoint)
         self.assertDict(v2_json, self.tweak_apps_shim_json(v2_json, shim_json))
 
+    def test_v2_get_app_summary(self):
+        endpoint = f"/v2/apps/{AppsTest.app3_guid}/summary"
+        (v2_json, shim_json) = self.run_v2_shim_get(endpoint)
+        # v3 domains don't contain the router group type, v3 service offerings have no provider and version
+        for (v2_domain, shim_domain) in zip(v2_json["available_domains"], shim_json["available_domains"]):
+            if "router_group_type" in v2_domain:
+                shim_domain["router_group_type"] = v2_domain["router_group_type"]
+        for (v2_service, shim_service) in zip(v2_json["services"], shim_json["services"]):
+            if "service_plan" in v2_service:
+                shim_service["service_plan"]["service"]["provider"] = v2_service["service_plan"]["service"]["provider"]
+                shim_service["service_plan"]["service"]["version"] = v2_service["service_plan"]["service"]["version"]
+        self.assertDict(v2_json, shim_json)
+
     def tweak_apps_shim_json(self, v2_json, shim_json):
         for idx, app in enumerate(shim_json["resources"]):
             # TODO: v2 = specified command, v3 = process.specified_or_detected_command, v3 bug? droplet contains detected command
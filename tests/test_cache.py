@@ -0,0 +1,94 @@
+import time
+import unittest
+import requests
+from shim.cache import ResponseCache, auth_scope, decode_json, decode_response, encode_json, encode_response
+
+
+def response(content: bytes, status_code: int = 200) -> requests.Response:
+    res = requests.Response()
+    res.status_code = status_code
+    res._content = content
+    return res
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def test_auth_scope(self):
+        self.assertIsNone(auth_scope({"Accept": "application/json"}))
+        self.assertEqual(auth_scope({"Authorization": "bearer a"}), auth_scope({"authorization": "bearer a"}))
+        self.assertNotEqual(auth_scope({"Authorization": "bearer a"}), auth_scope({"Authorization": "bearer b"}))
+        self.assertNotIn("bearer", auth_scope({"Authorization": "bearer a"}))
+
+    def test_get_put(self):
+        cache = ResponseCache(ttl=10)
+        key_a = cache.key(auth_scope({"Authorization": "bearer a"}), "https://api.cf/v3/apps/1", {"include": "space"})
+        key_b = cache.key(auth_scope({"Authorization": "bearer b"}), "https://api.cf/v3/apps/1", {"include": "space"})
+        self.assertEqual(key_a, cache.key(auth_scope({"Authorization": "bearer a"}), "https://api.cf/v3/apps/1?include=space"))
+        self.assertIsNone(cache.get(key_a))
+        cache.put(key_a, response(b"{}"))
+        self.assertEqual(b"{}", cache.get(key_a).content)
+        # other users don't see cached responses
+        self.assertIsNone(cache.get(key_b))
+        # errors are not cached
+        cache.put(key_b, response(b"{}", 404))
+        self.assertIsNone(cache.get(key_b))
+        self.assertEqual({"entries": 1, "hits": 1, "misses": 3, "evictions": 0}, {k: v for k, v in cache.stats().items() if k != "bytes"})
+
+    def test_ttl(self):
+        cache = ResponseCache(ttl=0.1)
+        cache.put("k", response(b"{}"))
+        self.assertIsNotNone(cache.get("k"))
+        time.sleep(0.15)
+        self.assertIsNone(cache.get("k"))
+        self.assertEqual(0, cache.stats()["bytes"])
+
+    def test_lru_eviction(self):
+        # room for 3 entries
+        max_bytes = 3 * (len(encode_response(response(b"x" * 98))) + len("k1"))
+        cache = ResponseCache(ttl=10, max_bytes=max_bytes)
+        for key in ["k1", "k2", "k3"]:
+            cache.put(key, response(b"x" * 98))
+        cache.get("k1")
+        cache.put("k4", response(b"x" * 98))
+        self.assertIsNotNone(cache.get("k1"))
+        self.assertIsNone(cache.get("k2"))
+        self.assertEqual(1, cache.stats()["evictions"])
+        self.assertLessEqual(cache.stats()["bytes"], max_bytes)
+        # too large for the cache
+        cache.put("k5", response(b"x" * max_bytes))
+        self.assertIsNone(cache.get("k5"))
+
+    def test_serialization(self):
+        res = response(b'{"guid": "1"}')
+        res.headers["Content-Type"] = "application/json; charset=utf-8"
+        res.headers["X-Vcap-Request-Id"] = "abc::def"
+        decoded = decode_response(encode_response(res))
+        self.assertEqual(200, decoded.status_code)
+        self.assertEqual({"guid": "1"}, decoded.json())
+        self.assertEqual("abc::def", decoded.headers["x-vcap-request-id"])
+        self.assertEqual("utf-8", decoded.encoding)
+
+        # large responses are compressed for networked backends
+        res = response(b'{"resources": [%s]}' % b",".join(b'{"guid": "%d", "name": "app"}' % i for i in range(100)))
+        compressed = encode_response(res, compress=True)
+        self.assertLess(len(compressed), len(res.content) / 4)
+        self.assertEqual(res.content, decode_response(compressed).content)
+        self.assertEqual({"a": [1, None]}, decode_json(encode_json({"a": [1, None]})))
+
+    def test_invalidate(self):
+        cache = ResponseCache(ttl=10)
+        scope_a = auth_scope({"Authorization": "bearer a"})
+        scope_b = auth_scope({"Authorization": "bearer b"})
+        cache.put(cache.key(scope_a, "https://api.cf/v3/apps/1"), response(b"{}"))
+        cache.put(cache.key(scope_b, "https://api.cf/v3/apps/1"), response(b"{}"))
+        cache.invalidate(scope_a)
+        self.assertIsNone(cache.get(cache.key(scope_a, "https://api.cf/v3/apps/1")))
+        self.assertIsNotNone(cache.get(cache.key(scope_b, "https://api.cf/v3/apps/1")))
+
+    def test_shared_without_request_headers(self):
+        cache = ResponseCache(ttl=10)
+        res = response(b"{}")
+        res.headers.update({"Content-Type": "application/json", "X-Vcap-Request-Id": "abc", "X-RateLimit-Remaining": "9"})
+        cache.put("shared https://api.cf/v3/info", res, shared=True)
+        self.assertEqual({"Content-Type": "application/json"}, dict(cache.get("shared https://api.cf/v3/info").headers))
+        # the response of the caller is unchanged
+        self.assertEqual("abc", res.headers["X-Vcap-Request-Id"])
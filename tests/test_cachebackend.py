@@ -0,0 +1,97 @@
+import time
+import unittest
+import requests
+from fakeredisserver import FakeRedisServer
+from shim.cache import ResponseCache
+from shim.cachebackend import InProcessBackend, RespBackend, RespConnection, create_cache_backend
+
+
+class InProcessBackendTest(unittest.TestCase):
+    def test_get_set(self):
+        backend = InProcessBackend()
+        self.assertIsNone(backend.get("k"))
+        backend.set("k", b"v", 10)
+        self.assertEqual(b"v", backend.get("k"))
+        backend.delete("k")
+        self.assertIsNone(backend.get("k"))
+
+        backend.set("k", b"v", 0.1)
+        time.sleep(0.15)
+        self.assertIsNone(backend.get("k"))
+        self.assertEqual({"entries": 0, "bytes": 0, "evictions": 0}, backend.stats())
+
+
+class RespBackendTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeRedisServer(password="secret").start()
+        cls.url = f"redis://:secret@127.0.0.1:{cls.server.port}/1"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def test_get_set(self):
+        backend = RespBackend(self.url)
+        self.assertIsNone(backend.get("k"))
+        backend.set("k", b"\x00binary\r\n", 10)
+        backend.flush()
+        self.assertEqual(b"\x00binary\r\n", backend.get("k"))
+        # prefixed keys with ttl in db 1
+        connection = RespConnection("127.0.0.1", self.server.port, 1)
+        connection.execute("AUTH", "secret")
+        self.assertIsNone(connection.execute("GET", "shim:k"))
+        connection.execute("SELECT", 1)
+        self.assertGreater(connection.execute("PTTL", "shim:k"), 9000)
+        connection.close()
+
+        backend.delete("k")
+        self.assertIsNone(backend.get("k"))
+        backend.set("k", b"v", 0.1)
+        backend.flush()
+        time.sleep(0.15)
+        self.assertIsNone(backend.get("k"))
+        self.assertEqual(0, backend.stats()["errors"])
+
+    def test_shared_response_cache(self):
+        # two shim instances
+        cache_a = ResponseCache(ttl=10, backend=create_cache_backend(self.url, 0))
+        cache_b = ResponseCache(ttl=10, backend=create_cache_backend(self.url, 0))
+        res = requests.Response()
+        res.status_code = 200
+        res.headers["Content-Type"] = "application/json"
+        res._content = b'{"resources": [%s]}' % b",".join(b'{"guid": "%d"}' % i for i in range(200))
+        key = cache_a.key("scope", "https://api.cf/v3/apps", {"per_page": 5000})
+        cache_a.put(key, res)
+        cache_a.backend.flush()
+        self.assertEqual(res.json(), cache_b.get(key).json())
+        self.assertEqual({"hits": 1, "misses": 0}, {k: v for k, v in cache_b.stats().items() if k in ["hits", "misses"]})
+        # a write through instance a invalidates the responses of the user on all instances right away
+        cache_a.invalidate("scope")
+        self.assertNotEqual(key, cache_b.key("scope", "https://api.cf/v3/apps", {"per_page": 5000}))
+
+        # env vars are only cached in the process
+        key = cache_a.key("scope", "https://api.cf/v3/apps/a1/environment_variables")
+        cache_a.put(key, res)
+        cache_a.backend.flush()
+        self.assertEqual(res.content, cache_a.get(key).content)
+        self.assertIsNone(cache_b.get(key))
+        self.assertIsNone(cache_a.backend.get(key))
+
+    def test_unavailable(self):
+        server = FakeRedisServer()
+        server.server_close()
+        backend = RespBackend(f"redis://127.0.0.1:{server.port}", timeout=0.2)
+        # connection refused, later lookups and writes don't try to connect
+        start = time.perf_counter()
+        for _ in range(10):
+            self.assertIsNone(backend.get("k"))
+            backend.set("k", b"v", 10)
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual({"connections": 0, "pending_writes": 0, "dropped_writes": 0, "errors": 1}, backend.stats())
+
+    def test_wrong_password(self):
+        backend = RespBackend(f"redis://:wrong@127.0.0.1:{self.server.port}")
+        self.assertIsNone(backend.get("k"))
+        self.assertEqual(1, backend.stats()["errors"])
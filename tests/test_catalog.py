@@ -0,0 +1,122 @@
+import time
+import unittest
+from shim.cachebackend import InProcessBackend
+from shim.catalog import Catalog, CatalogList
+
+
+class FakeResponse:
+    def __init__(self, status_code, json):
+        self.status_code = status_code
+        self._json = json
+
+    def json(self):
+        return self._json
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+
+class FakeSession:
+    def __init__(self, resources):
+        self.resources = resources
+        self.status_code = 200
+        self.calls = 0
+        self.client = self
+        self.headers = {}
+        self.sessions = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def session(self, headers):
+        self.sessions += 1
+        return self
+
+    def get(self, url, params=None):
+        self.calls += 1
+        return FakeResponse(self.status_code, {"pagination": {"next": None}, "resources": list(self.resources)})
+
+
+STACKS = [
+    {"guid": "s1", "name": "cflinuxfs3", "default": False},
+    {"guid": "s2", "name": "cflinuxfs4", "default": True},
+]
+BUILDPACKS = [
+    {"guid": "b1", "name": "java_buildpack", "stack": "cflinuxfs3"},
+    {"guid": "b2", "name": "java_buildpack", "stack": "cflinuxfs4"},
+]
+
+
+class CatalogTest(unittest.TestCase):
+    def test_indexes(self):
+        catalog = Catalog("https://api.cf")
+        stacks = catalog.stacks.get(FakeSession(STACKS))
+        self.assertEqual("s2", stacks.by_name["cflinuxfs4"]["guid"])
+        self.assertEqual("cflinuxfs3", stacks.by_guid["s1"]["name"])
+        self.assertEqual("s2", stacks.default["guid"])
+        buildpacks = catalog.buildpacks.get(FakeSession(BUILDPACKS))
+        self.assertEqual("b1", buildpacks.by_name_and_stack[("java_buildpack", "cflinuxfs3")]["guid"])
+        self.assertIsNone(buildpacks.default)
+
+    def test_ttl(self):
+        catalog_list = CatalogList("https://api.cf/v3/stacks", ttl=0.2, max_size=10)
+        session = FakeSession(STACKS)
+        catalog_list.get(session)
+        catalog_list.get(session)
+        self.assertEqual(1, session.calls)
+        time.sleep(0.25)
+        catalog_list.get(session)
+        self.assertEqual(2, session.calls)
+
+    def test_background_refresh(self):
+        catalog_list = CatalogList("https://api.cf/v3/stacks", ttl=0.5, max_size=10)
+        session = FakeSession(STACKS)
+        catalog_list.get(session)
+        time.sleep(0.42)
+        session.resources = STACKS[:1]
+        # stale entry is returned, refresh runs in background
+        self.assertEqual(2, len(catalog_list.get(session).resources))
+        time.sleep(0.05)
+        self.assertEqual(2, session.calls)
+        self.assertEqual(1, session.sessions)
+        self.assertEqual(1, len(catalog_list.get(session).resources))
+
+    def test_max_size(self):
+        catalog_list = CatalogList("https://api.cf/v3/stacks", ttl=10, max_size=1)
+        session = FakeSession(STACKS)
+        self.assertEqual(2, len(catalog_list.get(session).resources))
+        catalog_list.get(session)
+        self.assertEqual(2, session.calls)
+
+    def test_stale_on_error(self):
+        catalog_list = CatalogList("https://api.cf/v3/stacks", ttl=0.1, max_size=10)
+        session = FakeSession(STACKS)
+        catalog_list.get(session)
+        time.sleep(0.15)
+        session.status_code = 503
+        self.assertEqual(2, len(catalog_list.get(session).resources))
+
+        with self.assertRaises(RuntimeError):
+            CatalogList("https://api.cf/v3/stacks", ttl=0.1, max_size=10).get(session)
+
+    def test_shared_backend(self):
+        # lists of two shim instances
+        backend = InProcessBackend()
+        catalog_list_a = CatalogList("https://api.cf/v3/stacks", ttl=0.5, max_size=10, backend=backend)
+        catalog_list_b = CatalogList("https://api.cf/v3/stacks", ttl=0.5, max_size=10, backend=backend)
+        session = FakeSession(STACKS)
+        catalog_list_a.get(session)
+        self.assertEqual("s2", catalog_list_b.get(session).by_name["cflinuxfs4"]["guid"])
+        self.assertEqual(1, session.calls)
+
+        # shared list is due for refresh, loaded from the CF API
+        time.sleep(0.42)
+        self.assertEqual(2, len(CatalogList("https://api.cf/v3/stacks", ttl=0.5, max_size=10, backend=backend).get(session).resources))
+        self.assertEqual(2, session.calls)
+
+        catalog_list_a.invalidate()
+        self.assertIsNone(backend.get("catalog https://api.cf/v3/stacks"))
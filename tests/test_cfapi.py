@@ -0,0 +1,125 @@
+import gzip
+import http.server
+import os
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from shim.cache import ResponseCache
+from shim.cfapi import CFApiClient
+from shim.utils import forward_request_headers, stream_body
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        body = self.headers.get("Authorization", "").encode()
+        self.send_response(200)
+        if self.path.startswith("/gzip") or (self.path.startswith("/negotiate") and "gzip" in self.headers.get("Accept-Encoding", "")):
+            body = gzip.compress(body + os.urandom(10000))
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Set-Cookie", "session=secret")
+        if self.path.startswith("/close"):
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_DELETE(self):
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CFApiClientTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def test_connection_reuse(self):
+        client = CFApiClient(pool_maxsize=2)
+        for i in range(5):
+            with client.session({"Authorization": f"bearer {i}"}) as session:
+                res = session.get(f"{self.url}/v3/info")
+                self.assertEqual(f"bearer {i}", res.text)
+        stats = client.stats()
+        self.assertEqual(1, stats["connections"])
+        self.assertEqual(5, stats["requests"])
+        self.assertEqual(4, stats["reused_connections"])
+
+    def test_reconnects_counted(self):
+        client = CFApiClient()
+        for i in range(3):
+            client.session({}).get(f"{self.url}/close/{i}")
+        stats = client.stats()
+        self.assertEqual(3, stats["connections"])
+        self.assertEqual(0, stats["reused_connections"])
+
+    def test_parallel_requests(self):
+        client = CFApiClient(pool_maxsize=4, pool_block=True)
+        session = client.session({"Authorization": "bearer x"})
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda i: session.get(f"{self.url}/v3/apps/{i}").text, range(40)))
+        self.assertEqual(["bearer x"] * 40, results)
+        self.assertLessEqual(client.stats()["connections"], 4)
+
+    def test_no_cookies_shared(self):
+        client = CFApiClient()
+        client.session({}).get(f"{self.url}/")
+        self.assertEqual(0, len(client._session().cookies))
+
+    def test_stream(self):
+        client = CFApiClient()
+        res = client.request("GET", f"{self.url}/gzip", {"Authorization": "bearer s"}, stream=True)
+        self.assertEqual("gzip", res.headers["content-encoding"])
+        chunks = list(stream_body(res, chunk_size=1024))
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(gzip.decompress(b"".join(chunks)).startswith(b"bearer s"))
+        # connection is reused after the body was read completely
+        client.request("GET", f"{self.url}/v3/info", {})
+        self.assertEqual(1, client.stats()["connections"])
+
+    def test_forward_accept_encoding(self):
+        client = CFApiClient()
+        # client without Accept-Encoding gets the body unencoded, not with the default encodings of the HTTP client
+        res = client.request("GET", f"{self.url}/negotiate", forward_request_headers([("Authorization", "bearer s")]), stream=True)
+        self.assertNotIn("content-encoding", res.headers)
+        self.assertEqual(b"bearer s", b"".join(stream_body(res)))
+        # client's Accept-Encoding as is
+        headers = forward_request_headers([("Authorization", "bearer s"), ("Accept-Encoding", "gzip")])
+        res = client.request("GET", f"{self.url}/negotiate", headers, stream=True)
+        self.assertEqual("gzip", res.headers["content-encoding"])
+        self.assertTrue(gzip.decompress(b"".join(stream_body(res))).startswith(b"bearer s"))
+
+    def test_cache_scopes(self):
+        client = CFApiClient(cache=ResponseCache(ttl=10))
+        with client.session({"Authorization": "bearer a"}) as session:
+            self.assertEqual("bearer a", session.get(f"{self.url}/v3/apps/1", cached=True).text)
+            self.assertEqual("bearer a", session.submit(f"{self.url}/v3/spaces/1/features/ssh", cached=True, shared=True).result().text)
+        with client.session({"Authorization": "bearer b"}) as session:
+            # per user
+            self.assertEqual("bearer b", session.get(f"{self.url}/v3/apps/1", cached=True).text)
+            # shared by all users
+            self.assertEqual("bearer a", session.get(f"{self.url}/v3/spaces/1/features/ssh", cached=True, shared=True).text)
+        # not for anonymous requests
+        self.assertEqual("", client.session({}).get(f"{self.url}/v3/spaces/1/features/ssh", cached=True, shared=True).text)
+        self.assertEqual(1, client.cache.stats()["hits"])
+
+    def test_cache_invalidated_by_writes(self):
+        client = CFApiClient(cache=ResponseCache(ttl=10))
+        for user in ["a", "b"]:
+            client.session({"Authorization": f"bearer {user}"}).get(f"{self.url}/v3/apps/1", cached=True)
+        self.assertEqual(204, client.request("DELETE", f"{self.url}/v3/apps/1", {"Authorization": "bearer a"}).status_code)
+        # read your writes: the next GET of the user goes to the CF API, other users are not affected
+        client.session({"Authorization": "bearer a"}).get(f"{self.url}/v3/apps/1", cached=True)
+        self.assertEqual(0, client.cache.stats()["hits"])
+        client.session({"Authorization": "bearer b"}).get(f"{self.url}/v3/apps/1", cached=True)
+        self.assertEqual(1, client.cache.stats()["hits"])
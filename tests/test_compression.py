@@ -0,0 +1,86 @@
+import gzip
+import json
+import unittest
+import zlib
+import flask
+from shim.compression import AVAILABLE_ENCODINGS, compress_response, negotiate
+
+BODY = json.dumps({"resources": [{"metadata": {"guid": str(i)}, "entity": {"name": f"app{i}"}} for i in range(100)]}).encode()
+
+
+class CompressionTest(unittest.TestCase):
+    def test_negotiate(self):
+        encodings = ["br", "gzip"]
+        self.assertEqual("gzip", negotiate("gzip, deflate", encodings))
+        self.assertEqual("br", negotiate("gzip, deflate, br", encodings))
+        self.assertEqual("gzip", negotiate("br;q=0.5, gzip", encodings))
+        self.assertEqual("br", negotiate("*", encodings))
+        self.assertIsNone(negotiate("gzip;q=0", encodings))
+        self.assertIsNone(negotiate("identity", encodings))
+        self.assertIsNone(negotiate("", encodings))
+        self.assertEqual("gzip", negotiate("GZIP ; q=0.8, zstd", encodings))
+
+    def test_compress(self):
+        res = compress_response(flask.Response(BODY, mimetype="application/json", headers={"ETag": '"1"'}), "gzip", 1024, 6, ["gzip"])
+        self.assertEqual("gzip", res.headers["Content-Encoding"])
+        self.assertEqual("Accept-Encoding", res.headers["Vary"])
+        self.assertEqual(str(len(res.get_data())), res.headers["Content-Length"])
+        self.assertLess(len(res.get_data()), len(BODY) / 4)
+        self.assertEqual(BODY, gzip.decompress(res.get_data()))
+        self.assertEqual('W/"1"', res.headers["ETag"])
+
+    def test_not_compressed(self):
+        # below threshold
+        res = compress_response(flask.Response(b'{"a": 1}', mimetype="application/json"), "gzip", 1024, 6, ["gzip"])
+        self.assertNotIn("Content-Encoding", res.headers)
+        self.assertEqual("Accept-Encoding", res.headers["Vary"])
+        # not accepted
+        res = compress_response(flask.Response(BODY, mimetype="application/json"), "identity", 1024, 6, ["gzip"])
+        self.assertEqual(BODY, res.get_data())
+        # already encoded, e.g. proxied v3 response
+        res = flask.Response(b"gzipped", mimetype="application/json", headers={"Content-Encoding": "gzip"})
+        self.assertEqual(b"gzipped", compress_response(res, "br, gzip", 0, 6, ["gzip"]).get_data())
+        # binary
+        res = compress_response(flask.Response(BODY, mimetype="application/octet-stream"), "gzip", 0, 6, ["gzip"])
+        self.assertNotIn("Content-Encoding", res.headers)
+        res = compress_response(flask.Response(status=204), "gzip", 0, 6, ["gzip"])
+        self.assertNotIn("Content-Encoding", res.headers)
+
+    def test_streamed(self):
+        closed = []
+
+        def chunks():
+            try:
+                for i in range(0, len(BODY), 1000):
+                    yield BODY[i : i + 1000]
+            finally:
+                closed.append(True)
+
+        res = compress_response(flask.Response(chunks(), mimetype="application/json"), "gzip", 1024, 1, ["gzip"])
+        self.assertTrue(res.is_streamed)
+        self.assertEqual("gzip", res.headers["Content-Encoding"])
+        self.assertNotIn("Content-Length", res.headers)
+        # every chunk can be decoded as soon as it is received
+        decompressor = zlib.decompressobj(31)
+        first = next(iter(res.response))
+        self.assertEqual(BODY[:1000], decompressor.decompress(first))
+        body = first + b"".join(res.response)
+        self.assertEqual(BODY, gzip.decompress(body))
+        res.close()
+        self.assertEqual([True], closed)
+
+    @unittest.skipUnless("br" in AVAILABLE_ENCODINGS, "brotli not installed")
+    def test_brotli(self):
+        import brotli
+
+        res = compress_response(flask.Response(BODY, mimetype="application/json"), "gzip, br", 1024, 4, AVAILABLE_ENCODINGS)
+        self.assertEqual("br", res.headers["Content-Encoding"])
+        self.assertEqual(BODY, brotli.decompress(res.get_data()))
+
+    @unittest.skipUnless("zstd" in AVAILABLE_ENCODINGS, "zstandard not installed")
+    def test_zstd(self):
+        import zstandard
+
+        res = compress_response(flask.Response(BODY, mimetype="application/json"), "zstd", 1024, 3, AVAILABLE_ENCODINGS)
+        self.assertEqual("zstd", res.headers["Content-Encoding"])
+        self.assertEqual(BODY, zstandard.ZstdDecompressor().decompressobj().decompress(res.get_data()))
@@ -0,0 +1,100 @@
+import unittest
+import fakecfapi
+
+
+class FakeCFApiTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        fakecfapi.load(fakecfapi.generate(120, 2))
+        cls.client = fakecfapi.app.test_client()
+
+    def test_generate(self):
+        data = fakecfapi.generate(120, 2)
+        self.assertEqual(data, fakecfapi.generate(120, 2))  # deterministic
+        self.assertEqual(120, len(data["apps"]))
+        self.assertEqual(2, len(data["spaces"]))
+        self.assertEqual(240, len(data["builds"]))
+
+    def test_list_pagination(self):
+        res = self.client.get("/v3/apps?per_page=50&page=2&order_by=-name").json
+        self.assertEqual(120, res["pagination"]["total_results"])
+        self.assertEqual(3, res["pagination"]["total_pages"])
+        self.assertEqual("http://localhost/v3/apps?order_by=-name&page=3&per_page=50", res["pagination"]["next"]["href"])
+        self.assertEqual("app00069", res["resources"][0]["name"])
+        self.assertNotIn("env", res["resources"][0])
+
+    def test_list_filter(self):
+        apps = self.client.get("/v3/apps?per_page=2").json["resources"]
+        app_guids = ",".join(app["guid"] for app in apps)
+        res = self.client.get(f"/v3/builds?app_guids={app_guids}&order_by=-created_at").json
+        self.assertEqual(4, res["pagination"]["total_results"])
+        self.assertEqual(apps[1]["guid"], res["resources"][0]["relationships"]["app"]["data"]["guid"])
+
+    def test_app_resources(self):
+        app_guid = self.client.get("/v3/apps?per_page=1").json["resources"][0]["guid"]
+        self.assertEqual(2, self.client.get(f"/v3/apps/{app_guid}/droplets").json["pagination"]["total_results"])
+        self.assertEqual("STAGED", self.client.get(f"/v3/apps/{app_guid}/droplets/current").json["state"])
+        self.assertEqual({"var": {"K": "v0"}}, self.client.get(f"/v3/apps/{app_guid}/environment_variables").json)
+        self.assertEqual(404, self.client.get("/v3/apps/unknown").status_code)
+
+    def test_errors(self):
+        # json errors like the CF API
+        res = self.client.get("/v3/apps/unknown")
+        self.assertEqual({"errors": [{"code": 10010, "title": "CF-ResourceNotFound", "detail": "App not found"}]}, res.json)
+        self.assertEqual(10010, self.client.get("/v3/apps/unknown/environment_variables").json["errors"][0]["code"])
+        self.assertEqual(10010, self.client.get("/v3/jobs/unknown").json["errors"][0]["code"])
+        self.assertEqual(10010, self.client.get("/v3/unknown").json["errors"][0]["code"])
+        res = self.client.get("/v3/apps?per_page=0")
+        self.assertEqual(400, res.status_code)
+        self.assertEqual("CF-BadQueryParameter", res.json["errors"][0]["title"])
+        res = self.client.post("/v3/apps")
+        self.assertEqual(405, res.status_code)
+        self.assertEqual("CF-UnknownError", res.json["errors"][0]["title"])
+
+    def test_delete_job(self):
+        fakecfapi.load(fakecfapi.generate(10, 2))
+        fakecfapi.job_duration = 0
+        try:
+            app_guid = self.client.get("/v3/apps?per_page=1").json["resources"][0]["guid"]
+            res = self.client.delete(f"/v3/apps/{app_guid}")
+            self.assertEqual(202, res.status_code)
+            job = self.client.get(res.headers["Location"]).json
+            self.assertEqual("COMPLETE", job["state"])
+            self.assertEqual("app.delete", job["operation"])
+            self.assertEqual(404, self.client.get(f"/v3/apps/{app_guid}").status_code)
+            self.assertEqual(9, self.client.get("/v3/processes").json["pagination"]["total_results"])
+        finally:
+            fakecfapi.job_duration = 0.5
+            fakecfapi.load(fakecfapi.generate(120, 2))
+
+    def test_rate_limit(self):
+        fakecfapi.rate_limit = 2
+        try:
+            headers = {"Authorization": "bearer rl"}
+            res = self.client.get("/v3/info", headers=headers)
+            self.assertEqual("2", res.headers["X-RateLimit-Limit"])
+            self.assertEqual("1", res.headers["X-RateLimit-Remaining"])
+            self.assertEqual(200, self.client.get("/v3/info", headers=headers).status_code)
+            res = self.client.get("/v3/info", headers=headers)
+            self.assertEqual(429, res.status_code)
+            self.assertEqual("0", res.headers["X-RateLimit-Remaining"])
+            # per user
+            self.assertEqual(200, self.client.get("/v3/info", headers={"Authorization": "bearer other"}).status_code)
+        finally:
+            fakecfapi.rate_limit = 0
+            fakecfapi.rate_limit_budgets.clear()
+
+    def test_error_rate(self):
+        fakecfapi.error_rate = 1.0
+        try:
+            self.assertEqual(503, self.client.get("/v3/info").status_code)
+            self.assertEqual(200, self.client.get("/_stats").status_code)
+        finally:
+            fakecfapi.error_rate = 0.0
+        self.assertEqual(200, self.client.get("/v3/info").status_code)
+
+    def test_stats(self):
+        self.client.delete("/_stats")
+        self.client.get("/v3/info")
+        self.client.get("/v3/apps?per_page=1")
+        self.assertEqual({"info": 1, "apps": 1, "_total": 2}, self.client.get("/_stats").json)
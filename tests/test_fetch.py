@@ -0,0 +1,188 @@
+import json
+import time
+import unittest
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+import shim.fetch as fetch
+from shim.projection import BuildRecord
+
+
+class FakeResponse:
+    def __init__(self, status_code, json):
+        self.status_code = status_code
+        self._json = json
+
+    def json(self):
+        return self._json
+
+    @property
+    def content(self):
+        return json.dumps(self._json).encode()
+
+    def iter_content(self, chunk_size=1):
+        content = self.content
+        return (content[i : i + chunk_size] for i in range(0, len(content), chunk_size))
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise ConnectionError(self.status_code)
+
+
+class FakeSession:
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=4)
+
+    def get(self, url, timeout=None, cached=False):
+        if url.startswith("slow"):
+            time.sleep(0.5)
+        if url.startswith("fail"):
+            raise ConnectionError(url)
+        if url.startswith("notfound"):
+            return FakeResponse(404, {"errors": []})
+        return FakeResponse(200, {"url": url})
+
+    def submit(self, url, timeout=None, cached=False, shared=False):
+        return self.executor.submit(self.get, url, timeout, cached)
+
+
+class FakeListSession:
+    """v3 list endpoint filtered by the 'guids' param, returns pages of 2 resources."""
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.urls = []
+
+    def get(self, url, params=None):
+        self.urls.append(url)
+        query = {**urllib.parse.parse_qs(urllib.parse.urlparse(url).query), **{k: [v] for (k, v) in (params or {}).items()}}
+        guids = query["guids"][0].split(",")
+        page = int(query.get("page", ["1"])[0])
+        resources = [{"guid": guid} for guid in guids[(page - 1) * 2 : page * 2]]
+        next = {"href": f"http://cf/v3/apps?guids={query['guids'][0]}&page={page + 1}"} if page * 2 < len(guids) else None
+        res_json = {"pagination": {"next": next}, "resources": resources}
+        if "include" in query:
+            # 2 apps per space
+            res_json["included"] = {"spaces": [{"guid": f"s{int(r['guid'][1:]) // 2}"} for r in resources]}
+        return FakeResponse(200, res_json)
+
+    def submit(self, url, params=None):
+        return self.executor.submit(self.get, url, params)
+
+
+class FakeBuildsSession(FakeListSession):
+    """v3 builds endpoint, app a<n> has n builds, newest first."""
+
+    def __init__(self):
+        super().__init__()
+        self.builds = [{"app": f"a{n}", "created_at": f"{n}-{b}"} for n in range(5) for b in range(n)]
+
+    def get(self, url, params=None):
+        self.urls.append(f"{url}?{urllib.parse.urlencode(params)}" if params else url)
+        query = {**urllib.parse.parse_qs(urllib.parse.urlparse(url).query), **{k: [str(v)] for (k, v) in (params or {}).items()}}
+        app_guids = query["app_guids"][0].split(",")
+        per_page = int(query["per_page"][0])
+        page = int(query.get("page", ["1"])[0])
+        builds = sorted([b for b in self.builds if b["app"] in app_guids], key=lambda b: b["created_at"], reverse=True)
+        next = {"href": f"http://cf/v3/builds?app_guids={query['app_guids'][0]}&page={page + 1}"} if page * per_page < len(builds) else None
+        return FakeResponse(200, {"pagination": {"next": next}, "resources": builds[(page - 1) * per_page : page * per_page]})
+
+
+class FetchTest(unittest.TestCase):
+    def test_fetch_json_all(self):
+        urls = [f"u{i}" for i in range(20)]
+        results = fetch.fetch_json_all(FakeSession(), urls, 5)
+        self.assertEqual([{"url": url} for url in urls], results)
+
+        self.assertEqual([], fetch.fetch_json_all(FakeSession(), [], 5))
+
+    def test_fetch_json_all_errors(self):
+        results = fetch.fetch_json_all(FakeSession(), ["u1", "fail", "notfound", "u2"], 5)
+        self.assertEqual([{"url": "u1"}, None, None, {"url": "u2"}], results)
+
+    def test_fetch_json_all_deadline(self):
+        start = time.time()
+        results = fetch.fetch_json_all(FakeSession(), ["u1", "slow", "u2"], 0.1)
+        self.assertLess(time.time() - start, 0.4)
+        self.assertEqual([{"url": "u1"}, None, {"url": "u2"}], results)
+
+    def test_guid_chunks(self):
+        guids = [f"{i:036d}" for i in range(10)]
+        self.assertEqual([guids], fetch.guid_chunks("http://cf/v3/apps", {"per_page": 5000}, "guids", guids))
+        # 'http://cf/v3/apps?per_page=5000&guids=' = 38 chars, guid = 36 chars + 3 chars separator
+        chunks = fetch.guid_chunks("http://cf/v3/apps", {"per_page": 5000}, "guids", guids, max_url_length=38 + 36 + 39)
+        self.assertEqual([guids[0:2], guids[2:4], guids[4:6], guids[6:8], guids[8:10]], chunks)
+        self.assertEqual([[guid] for guid in guids], fetch.guid_chunks("http://cf/v3/apps", {}, "guids", guids, max_url_length=10))
+        self.assertEqual([], fetch.guid_chunks("http://cf/v3/apps", {}, "guids", []))
+
+    def test_chunked_fetch(self):
+        session = FakeListSession()
+        guids = [f"a{i}" for i in range(7)]
+        chunked_fetch = fetch.ChunkedFetch(
+            session, "http://cf/v3/apps", "guids", guids, max_url_length=len("http://cf/v3/apps?guids=a1%2Ca2%2Ca3")
+        )
+        self.assertEqual([{"guid": guid} for guid in guids], chunked_fetch.result())
+        self.assertEqual({guid: {"guid": guid} for guid in guids}, chunked_fetch.result_by(lambda r: r["guid"]))
+        # 3 chunks, the chunks with 3 guids have 2 pages
+        self.assertEqual(5, len(session.urls))
+
+        session = FakeListSession()
+        self.assertEqual([], fetch.ChunkedFetch(session, "http://cf/v3/apps", "guids", []).result())
+        self.assertEqual([], session.urls)
+
+    def test_chunked_fetch_included(self):
+        session = FakeListSession()
+        guids = [f"a{i}" for i in range(7)]
+        chunked_fetch = fetch.ChunkedFetch(
+            session,
+            "http://cf/v3/apps",
+            "guids",
+            guids,
+            {"include": "space"},
+            max_url_length=len("http://cf/v3/apps?include=space&guids=a1%2Ca2"),
+        )
+        self.assertEqual(7, len(chunked_fetch.result()))
+        self.assertEqual({"spaces": {f"s{i}": {"guid": f"s{i}"} for i in range(4)}}, chunked_fetch.included)
+
+    def test_latest_chunked_fetch(self):
+        session = FakeBuildsSession()
+        latest_fetch = fetch.LatestChunkedFetch(
+            session, "http://cf/v3/builds", "app_guids", [f"a{n}" for n in range(5)], lambda b: b["app"]
+        )
+        self.assertEqual(
+            {"a1": {"app": "a1", "created_at": "1-0"}, "a2": {"app": "a2", "created_at": "2-1"}, "a4": {"app": "a4", "created_at": "4-3"}},
+            {k: v for (k, v) in latest_fetch.result_by(lambda b: b["app"]).items() if k in ["a1", "a2", "a4"]},
+        )
+        self.assertEqual(4, len(latest_fetch.result()))
+        self.assertEqual(1, len(session.urls))
+        self.assertIn("order_by=-created_at", session.urls[0])
+
+        # small pages: next request only for apps without a build so far
+        session.urls = []
+        session.builds = [{"app": "a0", "created_at": f"2-{b:02d}"} for b in range(60)] + [{"app": "a1", "created_at": "1"}]
+        latest_fetch = fetch.LatestChunkedFetch(session, "http://cf/v3/builds", "app_guids", ["a0", "a1"], lambda b: b["app"])
+        self.assertEqual(
+            {"a0": {"app": "a0", "created_at": "2-59"}, "a1": {"app": "a1", "created_at": "1"}}, latest_fetch.result_by(lambda b: b["app"])
+        )
+        self.assertEqual(2, len(session.urls))
+        self.assertIn("app_guids=a1", session.urls[1])
+
+    def test_projected_fetch(self):
+        session = FakeBuildsSession()
+        session.builds = [
+            {"guid": f"b{n}-{b}", "app": f"a{n}", "created_at": f"{n}-{b}", "relationships": {"app": {"data": {"guid": f"a{n}"}}}}
+            for n in range(5)
+            for b in range(n)
+        ]
+        latest_fetch = fetch.LatestChunkedFetch(
+            session,
+            "http://cf/v3/builds",
+            "app_guids",
+            [f"a{n}" for n in range(5)],
+            lambda b: b["relationships"]["app"]["data"]["guid"],
+            record=BuildRecord,
+        )
+        builds = latest_fetch.result_by(lambda b: b["relationships"]["app"]["data"]["guid"])
+        self.assertEqual({"a1": "b1-0", "a2": "b2-1", "a3": "b3-2", "a4": "b4-3"}, {k: v["guid"] for (k, v) in builds.items()})
+        self.assertIsInstance(builds["a1"], BuildRecord)
+        # only the newest build per app is kept while reading the pages
+        self.assertEqual(4, sum(len(page) for chunk_pages in latest_fetch.pages for page in chunk_pages))
@@ -0,0 +1,93 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from shim.jobpoller import JobPoller
+
+
+class FakeResponse:
+    def __init__(self, status_code, json):
+        self.status_code = status_code
+        self._json = json
+
+    def json(self):
+        return self._json
+
+
+class FakeClient:
+    """GET <url> returns a job that completes after the number of polls in the url (.../jobs/<polls>/<name>)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.polls = {}
+        self.threads = set()
+
+    def request(self, method: str, url: str, headers: dict):
+        with self.lock:
+            self.polls[url] = self.polls.get(url, 0) + 1
+            self.threads.add(threading.current_thread().name)
+            polls = self.polls[url]
+        if "fail" in url:
+            raise ConnectionError(url)
+        if "missing" in url:
+            return FakeResponse(404, {"errors": []})
+        state = "COMPLETE" if polls >= int(url.split("/")[-2]) else "PROCESSING"
+        return FakeResponse(200, {"guid": url, "state": state})
+
+
+class JobPollerTest(unittest.TestCase):
+    def test_wait(self):
+        client = FakeClient()
+        poller = JobPoller(client, min_interval=0.01, max_interval=0.05)
+        res = poller.wait("/jobs/3/a", {"Authorization": "bearer a"}, 5)
+        self.assertEqual("COMPLETE", res.json()["state"])
+        self.assertEqual(3, client.polls["/jobs/3/a"])
+        self.assertEqual({"jobs": 0, "polls": 3, "completed": 1, "waiting": 0, "not_waited": 0}, poller.stats())
+
+    def test_many_waiting_requests(self):
+        client = FakeClient()
+        poller = JobPoller(client, min_interval=0.01, max_interval=0.05, concurrency=4)
+        with ThreadPoolExecutor(max_workers=80) as executor:
+            # 40 jobs, every job is waited for by 2 requests of the same user
+            results = list(executor.map(lambda i: poller.wait(f"/jobs/{2 + i // 2 % 3}/{i // 2}", {"Authorization": "a"}, 5), range(80)))
+        self.assertTrue(all(res.json()["state"] == "COMPLETE" for res in results))
+        # one poll loop for all jobs, polled once per job, not once per waiting request
+        self.assertEqual(40, len(client.polls))
+        self.assertEqual(sum(2 + i % 3 for i in range(40)), sum(client.polls.values()))
+        self.assertLessEqual(len(client.threads), 4)
+
+    def test_backoff(self):
+        client = FakeClient()
+        poller = JobPoller(client, min_interval=0.01, max_interval=0.2, backoff=2)
+        start = time.perf_counter()
+        poller.wait("/jobs/5/a", {}, 5)
+        # 0.01 + 0.02 + 0.04 + 0.08 + 0.16
+        self.assertGreater(time.perf_counter() - start, 0.3)
+
+        start = time.perf_counter()
+        poller.wait("/jobs/6/b", {}, 0.1)
+        self.assertLess(time.perf_counter() - start, 0.2)
+        # nobody waits anymore, polling stops
+        time.sleep(0.5)
+        self.assertEqual(0, poller.stats()["jobs"])
+        self.assertLess(client.polls["/jobs/6/b"], 6)
+
+    def test_errors(self):
+        poller = JobPoller(FakeClient(), min_interval=0.01)
+        self.assertEqual(404, poller.wait("/jobs/1/missing", {}, 5).status_code)
+        with self.assertRaises(ConnectionError):
+            poller.wait("/jobs/1/fail", {}, 5)
+
+    def test_max_waiting(self):
+        client = FakeClient()
+        poller = JobPoller(client, min_interval=0.05, max_interval=0.05, max_waiting=2)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(poller.wait, f"/jobs/4/{i}", {}, 5) for i in range(2)]
+            time.sleep(0.05)
+            # further requests don't wait (and block a thread)
+            start = time.perf_counter()
+            self.assertIsNone(poller.wait("/jobs/4/2", {}, 5))
+            self.assertLess(time.perf_counter() - start, 0.05)
+            self.assertTrue(all(future.result().json()["state"] == "COMPLETE" for future in futures))
+        self.assertEqual({"waiting": 0, "not_waited": 1}, {k: v for (k, v) in poller.stats().items() if k in ["waiting", "not_waited"]})
+        self.assertIsNotNone(poller.wait("/jobs/1/3", {}, 5))
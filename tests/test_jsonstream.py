@@ -0,0 +1,50 @@
+import json
+import unittest
+from unittest import mock
+import flask
+import shim.jsonstream as jsonstream
+
+
+class JsonStreamTest(unittest.TestCase):
+    pagination = {"total_results": 3, "total_pages": 1, "prev_url": None, "next_url": None}
+
+    def test_dumps(self):
+        obj = {"b": [1, None, True], "a": "ä"}
+        self.assertEqual(obj, json.loads(jsonstream.dumps(obj)))
+        self.assertTrue(jsonstream.dumps(obj).startswith(b'{"a":'))
+        with mock.patch.object(jsonstream, "orjson", None):
+            self.assertEqual(b'{"a":"\\u00e4","b":[1,null,true]}', jsonstream.dumps(obj))
+
+    def test_v2_list_body(self):
+        resources = [{"metadata": {"guid": f"g{i}"}, "entity": {"name": "x" * 200}} for i in range(3)]
+        chunks = list(jsonstream.v2_list_body(self.pagination, iter(resources), chunk_size=150))
+        self.assertEqual({**self.pagination, "resources": resources}, json.loads(b"".join(chunks)))
+        # first chunk after the first resource, then one per resource (> chunk_size) and the end
+        self.assertEqual(4, len(chunks))
+
+        chunks = list(jsonstream.v2_list_body(self.pagination, iter(resources)))
+        self.assertEqual(2, len(chunks))
+
+    def test_v2_list_body_empty(self):
+        body = b"".join(jsonstream.v2_list_body({**self.pagination, "total_results": 0}, iter([])))
+        self.assertEqual({**self.pagination, "total_results": 0, "resources": []}, json.loads(body))
+        self.assertEqual({"resources": []}, json.loads(b"".join(jsonstream.v2_list_body({}, iter([])))))
+
+    def test_v2_list_body_error(self):
+        def resources():
+            yield {"metadata": {"guid": "g1"}}
+            raise KeyError("entity")
+
+        chunks = jsonstream.v2_list_body(self.pagination, resources())
+        self.assertTrue(next(chunks).endswith(b'"resources":[{"metadata":{"guid":"g1"}}'))
+        with self.assertLogs(jsonstream.logger, "ERROR"), self.assertRaises(KeyError):
+            next(chunks)
+
+    def test_v2_list_response_error(self):
+        def resources():
+            raise KeyError("entity")
+            yield
+
+        # first resource fails: before the response is started
+        with flask.Flask(__name__).test_request_context(), self.assertRaises(KeyError):
+            jsonstream.v2_list_response(self.pagination, resources())
@@ -0,0 +1,46 @@
+import random
+import time
+import unittest
+from shim.localquery import LocalQuery
+
+
+def space(i: int, org: str = "o1") -> dict:
+    return {
+        "guid": f"g{i:05d}",
+        "name": f"s{i % 7}",
+        "created_at": f"2024-01-01T00:00:{i % 60:02d}Z",
+        "relationships": {"organization": {"data": {"guid": org}}},
+    }
+
+
+class LocalQueryTest(unittest.TestCase):
+    def test_supports(self):
+        self.assertTrue(LocalQuery.supports({"page": "1", "per_page": "10", "order_by": "name", "names": "a", "organization_guids": "o1"}))
+        self.assertFalse(LocalQuery.supports({"isolation_segment_guids": "i1"}))
+        with self.assertRaises(ValueError):
+            LocalQuery({"isolation_segment_guids": "i1"})
+
+    def test_filter(self):
+        spaces = [space(i, "o1" if i % 2 else "o2") for i in range(20)]
+        res = LocalQuery({"names": "s1,s2", "organization_guids": "o1"}).run(spaces, "/v3/spaces")
+        self.assertEqual(["g00001", "g00009", "g00015"], [s["guid"] for s in res["resources"]])
+        self.assertEqual(3, res["pagination"]["total_results"])
+
+    def test_order_and_pagination(self):
+        spaces = [space(i) for i in range(100)]
+        random.Random(0).shuffle(spaces)
+        expected = sorted(spaces, key=lambda s: (s["name"], s["guid"]), reverse=True)
+        for page in range(1, 5):
+            res = LocalQuery({"order_by": "-name", "per_page": "30", "page": str(page)}).run(spaces, "/v3/spaces")
+            self.assertEqual(expected[(page - 1) * 30 : page * 30], res["resources"])
+        self.assertEqual(4, res["pagination"]["total_pages"])
+        self.assertEqual("/v3/spaces?page=3&per_page=30&order_by=-name", res["pagination"]["previous"]["href"])
+        self.assertIsNone(res["pagination"]["next"])
+
+    def test_large_candidate_set(self):
+        spaces = [space(i) for i in range(50000)]
+        random.Random(0).shuffle(spaces)
+        start = time.perf_counter()
+        res = LocalQuery({"order_by": "name", "per_page": "50", "names": "s1,s2,s3"}).run(spaces, "/v3/spaces")
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertEqual(sorted(s["guid"] for s in spaces if s["name"] == "s1")[:50], [s["guid"] for s in res["resources"]])
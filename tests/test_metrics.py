@@ -0,0 +1,61 @@
+import unittest
+import flask
+from shim.metrics import Metrics, Trace, path_template, timed
+
+
+class MetricsTest(unittest.TestCase):
+    def test_path_template(self):
+        self.assertEqual(
+            "/v3/apps/:guid/processes/web",
+            path_template("http://cf/v3/apps/4f3e2a1b-1111-4222-8333-444455556666/processes/web?per_page=1"),
+        )
+        self.assertEqual("/", path_template("http://cf"))
+
+    def test_server_timing(self):
+        trace = Trace()
+        trace.add_upstream_call("GET", "/v3/apps", "200", 0.01)
+        trace.add_upstream_call("GET", "/v3/apps", "200", 0.02)
+        trace.add_upstream_call("GET", "/v3/spaces/:guid", "404", 0.005)
+        trace.add_span("app_v3_to_v2", 0.001)
+        self.assertEqual(
+            'cfapi;desc="GET /v3/apps 200 2x";dur=30.0, cfapi;desc="GET /v3/spaces/:guid 404 1x";dur=5.0, '
+            'app_v3_to_v2;desc="1x";dur=1.0, total;dur=50.0',
+            trace.server_timing(0.05),
+        )
+
+    def test_timed(self):
+        @timed
+        def translate(x):
+            return x + 1
+
+        self.assertEqual(2, translate(1))  # no request
+        with flask.Flask(__name__).app_context():
+            flask.g.trace = Trace()
+            translate(1)
+            translate(2)
+            self.assertEqual(2, flask.g.trace.spans["translate"][0])
+
+    def test_render(self):
+        metrics = Metrics()
+        trace = Trace()
+        metrics.observe_upstream("GET", "http://cf/v3/apps?page=2", "200", 0.03, trace)
+        metrics.observe_request("/v2/apps", "GET", 200, 0.2, trace)
+        text = metrics.render({"cache": {"hits": 3, "enabled": True}, "single_flight": None})
+        self.assertIn("# TYPE shim_request_duration_seconds histogram\n", text)
+        self.assertIn('shim_request_duration_seconds_bucket{endpoint="/v2/apps",method="GET",status="200",le="0.1"} 0\n', text)
+        self.assertIn('shim_request_duration_seconds_bucket{endpoint="/v2/apps",method="GET",status="200",le="0.25"} 1\n', text)
+        self.assertIn('shim_request_duration_seconds_bucket{endpoint="/v2/apps",method="GET",status="200",le="+Inf"} 1\n', text)
+        self.assertIn('shim_request_duration_seconds_count{endpoint="/v2/apps",method="GET",status="200"} 1\n', text)
+        self.assertIn('shim_request_cfapi_calls_bucket{endpoint="/v2/apps",le="1"} 1\n', text)
+        self.assertIn('shim_cfapi_request_duration_seconds_sum{method="GET",path="/v3/apps",status="200"} 0.03\n', text)
+        self.assertIn("shim_cache_hits 3\n", text)
+        self.assertNotIn("enabled", text)
+
+        # forwarded requests: any path
+        trace = Trace()
+        trace.forwarded = True
+        metrics.observe_upstream("GET", "http://cf/v2/x/y/z", "404", 0.01, trace)
+        text = metrics.render()
+        self.assertIn('shim_cfapi_request_duration_seconds_count{method="GET",path="other",status="404"} 1\n', text)
+        self.assertNotIn("/v2/x/y/z", text)
+        self.assertEqual([("GET", "/v2/x/y/z", "404", 0.01)], trace.upstream_calls)
@@ -0,0 +1,81 @@
+import flask
+import functools
+import os
+import runpy
+import threading
+import unittest
+from unittest import mock
+import werkzeug.serving
+import fakecfapi
+
+UNKNOWN_GUID = "00000000-0000-0000-0000-000000000000"
+
+
+@functools.cache
+def shim_app():
+    """The shim app against the fake CF API served in a background thread (routes register once per process)."""
+    server = werkzeug.serving.make_server("127.0.0.1", 0, fakecfapi.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    env = {"CFG_CF_API_URL": f"http://127.0.0.1:{server.port}", "CFG_SERVER": "none", "CFG_CACHE_MAX_BYTES": "0"}
+    with mock.patch.dict(os.environ, env):
+        return runpy.run_module("shim", run_name="__main__", alter_sys=True)["app"]
+
+
+class OfflineTest(unittest.TestCase):
+    """Shim requests against the fake CF API, no CF landscape needed."""
+
+    def setUp(self):
+        fakecfapi.load(fakecfapi.generate(10, 2))
+        fakecfapi.job_duration = 0
+        self.client = shim_app().test_client()
+        self.client.environ_base["HTTP_AUTHORIZATION"] = "bearer test"
+
+    def test_get_app_summary(self):
+        guid = fakecfapi.data["apps"][0]["guid"]
+        res = self.client.get(f"/v2/apps/{guid}/summary")
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(guid, res.json["guid"])
+
+    def test_get_app_summary_unknown(self):
+        res = self.client.get(f"/v2/apps/{UNKNOWN_GUID}/summary")
+        self.assertEqual(404, res.status_code)
+        self.assertEqual("CF-ResourceNotFound", res.json["errors"][0]["title"])
+
+    def test_get_app_unknown(self):
+        res = self.client.get(f"/v2/apps/{UNKNOWN_GUID}")
+        self.assertEqual(404, res.status_code)
+
+    def test_get_space(self):
+        guid = fakecfapi.data["spaces"][0]["guid"]
+        res = self.client.get(f"/v2/spaces/{guid}")
+        self.assertEqual(200, res.status_code)
+        self.assertTrue(res.json["entity"]["allow_ssh"])
+
+    def test_get_space_ssh_feature_failed(self):
+        guid = fakecfapi.data["spaces"][0]["guid"]
+        with mock.patch.dict(fakecfapi.app.view_functions, space_feature_ssh=lambda guid: flask.abort(503)):
+            res = self.client.get(f"/v2/spaces/{guid}")
+        self.assertEqual(200, res.status_code)
+        self.assertIsNone(res.json["entity"]["allow_ssh"])
+
+    def test_delete_space(self):
+        guid = fakecfapi.data["spaces"][0]["guid"]
+        # v2 default recursive=false: space with apps is not deleted
+        res = self.client.delete(f"/v2/spaces/{guid}")
+        self.assertEqual(400, res.status_code)
+        self.assertEqual("CF-AssociationNotEmpty", res.json["error_code"])
+        self.assertEqual(200, self.client.get(f"/v2/spaces/{guid}").status_code)
+        res = self.client.delete(f"/v2/spaces/{guid}?recursive=true")
+        self.assertEqual(204, res.status_code)
+        self.assertEqual(404, self.client.get(f"/v2/spaces/{guid}").status_code)
+
+    def test_delete_app(self):
+        bound_app_guids = {fakecfapi.app_guid_of(b) for b in fakecfapi.data["service_credential_bindings"]}
+        bound_guid = next(a["guid"] for a in fakecfapi.data["apps"] if a["guid"] in bound_app_guids)
+        unbound_guid = next(a["guid"] for a in fakecfapi.data["apps"] if a["guid"] not in bound_app_guids)
+        res = self.client.delete(f"/v2/apps/{bound_guid}")
+        self.assertEqual(400, res.status_code)
+        self.assertEqual("CF-AssociationNotEmpty", res.json["error_code"])
+        self.assertEqual(204, self.client.delete(f"/v2/apps/{bound_guid}?recursive=true").status_code)
+        self.assertEqual(204, self.client.delete(f"/v2/apps/{unbound_guid}").status_code)
+        self.assertEqual(404, self.client.delete(f"/v2/apps/{UNKNOWN_GUID}").status_code)
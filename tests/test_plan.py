@@ -0,0 +1,101 @@
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from shim.plan import Plan, first_resource, json_or_none
+
+
+class FakeResponse:
+    def __init__(self, status_code, json):
+        self.status_code = status_code
+        self._json = json
+
+    def json(self):
+        return self._json
+
+
+class FakeSession:
+    """GET <delay>/<name> returns {"name": name} after delay seconds."""
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=8)
+        self.started = []
+
+    def get(self, url, params=None, cached=False):
+        delay, name = url.split("/")
+        time.sleep(float(delay))
+        if name == "fail":
+            raise ConnectionError(url)
+        return FakeResponse(200, {"name": name, "params": params})
+
+    def submit(self, url, params=None, cached=False, shared=False):
+        self.started.append((time.perf_counter(), url))
+        return self.executor.submit(self.get, url, params, cached)
+
+
+class PlanTest(unittest.TestCase):
+    def test_run(self):
+        plan = (
+            Plan(inputs=["a"])
+            .fetch("b", lambda a: f"0.2/{a}b", ["a"], then=lambda res: res.json()["name"])
+            .fetch("c", "0.2/c", params={"x": 1})
+            .step("d", lambda session, b: b + "d", ["b"])
+            .fetch("e", lambda d: f"0.2/{d}e", ["d"], params=lambda d: {"d": d})
+        )
+        session = FakeSession()
+        start = time.perf_counter()
+        results = plan.run(session, a="a")
+        duration = time.perf_counter() - start
+
+        self.assertEqual("a", results["a"])
+        self.assertEqual("ab", results["b"])
+        self.assertEqual({"name": "c", "params": {"x": 1}}, results["c"].json())
+        self.assertEqual("abd", results["d"])
+        self.assertEqual({"name": "abde", "params": {"d": "abd"}}, results["e"].json())
+        # b and c in parallel, e after b
+        self.assertLess(duration, 0.55)
+        self.assertEqual(["0.2/ab", "0.2/c", "0.2/abde"], [url for (_, url) in session.started])
+
+    def test_dependent_starts_early(self):
+        # e depends on the fast request only and must not wait for the slow one
+        plan = Plan().fetch("slow", "0.5/slow").fetch("fast", "0.1/fast").fetch("e", lambda fast: "0.1/e", ["fast"])
+        session = FakeSession()
+        start = time.perf_counter()
+        plan.run(session)
+        e_started = session.started[2][0] - start
+        self.assertLess(e_started, 0.3)
+
+    def test_failed_step(self):
+        plan = Plan().fetch("slow", "0.5/slow").fetch("fail", "0.1/fail").fetch("e", lambda fail: "0/e", ["fail"])
+        session = FakeSession()
+        with self.assertRaises(ConnectionError):
+            plan.run(session)
+        self.assertEqual(2, len(session.started))
+
+    def test_declaration_errors(self):
+        plan = Plan(inputs=["a"]).step("b", lambda session, a: a, ["a"])
+        with self.assertRaises(ValueError):
+            plan.step("c", lambda session, x: x, ["x"])
+        with self.assertRaises(ValueError):
+            plan.step("b", lambda session: 1)
+        with self.assertRaises(ValueError):
+            plan.run(FakeSession())
+
+    def test_extend(self):
+        base = Plan(inputs=["a"]).fetch("b", lambda a: f"0/{a}b", ["a"], then=lambda res: res.json()["name"])
+        plan = Plan(inputs=["a"]).fetch("c", "0/c").extend(base).step("d", lambda session, b, c: b + c.json()["name"], ["b", "c"])
+        results = plan.run(FakeSession(), a="a")
+        self.assertEqual("abc", results["d"])
+        # base plan is unchanged
+        self.assertEqual(["b"], list(base.steps))
+        with self.assertRaises(ValueError):
+            Plan().extend(base)
+
+    def test_response_helpers(self):
+        self.assertIsNone(json_or_none(FakeResponse(404, {"errors": []})))
+        self.assertEqual({"a": 1}, json_or_none(FakeResponse(200, {"a": 1})))
+        self.assertEqual(
+            {"guid": "b"}, first_resource(FakeResponse(200, {"pagination": {"total_results": 1}, "resources": [{"guid": "b"}]}))
+        )
+        self.assertIsNone(first_resource(FakeResponse(200, {"pagination": {"total_results": 0}, "resources": []})))
+        # e.g. the app was deleted
+        self.assertIsNone(first_resource(FakeResponse(404, {"errors": [{"code": 10010}]})))
@@ -0,0 +1,136 @@
+import gc
+import json
+import tracemalloc
+import unittest
+from shim.projection import BuildpackRecord, BuildRecord, DropletRecord, ProcessRecord, parse_list
+
+
+def droplet(i: int) -> dict:
+    """v3 droplet like in a list response of the CF API."""
+    guid = f"d{i:035d}"
+    app_guid = f"a{i:035d}"
+    return {
+        "guid": guid,
+        "created_at": "2024-05-01T12:00:00Z",
+        "updated_at": "2024-05-01T12:01:00Z",
+        "state": "STAGED",
+        "error": None,
+        "lifecycle": {"type": "buildpack", "data": {}},
+        "execution_metadata": "",
+        "process_types": {"web": "bundle exec rackup", "worker": "bundle exec sidekiq"},
+        "checksum": {"type": "sha256", "value": "0123456789abcdef" * 4},
+        "buildpacks": [
+            {"name": "ruby_buildpack", "detect_output": "ruby", "buildpack_name": "ruby", "version": "1.10.12", "version_str": None}
+        ],
+        "stack": "cflinuxfs4",
+        "image": None,
+        "relationships": {"app": {"data": {"guid": app_guid}}},
+        "metadata": {"labels": {"team": "a"}, "annotations": {}},
+        "links": {
+            "self": {"href": f"https://api.example.org/v3/droplets/{guid}"},
+            "package": {"href": f"https://api.example.org/v3/packages/p{i:035d}"},
+            "app": {"href": f"https://api.example.org/v3/apps/{app_guid}"},
+            "assign_current_droplet": {
+                "href": f"https://api.example.org/v3/apps/{app_guid}/relationships/current_droplet",
+                "method": "PATCH",
+            },
+            "download": {"href": f"https://api.example.org/v3/droplets/{guid}/download"},
+        },
+    }
+
+
+def page(resources: list, indent: int = None) -> bytes:
+    next = {"href": "https://api.example.org/v3/droplets?page=2&per_page=2"}
+    return json.dumps({"pagination": {"total_results": 3, "next": next}, "resources": resources}, indent=indent).encode()
+
+
+def chunks(body: bytes, size: int) -> list:
+    return [body[i : i + size] for i in range(0, len(body), size)]
+
+
+def peak_and_retained(parse) -> tuple:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = parse()
+        return tracemalloc.get_traced_memory(), result
+    finally:
+        tracemalloc.stop()
+
+
+class ProjectionTest(unittest.TestCase):
+    def test_record(self):
+        record = DropletRecord(droplet(1))
+        self.assertEqual("d" + "0" * 34 + "1", record["guid"])
+        self.assertEqual([{"name": "ruby_buildpack", "buildpack_name": "ruby"}], record["buildpacks"])
+        self.assertEqual({"web": "bundle exec rackup"}, record["process_types"])
+        self.assertEqual({"type": "buildpack"}, record["lifecycle"])
+        self.assertEqual("a" + "0" * 34 + "1", record["relationships"]["app"]["data"]["guid"])
+        self.assertEqual("cflinuxfs4", record.get("stack"))
+        self.assertIsNone(record["error"])
+        # fields that are not projected
+        self.assertNotIn("links", record)
+        self.assertIsNone(record.get("checksum"))
+        with self.assertRaises(KeyError):
+            record["checksum"]
+        self.assertFalse(hasattr(record, "__dict__"))
+
+        # missing nested keys are left out, missing relationships are None
+        record = ProcessRecord({"guid": "p1", "health_check": {"type": "port", "data": {"timeout": None}}})
+        self.assertEqual({"type": "port", "data": {"timeout": None}}, record["health_check"])
+        self.assertIsNone(record["health_check"]["data"].get("endpoint"))
+        self.assertEqual({"app": {"data": None}}, record["relationships"])
+        self.assertNotIn("relationships", BuildpackRecord({"guid": "b1"}))
+
+    def test_parse_list(self):
+        resources = [droplet(i) for i in range(3)]
+        for body in [page(resources), page(resources, indent=2), page(resources).decode()]:
+            res_json = parse_list(body, DropletRecord)
+            self.assertEqual(json.loads(body)["pagination"], res_json["pagination"])
+            self.assertEqual([r["guid"] for r in resources], [r["guid"] for r in res_json["resources"]])
+            self.assertIsInstance(res_json["resources"][0], DropletRecord)
+
+        body = b' {"included": {"apps": [{"guid": "a\\u00e4"}]} ,\n "resources" : [ {"guid": "b1"} ] , "pagination": {"next": null}}\n'
+        res_json = parse_list(body, BuildRecord)
+        self.assertEqual({"apps": [{"guid": "aä"}]}, res_json["included"])
+        self.assertEqual(["b1"], [r["guid"] for r in res_json["resources"]])
+        self.assertEqual({"next": None}, res_json["pagination"])
+        self.assertEqual({"pagination": {}, "resources": []}, parse_list(b'{"pagination": {}, "resources": []}', BuildRecord))
+        self.assertEqual({}, parse_list(b"{}", BuildRecord))
+        # error response
+        self.assertEqual({"errors": [{"code": 10002}]}, parse_list(b'{"errors": [{"code": 10002}]}', BuildRecord))
+
+        for invalid in [b"", b"[]", b'{"resources": [{"guid": "b1"},]}', b'{"resources": [{"guid": "b1"}]', b'{"a": 1} {}', b'{"a" 1}']:
+            with self.assertRaises(ValueError, msg=invalid):
+                parse_list(invalid, BuildRecord)
+            with self.assertRaises(ValueError, msg=invalid):
+                parse_list(chunks(invalid, 1), BuildRecord)
+
+    def test_parse_list_chunks(self):
+        # chunks split values, numbers and utf-8 sequences
+        body = '{"total": 12345, "included": {"apps": [{"name": "äöü €"}]}, "resources": [{"guid": "b\u00e41", "error": "ü"}, {"guid": "b2"}]}'.encode()
+        expected = json.loads(body)
+        for size in [1, 2, 3, 7, 64, len(body)]:
+            res_json = parse_list(chunks(body, size), BuildRecord)
+            self.assertEqual(12345, res_json["total"], size)
+            self.assertEqual(expected["included"], res_json["included"])
+            self.assertEqual(["bä1", "b2"], [r["guid"] for r in res_json["resources"]])
+            self.assertEqual("ü", res_json["resources"][0]["error"])
+        self.assertEqual({}, parse_list(iter([b"{", b"", b"}", b""]), BuildRecord))
+
+    def test_memory(self):
+        # page of the droplets of 100 apps with 5 droplets each
+        body = page([droplet(i) for i in range(500)])
+
+        (parsed_size, parsed_peak), parsed = peak_and_retained(lambda: json.loads(body))
+        (projected_size, projected_peak), projected = peak_and_retained(lambda: parse_list(body, DropletRecord))
+        self.assertEqual(len(parsed["resources"]), len(projected["resources"]))
+        self.assertLess(projected_peak, parsed_peak / 2)
+        self.assertLess(projected_size, parsed_size / 3)
+
+        # chunks of a streamed body: the text of the whole body isn't in memory either
+        body_chunks = chunks(body, 64 * 1024)
+        (chunked_size, chunked_peak), chunked = peak_and_retained(lambda: parse_list(iter(body_chunks), DropletRecord))
+        self.assertEqual(len(parsed["resources"]), len(chunked["resources"]))
+        # memory besides the records: a few chunks of text
+        self.assertLess(chunked_peak - chunked_size, len(body) / 2)
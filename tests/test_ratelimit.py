@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from requests.structures import CaseInsensitiveDict
+from shim.ratelimit import RateLimiter
+
+AUTH = {"Authorization": "bearer a"}
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, remaining: int = None, reset: float = None):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict()
+        if remaining is not None:
+            self.headers["X-RateLimit-Limit"] = "100"
+            self.headers["X-RateLimit-Remaining"] = str(remaining)
+            self.headers["X-RateLimit-Reset"] = str(reset)
+
+
+class FakeUpstream:
+    """Rate limited upstream: limit requests per window, counts requests in flight."""
+
+    def __init__(self, limit: int, window: float, duration: float = 0):
+        self.lock = threading.Lock()
+        self.limit = limit
+        self.window = window
+        self.duration = duration
+        self.reset = time.time() + window
+        self.remaining = limit
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.statuses = []
+
+    def send(self) -> FakeResponse:
+        with self.lock:
+            now = time.time()
+            if now >= self.reset:
+                self.reset = now + self.window
+                self.remaining = self.limit
+            self.remaining -= 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            res = FakeResponse(429 if self.remaining < 0 else 200, max(0, self.remaining), self.reset)
+        time.sleep(self.duration)
+        with self.lock:
+            self.in_flight -= 1
+            self.statuses.append(res.status_code)
+        return res
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_wait_for_reset(self):
+        limiter = RateLimiter(max_wait=5)
+        upstream = FakeUpstream(limit=5, window=0.5)
+        start = time.perf_counter()
+        results = [limiter.call("GET", AUTH, upstream.send).status_code for _ in range(8)]
+        # requests 6-8 wait for the next window instead of failing
+        self.assertEqual([200] * 8, results)
+        self.assertEqual([200] * 8, upstream.statuses)
+        self.assertGreater(time.perf_counter() - start, 0.3)
+        self.assertEqual(1, limiter.stats()["queued"])
+
+    def test_retry_429(self):
+        limiter = RateLimiter(max_wait=5)
+        responses = [FakeResponse(429, 0, time.time() + 0.2), FakeResponse(200, 99, time.time() + 60)]
+        start = time.perf_counter()
+        self.assertEqual(200, limiter.call("GET", AUTH, lambda: responses.pop(0)).status_code)
+        self.assertGreater(time.perf_counter() - start, 0.15)
+        self.assertEqual(1, limiter.stats()["throttled"])
+        # no retry for other methods
+        res = limiter.call("DELETE", {"Authorization": "b"}, lambda: FakeResponse(429, 0, time.time() + 0.2))
+        self.assertEqual(429, res.status_code)
+
+    def test_no_wait_beyond_max_wait(self):
+        limiter = RateLimiter(max_wait=0.5)
+        limiter.call("GET", AUTH, lambda: FakeResponse(200, 0, time.time() + 60))
+        start = time.perf_counter()
+        res = limiter.call("GET", AUTH, lambda: FakeResponse(429, 0, time.time() + 60))
+        self.assertEqual(429, res.status_code)
+        self.assertLess(time.perf_counter() - start, 0.1)
+
+    def test_aimd_window(self):
+        limiter = RateLimiter(max_concurrency=4, decrease_interval=0)
+        upstream = FakeUpstream(limit=1000, window=60, duration=0.02)
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            list(executor.map(lambda i: limiter.call("GET", AUTH, upstream.send), range(64)))
+        self.assertLessEqual(upstream.max_in_flight, 4)
+        budget = limiter.budgets[next(iter(limiter.budgets))]
+        self.assertEqual(4, budget.window)
+        self.assertEqual(0, budget.in_flight)
+
+        limiter.call("GET", AUTH, lambda: FakeResponse(429, 0, time.time() + 0.1))
+        self.assertEqual(2, budget.window)
+        # low budget
+        limiter.call("GET", AUTH, lambda: FakeResponse(200, 3, time.time() + 60))
+        self.assertEqual(1, budget.window)
+        # additive increase
+        limiter.call("GET", AUTH, lambda: FakeResponse(200, 100, time.time() + 120))
+        self.assertEqual(2, budget.window)
+
+    def test_anonymous(self):
+        limiter = RateLimiter(max_wait=5)
+        res = limiter.call("GET", {}, lambda: FakeResponse(429, 0, time.time() + 60))
+        self.assertEqual(429, res.status_code)
+        self.assertEqual(0, limiter.stats()["users"])
+
+    def test_call_async(self):
+        limiter = RateLimiter(max_wait=5)
+        upstream = FakeUpstream(limit=5, window=0.3)
+
+        async def send():
+            return upstream.send()
+
+        async def run():
+            return await asyncio.gather(*[limiter.call_async("GET", AUTH, send) for _ in range(10)])
+
+        results = asyncio.run(run())
+        self.assertEqual([200] * 10, [res.status_code for res in results])
+        self.assertNotIn(429, upstream.statuses)
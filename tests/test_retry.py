@@ -0,0 +1,152 @@
+import asyncio
+import threading
+import time
+import unittest
+import requests
+from shim.retry import MAX_PATHS, MIN_SAMPLES, RetryBudget, RetryPolicy
+
+URL = "http://cfapi/v3/apps/0a1b2c3d-0000-0000-0000-000000000001/env"
+
+
+def response(status_code: int, text: str = "") -> requests.Response:
+    res = requests.Response()
+    res.status_code = status_code
+    res._content = text.encode()
+    return res
+
+
+class FakeSend:
+    """send() returning the given responses (or raising the given exceptions) in order, delays in seconds per call."""
+
+    def __init__(self, results: list, delays: list = None):
+        self.lock = threading.Lock()
+        self.results = results
+        self.delays = delays or []
+        self.calls = 0
+
+    def _next(self) -> tuple:
+        with self.lock:
+            i = self.calls
+            self.calls += 1
+        return (self.delays[i] if i < len(self.delays) else 0, self.results[min(i, len(self.results) - 1)])
+
+    def __call__(self) -> requests.Response:
+        delay, result = self._next()
+        time.sleep(delay)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def send_async(self) -> requests.Response:
+        delay, result = self._next()
+        await asyncio.sleep(delay)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def warm_up(policy: RetryPolicy, url: str):
+    budget = policy.budget()
+    for _ in range(MIN_SAMPLES):
+        policy.call("GET", url, budget, FakeSend([response(200)]), (requests.ConnectionError,))
+
+
+class RetryPolicyTest(unittest.TestCase):
+    def test_retry(self):
+        policy = RetryPolicy(max_retries=2, backoff=0.01)
+        send = FakeSend([response(503), requests.ConnectionError("reset"), response(200, "ok")])
+        res = policy.call("GET", URL, policy.budget(), send, (requests.ConnectionError,))
+        self.assertEqual("ok", res.text)
+        self.assertEqual(3, send.calls)
+        self.assertEqual(2, policy.stats()["retries"])
+
+        # max_retries
+        send = FakeSend([response(502)])
+        self.assertEqual(502, policy.call("GET", URL, policy.budget(), send, (requests.ConnectionError,)).status_code)
+        self.assertEqual(3, send.calls)
+        with self.assertRaises(requests.ConnectionError):
+            policy.call("GET", URL, policy.budget(), FakeSend([requests.ConnectionError("refused")]), (requests.ConnectionError,))
+
+    def test_no_retry(self):
+        policy = RetryPolicy(max_retries=2, backoff=0.01)
+        # not idempotent
+        send = FakeSend([response(503), response(204)])
+        self.assertEqual(503, policy.call("DELETE", URL, policy.budget(), send, (requests.ConnectionError,)).status_code)
+        # other errors
+        send = FakeSend([response(500), response(200)])
+        self.assertEqual(500, policy.call("GET", URL, policy.budget(), send, (requests.ConnectionError,)).status_code)
+        # requests without budget (not on behalf of a v2 request)
+        send = FakeSend([response(503), response(200)])
+        self.assertEqual(503, policy.call("GET", URL, None, send, (requests.ConnectionError,)).status_code)
+        self.assertEqual(0, policy.stats()["retries"])
+
+    def test_budget(self):
+        budget = RetryBudget(ratio=0.1, minimum=1)
+        for _ in range(20):
+            budget.record()
+        self.assertEqual([True, True, True, False], [budget.try_spend() for _ in range(4)])
+
+        policy = RetryPolicy(max_retries=2, backoff=0.01, budget_ratio=0, budget_minimum=1)
+        budget = policy.budget()
+        send = FakeSend([response(503)])
+        self.assertEqual(503, policy.call("GET", URL, budget, send, (requests.ConnectionError,)).status_code)
+        # 1 retry, then the budget of the v2 request is exhausted
+        self.assertEqual(2, send.calls)
+        self.assertEqual(503, policy.call("GET", URL, budget, send, (requests.ConnectionError,)).status_code)
+        self.assertEqual(3, send.calls)
+        self.assertEqual(2, policy.stats()["budget_exhausted"])
+
+    def test_hedge(self):
+        policy = RetryPolicy(hedge_percentile=95, hedge_min_delay=0.05)
+        self.assertIsNone(policy.hedge_delay(URL))
+        warm_up(policy, URL)
+        # per path, guids replaced
+        self.assertEqual(0.05, policy.hedge_delay(URL.replace("0001", "0002")))
+        self.assertIsNone(policy.hedge_delay("http://cfapi/v3/apps"))
+
+        send = FakeSend([response(200, "slow"), response(200, "fast")], delays=[1, 0])
+        start = time.perf_counter()
+        res = policy.call("GET", URL, policy.budget(), send, (requests.ConnectionError,))
+        self.assertEqual("fast", res.text)
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual({"retries": 0, "hedges": 1, "hedge_wins": 1, "budget_exhausted": 0}, policy.stats())
+
+        # hedge fails, slower primary wins
+        send = FakeSend([response(200, "slow"), response(503)], delays=[0.2, 0])
+        self.assertEqual("slow", policy.call("GET", URL, policy.budget(), send, (requests.ConnectionError,)).text)
+        self.assertEqual(1, policy.stats()["hedge_wins"])
+
+        # not hedged without budget
+        budget = RetryBudget(ratio=0, minimum=0)
+        send = FakeSend([response(200, "slow"), response(200, "fast")], delays=[0.2, 0])
+        self.assertEqual("slow", policy.call("GET", URL, budget, send, (requests.ConnectionError,)).text)
+        self.assertEqual(1, send.calls)
+
+    def test_max_paths(self):
+        policy = RetryPolicy(hedge_percentile=95)
+        warm_up(policy, URL)
+        for i in range(MAX_PATHS):
+            policy.call("GET", f"http://cfapi/v3/x{i}", policy.budget(), FakeSend([response(200)]), (requests.ConnectionError,))
+            if i == MAX_PATHS // 2:
+                # recently used paths are kept
+                warm_up(policy, URL)
+        self.assertEqual(MAX_PATHS, len(policy.latencies))
+        self.assertIsNotNone(policy.hedge_delay(URL))
+        self.assertNotIn("/v3/x0", policy.latencies)
+
+    def test_call_async(self):
+        policy = RetryPolicy(max_retries=2, backoff=0.01, hedge_percentile=50, hedge_min_delay=0.05)
+        warm_up(policy, URL)
+
+        async def run(send: FakeSend) -> requests.Response:
+            return await policy.call_async("GET", URL, policy.budget(), send.send_async, (requests.ConnectionError,))
+
+        send = FakeSend([response(503), response(200, "ok")])
+        self.assertEqual("ok", asyncio.run(run(send)).text)
+        self.assertEqual(2, send.calls)
+
+        start = time.perf_counter()
+        send = FakeSend([response(200, "slow"), response(200, "fast")], delays=[1, 0])
+        self.assertEqual("fast", asyncio.run(run(send)).text)
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual({"retries": 1, "hedges": 1, "hedge_wins": 1, "budget_exhausted": 0}, policy.stats())
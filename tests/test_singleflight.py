@@ -0,0 +1,71 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from shim.singleflight import SingleFlight
+
+
+class SingleFlightTest(unittest.TestCase):
+    def test_key(self):
+        single_flight = SingleFlight()
+        key = single_flight.key("GET", "http://cf/v3/apps", {"Authorization": "bearer a"}, {"params": {"names": "a,b"}})
+        self.assertTrue(key.endswith(" http://cf/v3/apps?names=a%2Cb"))
+        self.assertEqual(key, single_flight.key("GET", "http://cf/v3/apps?names=a%2Cb", {"authorization": "bearer a"}, {"timeout": 5}))
+        self.assertNotEqual(key, single_flight.key("GET", "http://cf/v3/apps?names=a%2Cb", {"Authorization": "bearer b"}, {}))
+        self.assertIsNone(single_flight.key("POST", "http://cf/v3/apps", {}, {}))
+        self.assertIsNone(single_flight.key("GET", "http://cf/v3/apps", {}, {"stream": True}))
+        self.assertIsNone(single_flight.key("GET", "http://cf/v3/apps", {}, {"cookies": {"a": "b"}}))
+
+    def test_do(self):
+        single_flight = SingleFlight()
+        calls = []
+
+        def fn():
+            calls.append(threading.current_thread().name)
+            time.sleep(0.2)
+            return "res"
+
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            results = list(executor.map(lambda i: single_flight.do("k", fn), range(10)))
+        self.assertEqual(["res"] * 10, results)
+        self.assertEqual(1, len(calls))
+        self.assertEqual({"in_flight": 0, "calls": 1, "saved": 9}, single_flight.stats())
+
+        # nothing is kept after the request finished
+        single_flight.do("k", fn)
+        self.assertEqual(2, len(calls))
+
+    def test_do_error(self):
+        single_flight = SingleFlight()
+
+        def fn():
+            time.sleep(0.1)
+            raise ConnectionError("failed")
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [executor.submit(single_flight.do, "k", fn) for _ in range(3)]
+        for future in futures:
+            self.assertIsInstance(future.exception(), ConnectionError)
+        self.assertEqual(0, single_flight.stats()["in_flight"])
+
+    def test_do_async(self):
+        single_flight = SingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return "res"
+
+        async def main():
+            # first caller gets cancelled, the request continues for the others
+            first = asyncio.ensure_future(single_flight.do_async("k", fn))
+            others = [asyncio.ensure_future(single_flight.do_async("k", fn)) for _ in range(4)]
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await asyncio.gather(*others)
+
+        self.assertEqual(["res"] * 4, asyncio.run(main()))
+        self.assertEqual(1, len(calls))
+        self.assertEqual({"in_flight": 0, "calls": 1, "saved": 4}, single_flight.stats())
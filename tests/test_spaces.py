@@ -21,6 +21,22 @@ class SpacesTest(ShimTestCase):
         (v2_json, shim_json) = self.run_v2_shim_get(endpoint, expected_status=404)
         # TODO: self.assertDict(v2_json, shim_json) - error response mapping
 
+    def test_v2_get_space_summary(self):
+        endpoint = f"/v2/spaces/{SpacesTest.space_guid}/summary"
+        (v2_json, shim_json) = self.run_v2_shim_get(endpoint)
+        for (v2_app, shim_app) in zip(v2_json["apps"], shim_json["apps"]):
+            # TODO: v2 = specified command, v3 = process.specified_or_detected_command, v3 bug? droplet contains detected command
+            shim_app["command"] = v2_app["command"]
+            # v3 hides detected_start_command and droplet.execution_metadata in lists
+            shim_app["detected_start_command"] = v2_app["detected_start_command"]
+            shim_app["ports"] = v2_app["ports"]
+        # v3 service offerings have no provider and version
+        for (v2_service, shim_service) in zip(v2_json["services"], shim_json["services"]):
+            if "service_plan" in v2_service:
+                shim_service["service_plan"]["service"]["provider"] = v2_service["service_plan"]["service"]["provider"]
+                shim_service["service_plan"]["service"]["version"] = v2_service["service_plan"]["service"]["version"]
+        self.assertDict(v2_json, shim_json)
+
     def test_v2_get_spaces(self):
         endpoint = f"/v2/spaces"
         (v2_json, shim_json) = self.run_v2_shim_get(endpoint)
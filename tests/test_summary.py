@@ -0,0 +1,120 @@
+import unittest
+from shim.fetch import FetchedResources
+from shim.summary import (
+    app_summary_v3_to_v2,
+    bindings_by,
+    domain_v3_to_v2_summary,
+    domains_of_organization,
+    routes_by_app,
+    running_instances,
+    services_v3_to_v2_summary,
+    space_app_summary_v3_to_v2,
+)
+
+
+def domain(guid: str, owner: str = None, shared_with: list[str] = None) -> dict:
+    return {
+        "guid": guid,
+        "name": f"{guid}.fake",
+        "router_group": None,
+        "relationships": {
+            "organization": {"data": {"guid": owner} if owner else None},
+            "shared_organizations": {"data": [{"guid": o} for o in shared_with or []]},
+        },
+    }
+
+
+def route(guid: str, app_guids: list[str], domain_guid: str = "d1") -> dict:
+    return {
+        "guid": guid,
+        "host": guid,
+        "path": "",
+        "port": None,
+        "url": f"{guid}.{domain_guid}.fake",
+        "destinations": [{"app": {"guid": app_guid}, "port": 8080} for app_guid in app_guids],
+        "relationships": {"domain": {"data": {"guid": domain_guid}}},
+    }
+
+
+def binding(app_guid: str, instance_guid: str) -> dict:
+    return {"relationships": {"app": {"data": {"guid": app_guid}}, "service_instance": {"data": {"guid": instance_guid}}}}
+
+
+class PlansFetch(FetchedResources):
+    def __init__(self, resources: list[dict], included: dict):
+        super().__init__(resources)
+        self.included = included
+
+
+class SummaryTest(unittest.TestCase):
+    def test_domains(self):
+        domains = [domain("d1"), domain("d2", "o1"), domain("d3", "o2"), domain("d4", "o2", ["o1"])]
+        self.assertEqual(["d1", "d2", "d4"], [d["guid"] for d in domains_of_organization(domains, "o1")])
+        self.assertEqual(
+            {"guid": "d1", "name": "d1.fake", "router_group_guid": None, "router_group_type": None}, domain_v3_to_v2_summary(domains[0])
+        )
+        self.assertEqual({"guid": "d2", "name": "d2.fake", "owning_organization_guid": "o1"}, domain_v3_to_v2_summary(domains[1]))
+
+    def test_routes_and_bindings_by_app(self):
+        routes = routes_by_app([route("r1", ["a1", "a2"]), route("r2", ["a1", "a1"])])
+        self.assertEqual(["r1", "r2"], [r["guid"] for r in routes["a1"]])
+        self.assertEqual(["r1"], [r["guid"] for r in routes["a2"]])
+        bindings = bindings_by([binding("a1", "s1"), binding("a2", "s1"), binding("a1", "s2")], "service_instance")
+        self.assertEqual({"s1": 2, "s2": 1}, {guid: len(b) for (guid, b) in bindings.items()})
+
+    def test_running_instances(self):
+        stats = {"resources": [{"state": "RUNNING"}, {"state": "STARTING"}, {"state": "CRASHED"}, {"state": "DOWN"}]}
+        self.assertEqual(2, running_instances(stats))
+        self.assertEqual(0, running_instances(None))
+
+    def test_services(self):
+        instances = {
+            "s1": {
+                "guid": "s1",
+                "name": "db",
+                "type": "managed",
+                "dashboard_url": None,
+                "last_operation": {"type": "create", "state": "succeeded"},
+                "relationships": {"service_plan": {"data": {"guid": "p1"}}},
+            },
+            "s2": {"guid": "s2", "name": "ups", "type": "user-provided", "relationships": {}},
+        }
+        plans = PlansFetch(
+            [{"guid": "p1", "name": "small", "relationships": {"service_offering": {"data": {"guid": "o1"}}}}],
+            {"service_offerings": {"o1": {"guid": "o1", "name": "fakedb"}}},
+        )
+        bindings = FetchedResources([binding("a1", "s1"), binding("a2", "s1")])
+        v2_services = services_v3_to_v2_summary(instances, plans, bindings)
+        self.assertEqual(
+            {
+                "guid": "s1",
+                "name": "db",
+                "bound_app_count": 2,
+                "dashboard_url": None,
+                "last_operation": {"type": "create", "state": "succeeded"},
+                "service_plan": {
+                    "guid": "p1",
+                    "name": "small",
+                    "service": {"guid": "o1", "label": "fakedb", "provider": None, "version": None},
+                },
+            },
+            v2_services[0],
+        )
+        self.assertEqual({"guid": "s2", "name": "ups", "bound_app_count": 0, "type": "user_provided_service_instance"}, v2_services[1])
+
+    def test_app_summaries(self):
+        v2_app = {"metadata": {"guid": "a1"}, "entity": {"name": "app1", "state": "STARTED"}}
+        routes = [route("r1", ["a1"])]
+        domains = {"d1": domain("d1")}
+        summary = app_summary_v3_to_v2(v2_app, routes, domains, [], 2, [])
+        self.assertEqual("app1", summary["name"])
+        self.assertEqual("a1", summary["guid"])
+        self.assertEqual(2, summary["running_instances"])
+        self.assertEqual(
+            [{"guid": "r1", "host": "r1", "port": None, "path": "", "domain": {"guid": "d1", "name": "d1.fake"}}], summary["routes"]
+        )
+
+        summary = space_app_summary_v3_to_v2(v2_app, routes, domains, ["db"], 1)
+        self.assertEqual(["r1.d1.fake"], summary["urls"])
+        self.assertEqual(1, summary["service_count"])
+        self.assertEqual(["db"], summary["service_names"])
@@ -55,6 +55,24 @@ class UtilsTest(unittest.TestCase):
         self.assertEqual("/v2/spaces?order-by=name&order-direction=asc&page=2&q=name IN s1,s2&q=organization_guid:o1&results-per-page=100", v2_url)
 
 
+    def test_cfapi_response_headers(self):
+        headers = {
+            "Content-Type": "application/json",
+            "Content-Encoding": "gzip",
+            "Content-Length": "42",
+            "Transfer-Encoding": "chunked",
+            "Connection": "keep-alive, X-Hop",
+            "X-Hop": "1",
+            "Keep-Alive": "timeout=5",
+            "X-Runtime": "0.1",
+            "X-Vcap-Request-Id": "abc",
+        }
+        self.assertEqual({"Content-Type": "application/json", "X-Vcap-Request-Id": "abc"}, utils.cfapi_response_headers(headers))
+        self.assertEqual(
+            {"Content-Type": "application/json", "Content-Encoding": "gzip", "Content-Length": "42", "X-Vcap-Request-Id": "abc"},
+            utils.cfapi_response_headers(headers, decoded=False),
+        )
+
     def test_pagination_params_v2_to_v3(self):
         v2_params = MultiDict()
         v3_params = utils.pagination_params_v2_to_v3(v2_params)
@@ -113,4 +131,46 @@ class UtilsTest(unittest.TestCase):
         v2_params.add("q", "name IN s1,s2")
         v2_params.add("q", "organization_guid:o1")
         v3_params = utils.filter_params_v2_to_v3(v2_params)
-        self.assertEqual({"names": "s1,s2", "organization_guids": "o1"}, v3_params)
\ No newline at end of file
+        self.assertEqual({"names": "s1,s2", "organization_guids": "o1"}, v3_params)
+
+    def test_filter_params_v2_to_v3_supported(self):
+        supported = ["space_guids", "organization_guids"]
+        v2_params = MultiDict()
+        self.assertIsNone(utils.filter_params_v2_to_v3(v2_params, supported))
+
+        v2_params.add("q", "space_guid IN s1,s2")
+        self.assertEqual({"space_guids": "s1,s2"}, utils.filter_params_v2_to_v3(v2_params, supported))
+        v2_params.add("q", "organization_guid:o1")
+        self.assertEqual({"space_guids": "s1,s2", "organization_guids": "o1"}, utils.filter_params_v2_to_v3(v2_params, supported))
+
+        v2_params.add("q", "name:a1")
+        self.assertIsNone(utils.filter_params_v2_to_v3(v2_params, supported))
+
+    def test_paginate_v3(self):
+        resources = [
+            {"guid": "g1", "name": "b", "created_at": "2024-01-01T00:00:00Z"},
+            {"guid": "g2", "name": "a", "created_at": "2024-01-02T00:00:00Z"},
+            {"guid": "g3", "name": "c", "created_at": "2024-01-03T00:00:00Z"},
+        ]
+        v3 = utils.paginate_v3(resources, "/v3/stacks", {})
+        self.assertEqual(["g1", "g2", "g3"], [r["guid"] for r in v3["resources"]])
+        self.assertEqual(3, v3["pagination"]["total_results"])
+        self.assertEqual(1, v3["pagination"]["total_pages"])
+        self.assertIsNone(v3["pagination"]["next"])
+        self.assertIsNone(v3["pagination"]["previous"])
+
+        v3 = utils.paginate_v3(resources, "/v3/stacks", {"order_by": "-name", "per_page": "1", "page": "2"})
+        self.assertEqual(["g1"], [r["guid"] for r in v3["resources"]])
+        self.assertEqual(3, v3["pagination"]["total_pages"])
+        self.assertEqual("/v3/stacks?page=3&per_page=1&order_by=-name", v3["pagination"]["next"]["href"])
+        self.assertEqual("/v3/stacks?page=1&per_page=1&order_by=-name", v3["pagination"]["previous"]["href"])
+
+        v2_params = MultiDict({"order-by": "name", "order-direction": "desc", "results-per-page": "1", "page": "2"})
+        v2_pagination = utils.pagination_v3_to_v2(v3["pagination"], v2_params)
+        self.assertEqual("/v2/stacks?order-by=name&order-direction=desc&page=3&results-per-page=1", v2_pagination["next_url"])
+
+        for invalid in [{"per_page": "0"}, {"per_page": "5001"}, {"page": "0"}, {"page": "x"}, {"per_page": "-1"}]:
+            self.assertIsNotNone(utils.pagination_params_error(invalid), invalid)
+            with self.assertRaises(ValueError):
+                utils.paginate_v3(resources, "/v3/stacks", invalid)
+        self.assertIsNone(utils.pagination_params_error({"per_page": "5000", "page": "1"}))